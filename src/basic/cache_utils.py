@@ -0,0 +1,205 @@
+import mmap
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Set, Hashable, Callable
+
+import numpy as np
+
+OBJECT_ITEM_BYTES: int = 64  # 估算数组中每个Python对象(例如 cv2.KeyPoint)占用的字节数
+
+
+class LruCache:
+
+    def __init__(self, max_bytes: Optional[int] = None,
+                 size_func: Optional[Callable[[Any], int]] = None,
+                 max_cnt: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        """
+        按字节数限制大小的LRU缓存
+        超出上限时 淘汰最久未使用的 固定的key不会被淘汰
+        :param max_bytes: 字节数上限 为空时不限制
+        :param size_func: 计算缓存值字节数的方法 为空时使用 get_nbytes
+        :param max_cnt: 数量上限 为空时不限制
+        :param ttl: 放入后的有效秒数 过期后视为未命中 为空时不过期
+        """
+        self.max_bytes: Optional[int] = max_bytes
+        self.size_func: Callable[[Any], int] = get_nbytes if size_func is None else size_func
+        self.max_cnt: Optional[int] = max_cnt
+        self.ttl: Optional[float] = ttl
+
+        self._data: OrderedDict = OrderedDict()
+        self._size: dict = {}
+        self._put_time: dict = {}
+        self._pinned: Set[Hashable] = set()
+        self._lock = threading.RLock()
+
+        self.total_bytes: int = 0  # 当前占用的字节数
+        self.hit_cnt: int = 0  # 命中次数
+        self.miss_cnt: int = 0  # 未命中次数
+        self.evict_cnt: int = 0  # 淘汰次数
+        self.expire_cnt: int = 0  # 过期次数
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self):
+        return ('缓存数量: %d 占用: %.2fMB 上限: %s 命中: %d 未命中: %d 命中率: %.2f%% 淘汰: %d 过期: %d' %
+                (len(self._data), self.total_bytes / 1024 / 1024,
+                 '无' if self.max_bytes is None else '%.2fMB' % (self.max_bytes / 1024 / 1024),
+                 self.hit_cnt, self.miss_cnt, self.hit_rate * 100, self.evict_cnt, self.expire_cnt))
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        命中率
+        :return:
+        """
+        total = self.hit_cnt + self.miss_cnt
+        return self.hit_cnt / total if total > 0 else 0
+
+    def get(self, key: Hashable, value=None):
+        """
+        获取缓存 命中时会标记为最近使用
+        :param key: key
+        :param value: 未命中时返回的值
+        :return:
+        """
+        with self._lock:
+            if key in self._data and self._is_expired(key):
+                self._remove(key)
+                self.expire_cnt += 1
+            if key in self._data:
+                self.hit_cnt += 1
+                self._data.move_to_end(key)
+                return self._data[key]
+            else:
+                self.miss_cnt += 1
+                return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        放入缓存 然后淘汰超出上限的部分
+        :param key: key
+        :param value: 值
+        :return:
+        """
+        with self._lock:
+            self._remove(key)
+            size = self.size_func(value)
+            self._data[key] = value
+            self._size[key] = size
+            self._put_time[key] = time.time()
+            self.total_bytes += size
+            self._evict(keep=key)
+
+    def pop(self, key: Hashable) -> Any:
+        """
+        删除一个缓存
+        :param key: key
+        :return: 被删除的值
+        """
+        with self._lock:
+            return self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._size.clear()
+            self._put_time.clear()
+            self.total_bytes = 0
+
+    def pin(self, keys: Set[Hashable]) -> None:
+        """
+        固定一些key 使其不会被淘汰 会替换之前固定的key
+        :param keys: 需要固定的key
+        :return:
+        """
+        with self._lock:
+            self._pinned = set(keys)
+            self._evict()
+
+    @property
+    def pinned(self) -> Set[Hashable]:
+        return set(self._pinned)
+
+    def set_max_bytes(self, max_bytes: Optional[int]) -> None:
+        """
+        修改字节数上限
+        :param max_bytes: 字节数上限 为空时不限制
+        :return:
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _remove(self, key: Hashable) -> Any:
+        if key not in self._data:
+            return None
+        self.total_bytes -= self._size.pop(key)
+        self._put_time.pop(key)
+        return self._data.pop(key)
+
+    def _is_expired(self, key: Hashable) -> bool:
+        return self.ttl is not None and time.time() - self._put_time[key] > self.ttl
+
+    def _over_limit(self) -> bool:
+        return ((self.max_bytes is not None and self.total_bytes > self.max_bytes)
+                or (self.max_cnt is not None and len(self._data) > self.max_cnt))
+
+    def _evict(self, keep: Optional[Hashable] = None) -> None:
+        """
+        从最久未使用的开始淘汰 直到不超过上限
+        :param keep: 不淘汰的key 用于保留刚放入的值
+        :return:
+        """
+        if not self._over_limit():
+            return
+        for key in list(self._data.keys()):
+            if not self._over_limit():
+                break
+            if key in self._pinned or key == keep:
+                continue
+            self._remove(key)
+            self.evict_cnt += 1
+
+
+def get_nbytes(obj: Any) -> int:
+    """
+    估算一个对象占用的字节数 只统计其中的numpy数组
+    映射到文件的数组由系统的页缓存管理 不计入占用
+    :param obj: 对象 可以是数组、列表、字典或普通对象
+    :return: 字节数
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, np.ndarray):
+        if is_mapped(obj):
+            return 0
+        if obj.dtype == object:  # 例如特征点数组
+            return obj.size * OBJECT_ITEM_BYTES
+        return obj.nbytes
+    if isinstance(obj, (list, tuple)):
+        return len(obj) * OBJECT_ITEM_BYTES
+    if isinstance(obj, dict):
+        return sum(get_nbytes(v) for v in obj.values())
+    if hasattr(obj, '__dict__'):
+        return sum(get_nbytes(v) for v in vars(obj).values() if isinstance(v, (np.ndarray, list, tuple)))
+    return 0
+
+
+def is_mapped(arr: np.ndarray) -> bool:
+    """
+    数组是否映射到文件 例如 np.load(mmap_mode='r') 的结果及其切片
+    :param arr: 数组
+    :return:
+    """
+    base = arr
+    while base is not None:
+        if isinstance(base, (np.memmap, mmap.mmap)):
+            return True
+        base = getattr(base, 'base', None)
+    return False
@@ -1,7 +1,155 @@
+import atexit
+import copy
 import os
-from typing import Optional, List
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Tuple, Set
+
+import yaml
 
 from basic import config_utils
+from basic.log_utils import log
+
+
+class ConfigWriter:
+
+    def __init__(self, delay_seconds: float = 1):
+        """
+        后台写配置文件
+        同一个文件在延迟时间内的多次保存只会写一次 避免运行中频繁序列化和写文件
+        :param delay_seconds: 延迟写入的时间 为0时同步写入
+        """
+        self.delay_seconds: float = delay_seconds
+        self._pending: Dict[Tuple, Tuple[float, 'ConfigHolder', dict]] = {}  # 文件 -> (写入时间, 配置, 提交时的数据)
+        self._writing: Set[Tuple] = set()  # 正在写入的文件 同一个文件同时只有一个线程在写
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, holder: 'ConfigHolder', data: dict) -> None:
+        """
+        提交一次保存 在延迟时间后写入
+        期间同一文件的保存会合并 以最后一次提交的数据为准
+        :param holder: 配置
+        :param data: 提交时的数据副本 之后调用方修改配置不影响写入的内容
+        :return:
+        """
+        if self.delay_seconds <= 0:
+            self.cancel(holder)
+            holder.write_file(data)
+            return
+
+        with self._condition:
+            key = holder.file_key
+            if key in self._pending:  # 保留第一次提交的时间 持续更新时也能按时写入
+                self._pending[key] = (self._pending[key][0], holder, data)
+            else:
+                self._pending[key] = (time.time() + self.delay_seconds, holder, data)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='config_writer', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def cancel(self, holder: 'ConfigHolder') -> None:
+        """
+        取消等待写入的保存 并等待正在进行的写入完成 之后删除或覆盖文件时不会被后台写入覆盖
+        :param holder: 配置
+        :return:
+        """
+        key = holder.file_key
+        with self._condition:
+            self._pending.pop(key, None)
+            self._condition.wait_for(lambda: key not in self._writing)
+
+    def is_pending(self, holder: 'ConfigHolder') -> bool:
+        """
+        是否有等待写入的保存
+        :param holder: 配置
+        :return:
+        """
+        with self._condition:
+            return holder.file_key in self._pending
+
+    def flush(self, holder: Optional['ConfigHolder'] = None) -> None:
+        """
+        立刻写入等待中的保存 返回时后台正在进行的写入也已经完成
+        :param holder: 配置 为空时写入全部
+        :return:
+        """
+        with self._condition:
+            if holder is None:
+                self._condition.wait_for(lambda: len(self._writing) == 0)
+                key_list = list(self._pending.keys())
+            else:
+                key = holder.file_key
+                self._condition.wait_for(lambda: key not in self._writing)
+                key_list = [key] if key in self._pending else []
+            to_write_list = self._take(key_list)
+
+        for key, holder, data in to_write_list:
+            self._write(key, holder, data)
+
+    def _take(self, key_list: List[Tuple]) -> List[Tuple[Tuple, 'ConfigHolder', dict]]:
+        """
+        取出等待中的保存 标记为正在写入 需要持有锁
+        :param key_list: 文件列表
+        :return: (文件, 配置, 数据)
+        """
+        self._writing.update(key_list)
+        result = []
+        for key in key_list:
+            _, holder, data = self._pending.pop(key)
+            result.append((key, holder, data))
+        return result
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                now = time.time()
+                # 正在写入的文件等写完再处理 写完时会被唤醒
+                waiting_list = [(key, item[0]) for key, item in self._pending.items() if key not in self._writing]
+                due_list = [key for key, write_time in waiting_list if write_time <= now]
+                if len(due_list) == 0:
+                    next_time = min([i[1] for i in waiting_list], default=None)
+                    self._condition.wait(None if next_time is None else next_time - now)
+                    continue
+                to_write_list = self._take(due_list)
+
+            for key, holder, data in to_write_list:
+                self._write(key, holder, data)
+
+    def _write(self, key: Tuple, holder: 'ConfigHolder', data: dict) -> None:
+        try:
+            holder.write_file(data)
+        except Exception:
+            log.error('保存配置失败 %s', holder.mod, exc_info=True)
+        finally:
+            with self._condition:
+                self._writing.discard(key)
+                self._condition.notify_all()
+
+
+_writer = ConfigWriter()
+atexit.register(_writer.flush)
+
+
+def set_save_delay(delay_seconds: float) -> None:
+    """
+    设置配置延迟写入的时间
+    :param delay_seconds: 延迟时间 为0时同步写入
+    :return:
+    """
+    _writer.delay_seconds = delay_seconds
+    if delay_seconds <= 0:
+        _writer.flush()
+
+
+def flush_all() -> None:
+    """
+    立刻写入所有等待中的配置 停止运行和退出时调用
+    :return:
+    """
+    _writer.flush()
 
 
 class ConfigHolder:
@@ -15,9 +163,13 @@ class ConfigHolder:
         self.sub_dir: Optional[List[str]] = sub_dir
         self.data: dict = {}
         self.mock: bool = mock  # 不读取文件
+        self._data_lock = threading.RLock()  # 复制数据时 避免其它线程同时 update
+        self._batch_depth: int = 0  # batch 的嵌套层数
+        self._batch_changed: bool = False  # batch 期间是否有需要保存的修改
         self.refresh()
 
     def refresh(self):
+        _writer.flush(self)  # 先写入未保存的修改 再重新读取
         self._read_config()
         self._init_after_read_file()
 
@@ -34,11 +186,67 @@ class ConfigHolder:
             self.data = {}
 
     def save(self):
+        """
+        保存配置 在后台延迟写入 短时间内的多次保存只会写一次文件
+        batch 期间只做标记 在 batch 结束时保存
+        :return:
+        """
         if self.mock:
             return
-        config_utils.save_config(self.data, self.mod,
-                                 script_account_idx=self.account_idx,
-                                 sub_dir=self.sub_dir)
+        if self._batch_depth > 0:
+            self._batch_changed = True
+            return
+        # 在调用方线程复制一份 后台写入时调用方继续修改嵌套的字典和列表也不影响
+        with self._data_lock:
+            data = copy.deepcopy(self.data)
+        _writer.submit(self, data)
+
+    def flush(self):
+        """
+        立刻写入等待中的保存
+        :return:
+        """
+        _writer.flush(self)
+
+    def write_file(self, data: Optional[dict] = None):
+        """
+        将配置写入文件
+        :param data: 需要写入的数据 为空时写入当前配置
+        :return:
+        """
+        if self.mock:
+            return
+        if data is None:
+            with self._data_lock:
+                text = yaml.dump(self.data)
+        else:
+            text = yaml.dump(data)
+        sub_dir = config_utils.get_sub_dir_with_account(self.account_idx, self.sub_dir)
+        config_utils.save_text(config_utils.get_config_file_path(self.mod, sub_dir=sub_dir), text)
+
+    @property
+    def file_key(self) -> Tuple:
+        """
+        对应配置文件的标识 用于合并同一个文件的保存
+        :return:
+        """
+        return self.mod, self.account_idx, tuple(self.sub_dir) if self.sub_dir is not None else None
+
+    @contextmanager
+    def batch(self):
+        """
+        批量修改配置 期间的 update 不会触发保存 结束时统一保存一次
+        可以嵌套使用
+        :return:
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._batch_changed:
+                self._batch_changed = False
+                self.save()
 
     def save_diy(self, text: str):
         """
@@ -49,9 +257,8 @@ class ConfigHolder:
         if self.mock:
             return
 
-        file_path = config_utils.get_config_file_path(self.mod, sub_dir=self.sub_dir)
-        with open(file_path, "w", encoding="utf-8") as file:
-            file.write(text)
+        _writer.cancel(self)
+        config_utils.save_text(self.config_file_path, text)
 
     def _init_after_read_file(self):
         pass
@@ -60,9 +267,10 @@ class ConfigHolder:
         return self.data[prop] if prop in self.data else value
 
     def update(self, key: str, value, save: bool = True):
-        if self.data is None:
-            self.data = {}
-        self.data[key] = value
+        with self._data_lock:
+            if self.data is None:
+                self.data = {}
+            self.data[key] = value
         if save:
             self.save()
 
@@ -71,6 +279,7 @@ class ConfigHolder:
         删除配置文件
         :return:
         """
+        _writer.cancel(self)
         if os.path.exists(self.config_file_path):
             os.remove(self.config_file_path)
 
@@ -86,3 +295,4 @@ class ConfigHolder:
         self.delete()  # 删除旧的配置
         self.account_idx = account_idx
         self.save()  # 保存新的配置
+        self.flush()
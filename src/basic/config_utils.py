@@ -98,8 +98,27 @@ def save_config(data: dict, name: str,
     """
     sub_dir = get_sub_dir_with_account(script_account_idx, sub_dir)
     path = get_config_file_path(name, sub_dir=sub_dir)
-    with open(path, 'w', encoding='utf-8') as file:
-        yaml.dump(data, file)
+    save_text(path, yaml.dump(data))
+
+
+def save_text(path: str, text: str):
+    """
+    保存文本到文件
+    先写到临时文件 再替换原文件 中途崩溃时原文件不会只写了一半
+    :param path: 文件路径
+    :param text: 文本
+    :return:
+    """
+    temp_path = '%s.tmp' % path
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
 
 def deep_copy_missing_prop(source: dict, target: dict):
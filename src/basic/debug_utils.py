@@ -1,4 +1,18 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Deque, Tuple, Any, Set
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from basic import os_utils
+from basic.log_utils import log
 
 _debug_executor = None
 
@@ -11,3 +25,195 @@ def get_executor() -> ThreadPoolExecutor:
             max_workers=1
         )
     return _debug_executor
+
+
+class DebugImageWriter:
+
+    FORMAT_PNG: str = 'png'
+    FORMAT_NPY: str = 'npy'
+
+    def __init__(self, max_queue_size: int = 32,
+                 max_per_minute: int = 10,
+                 image_format: str = FORMAT_PNG,
+                 png_compression: int = 1,
+                 max_total_mb: int = 1024,
+                 rotate_dir_list: Optional[List[str]] = None):
+        """
+        在后台保存调试用的图片 不阻塞调用方
+        :param max_queue_size: 等待保存的最大数量 超过时丢弃新的图片
+        :param max_per_minute: 同一个调用位置每分钟最多保存的数量
+        :param image_format: 图片格式 png / npy。npy 不压缩 保存最快
+        :param png_compression: png的压缩等级 0~9 越小越快 文件越大
+        :param max_total_mb: 调试文件夹的总大小上限 超过时删除最旧的文件
+        :param rotate_dir_list: 需要控制大小的文件夹
+        """
+        self.max_per_minute: int = max_per_minute
+        self.image_format: str = image_format
+        self.png_compression: int = png_compression
+        self.max_total_bytes: int = max_total_mb * 1024 * 1024
+        self.rotate_dir_list: List[str] = [] if rotate_dir_list is None else rotate_dir_list
+        self.dropped_cnt: int = 0  # 因为频率限制或者队列满了没有保存的数量
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._key_time: Dict[str, Deque[float]] = {}  # 调用位置 -> 最近一分钟的保存时间
+        self._queued: Set[str] = set()  # 等待保存的路径 同一路径不重复提交 避免后提交的覆盖先提交的
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._total_bytes: Optional[int] = None  # 调试文件夹的总大小 后台线程启动时统计
+
+    def is_allowed(self, key: str) -> bool:
+        """
+        频率限制 允许时记录一次保存
+        :param key: 调用位置
+        :return: 是否允许保存
+        """
+        now = time.time()
+        with self._lock:
+            time_list = self._key_time.get(key)
+            if time_list is None:
+                time_list = deque()
+                self._key_time[key] = time_list
+            while len(time_list) > 0 and now - time_list[0] > 60:
+                time_list.popleft()
+            if len(time_list) >= self.max_per_minute:
+                self.dropped_cnt += 1
+                return False
+            time_list.append(now)
+            return True
+
+    def save_image(self, path: str, image: MatLike, key: Optional[str] = None,
+                   image_format: Optional[str] = None) -> Optional[str]:
+        """
+        提交一张图片 在后台保存
+        :param path: 保存路径 不带后缀
+        :param image: 图片 会复制一份 之后修改原图不影响保存结果
+        :param key: 调用位置 用于频率限制 为空时不限制
+        :param image_format: 图片格式 为空时使用默认格式
+        :return: 保存的完整路径 被丢弃或者同一路径还在等待保存时返回空
+        """
+        if key is not None and not self.is_allowed(key):
+            return None
+        file_path = '%s.%s' % (path, self.image_format if image_format is None else image_format)
+        if not self._submit(file_path, image.copy()):
+            return None
+        return file_path
+
+    def save_text(self, path: str, text: str, key: Optional[str] = None) -> bool:
+        """
+        提交一份文本 在后台保存
+        :param path: 保存路径
+        :param text: 文本
+        :param key: 调用位置 用于频率限制 为空时不限制
+        :return: 是否提交成功
+        """
+        if key is not None and not self.is_allowed(key):
+            return False
+        return self._submit(path, text)
+
+    def _submit(self, file_path: str, content: Any) -> bool:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sr_od_debug_image', daemon=True)
+                self._thread.start()
+            if file_path in self._queued:
+                self.dropped_cnt += 1
+                return False
+            try:
+                self._queue.put_nowait((file_path, content))
+            except queue.Full:
+                self.dropped_cnt += 1
+                return False
+            self._queued.add(file_path)
+            return True
+
+    def flush(self) -> None:
+        """
+        等待所有提交的内容保存完
+        :return:
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def _run(self) -> None:
+        self._total_bytes = sum([i[1] for i in self._list_files()])
+        if self._total_bytes > self.max_total_bytes:
+            self._rotate()
+        while True:
+            file_path, content = self._queue.get()
+            try:
+                self._write(file_path, content)
+                self._total_bytes += os.path.getsize(file_path)
+                if self._total_bytes > self.max_total_bytes:
+                    self._rotate()
+            except Exception:
+                log.error('保存调试文件失败 %s', file_path, exc_info=True)
+            finally:
+                with self._lock:
+                    self._queued.discard(file_path)
+                self._queue.task_done()
+
+    def _write(self, file_path: str, content: Any) -> None:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)  # 文件夹可能在清理时被删除了
+        if isinstance(content, str):
+            with open(file_path, 'w', encoding='utf-8') as file:
+                file.write(content)
+        elif file_path.endswith('.npy'):
+            np.save(file_path, content)
+        else:
+            cv2.imwrite(file_path, content, [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression])
+
+    def _list_files(self) -> List[Tuple[float, int, str]]:
+        """
+        需要控制大小的文件夹下的所有文件
+        :return: (修改时间, 大小, 路径)
+        """
+        result = []
+        for dir_path in self.rotate_dir_list:
+            for root, dirs, files in os.walk(dir_path):
+                for file in files:
+                    path = os.path.join(root, file)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    result.append((stat.st_mtime, stat.st_size, path))
+        return result
+
+    def _rotate(self) -> None:
+        """
+        删除最旧的文件 直到总大小低于上限的80%
+        :return:
+        """
+        file_list = sorted(self._list_files())
+        total = sum([i[1] for i in file_list])
+        target = self.max_total_bytes * 0.8
+        for _, size, path in file_list:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        for dir_path in self.rotate_dir_list:  # 删除空的子文件夹
+            for root, dirs, files in os.walk(dir_path, topdown=False):
+                if root != dir_path and len(os.listdir(root)) == 0:
+                    try:
+                        os.rmdir(root)
+                    except OSError:
+                        pass
+        self._total_bytes = total
+
+
+_debug_image_writer: Optional[DebugImageWriter] = None
+
+
+def get_debug_image_writer() -> DebugImageWriter:
+    global _debug_image_writer
+    if _debug_image_writer is None:
+        _debug_image_writer = DebugImageWriter(rotate_dir_list=[
+            os_utils.get_path_under_work_dir('.debug', 'images'),
+            os_utils.get_path_under_work_dir('.debug', 'cal_pos_fail'),
+        ])
+        atexit.register(_debug_image_writer.flush)
+    return _debug_image_writer
@@ -1,5 +1,6 @@
 import base64
 import os
+import threading
 from typing import Union, List, Optional, Tuple
 
 import cv2
@@ -10,6 +11,9 @@ from basic import Rect, os_utils
 from basic.img import MatchResult, MatchResultList
 
 feature_detector = cv2.SIFT_create()
+_feature_matcher_local = threading.local()  # 特征匹配器 每个线程复用一个
+
+PYRAMID_SCALE: float = 0.25  # 图像金字塔的缩小比例 大地图 bundle 也按这个比例预先缩小
 
 
 def read_image(file_path: str) -> Optional[MatLike]:
@@ -138,17 +142,56 @@ def match_template(source: MatLike, template: MatLike, threshold,
     tx, ty = template.shape[1], template.shape[0]
     # 进行模板匹配
     result = cv2.matchTemplate(source, template, cv2.TM_CCOEFF_NORMED, mask=mask)
+    return get_match_result_list(result, threshold, tx, ty, only_best=only_best, ignore_inf=ignore_inf)
+
 
+def get_match_result_list(result: np.ndarray, threshold: float, tw: int, th: int,
+                          only_best: bool = True, ignore_inf: bool = False,
+                          merge_distance: float = 10) -> MatchResultList:
+    """
+    从模板匹配的结果矩阵中提取匹配结果
+    只要最好的结果时直接取最大值
+    需要多个结果时 按置信度从高到低做非极大值抑制 距离 merge_distance 内只保留置信度最高的一个
+    :param result: cv2.matchTemplate 的结果
+    :param threshold: 阈值
+    :param tw: 模板的宽度
+    :param th: 模板的高度
+    :param only_best: 只返回最好的结果
+    :param ignore_inf: 是否忽略无限大的结果
+    :param merge_distance: 合并的距离
+    :return: 所有匹配结果 多个结果时按从上到下、从左到右的顺序
+    """
     match_result_list = MatchResultList(only_best=only_best)
-    filtered_locations = np.where(np.logical_and(
-        result >= threshold,
-        np.isfinite(result) if ignore_inf else np.ones_like(result))
-    )  # 过滤低置信度的匹配结果
+    valid = result >= threshold  # 过滤低置信度的匹配结果 NaN 也会被过滤
+    if ignore_inf:
+        valid &= np.isfinite(result)
+
+    if only_best:
+        # argmax 取第一个最大值 与逐个像素比较时保留先出现的结果一致
+        idx = int(np.argmax(np.where(valid, result, -np.inf)))
+        y, x = divmod(idx, result.shape[1])
+        if valid[y, x]:
+            match_result_list.append(MatchResult(result[y, x], x, y, tw, th))
+        return match_result_list
 
-    # 遍历所有匹配结果，并输出位置和置信度
-    for pt in zip(*filtered_locations[::-1]):
-        confidence = result[pt[1], pt[0]]  # 获取置信度
-        match_result_list.append(MatchResult(confidence, pt[0], pt[1], tx, ty))
+    ys, xs = np.nonzero(valid)
+    if len(ys) == 0:
+        return match_result_list
+    confidences = result[ys, xs]
+    order = np.argsort(-confidences, kind='stable')  # 置信度相同时保留先出现的
+    ys, xs, confidences = ys[order], xs[order], confidences[order]
+
+    keep: List[int] = []
+    remain = np.arange(len(ys))  # 未被抑制的下标 每次只和剩下的比较
+    while len(remain) > 0:
+        i = remain[0]
+        keep.append(i)
+        near = (xs[remain] - xs[i]) ** 2 + (ys[remain] - ys[i]) ** 2 <= merge_distance ** 2
+        remain = remain[~near]
+
+    keep.sort(key=lambda k: (ys[k], xs[k]))
+    for i in keep:
+        match_result_list.append(MatchResult(confidences[i], xs[i], ys[i], tw, th), auto_merge=False)
 
     return match_result_list
 
@@ -293,18 +336,113 @@ def feature_keypoints_from_np(np_arr):
                                   response=kp[4], octave=int(kp[5]), class_id=int(kp[6])) for kp in np_arr])
 
 
+def get_feature_matcher() -> cv2.BFMatcher:
+    """
+    获取当前线程复用的特征匹配器 不需要每次匹配都创建
+    :return:
+    """
+    matcher = getattr(_feature_matcher_local, 'matcher', None)
+    if matcher is None:
+        matcher = cv2.BFMatcher()
+        _feature_matcher_local.matcher = matcher
+    return matcher
+
+
+class FeatureTemplateGroup:
+
+    def __init__(self, template_id_list: List[str], kps_list: List, desc_list: List[Optional[np.ndarray]]):
+        """
+        一组模板的特征 描述子预先合并成一个矩阵
+        匹配时一次knn就可以得到所有模板的结果 再按模板拆分
+        :param template_id_list: 模板id
+        :param kps_list: 每个模板的特征点
+        :param desc_list: 每个模板的描述符 没有特征点的为空
+        """
+        self.template_id_list: List[str] = template_id_list
+        self.kps_list: List = kps_list
+        self.offset_list: List[int] = []  # 每个模板的描述符 在合并矩阵中的开始行
+        self.cnt_list: List[int] = []  # 每个模板的描述符数量
+
+        to_stack = []
+        offset = 0
+        for kps, desc in zip(kps_list, desc_list):
+            cnt = 0 if kps is None or desc is None else len(kps)
+            self.offset_list.append(offset)
+            self.cnt_list.append(cnt)
+            if cnt > 0:
+                to_stack.append(desc)
+            offset += cnt
+
+        self.desc: Optional[np.ndarray] = np.vstack(to_stack) if len(to_stack) > 0 else None
+
+
+def feature_knn_match_group(group: FeatureTemplateGroup, source_desc, k: int = 2) -> List:
+    """
+    一次knn匹配一组模板 结果与每个模板单独匹配的一致
+    :param group: 模板组
+    :param source_desc: 源图描述子
+    :param k: knn的k
+    :return: 每个模板的knn结果 queryIdx 为合并矩阵中的下标 需要减去 group.offset_list 中对应的值
+    """
+    if group.desc is None or source_desc is None or len(source_desc) == 0:
+        return [[] for _ in group.template_id_list]
+
+    matches = get_feature_matcher().knnMatch(group.desc, source_desc, k=k)
+    return [matches[offset:offset + cnt] for offset, cnt in zip(group.offset_list, group.cnt_list)]
+
+
+def feature_match_for_group(source_kp, source_desc, group: FeatureTemplateGroup,
+                            source_mask: Optional[MatLike] = None) -> dict:
+    """
+    使用一组模板进行特征匹配 每个模板的结果与 feature_match 一致
+    :param source_kp: 源图关键点
+    :param source_desc: 源图描述子
+    :param group: 模板组
+    :param source_mask: 源图掩码
+    :return: 模板id -> feature_match 的结果
+    """
+    result = {}
+    if len(source_kp) == 0:
+        for template_id in group.template_id_list:
+            result[template_id] = (None, None, None, None)
+        return result
+
+    knn_list = feature_knn_match_group(group, source_desc, k=2)
+    for template_id, template_kp, matches, offset in zip(group.template_id_list, group.kps_list,
+                                                         knn_list, group.offset_list):
+        if template_kp is None or len(template_kp) == 0:
+            result[template_id] = (None, None, None, None)
+        else:
+            result[template_id] = feature_match_by_knn(source_kp, template_kp, matches,
+                                                       source_mask=source_mask, query_offset=offset)
+    return result
+
+
 def feature_match(source_kp, source_desc, template_kp, template_desc,
                   source_mask: Optional[MatLike] = None):
     if len(source_kp) == 0 or len(template_kp) == 0:
         return None, None, None, None
 
-    # feature_matcher = cv2.FlannBasedMatcher()
-    feature_matcher = cv2.BFMatcher()
-    matches = feature_matcher.knnMatch(template_desc, source_desc, k=2)
+    matches = get_feature_matcher().knnMatch(template_desc, source_desc, k=2)
+    return feature_match_by_knn(source_kp, template_kp, matches, source_mask=source_mask)
+
+
+def feature_match_by_knn(source_kp, template_kp, matches, source_mask: Optional[MatLike] = None,
+                         query_offset: int = 0):
+    """
+    根据knn的结果 计算模板在源图上的位置
+    :param source_kp: 源图关键点
+    :param template_kp: 模板关键点
+    :param matches: 模板描述子在源图描述子上的knn结果 k=2
+    :param source_mask: 源图掩码
+    :param query_offset: 模板组一起匹配时 本模板描述子在合并矩阵中的开始行
+    :return: 筛选后的匹配点, 横坐标偏移, 纵坐标偏移, 缩放比例
+    """
     # 应用比值测试，筛选匹配点
     good_matches = []
     for m, n in matches:
         if m.distance < 0.75 * n.distance:
+            m.queryIdx -= query_offset  # 只修正留下来的匹配点
             good_matches.append(m)
 
     if len(good_matches) < 4:  # 不足4个优秀匹配点时 不能使用RANSAC
@@ -361,9 +499,7 @@ def feature_match_for_one(source_kp, source_desc, template_kp, template_desc,
     if len(source_kp) == 0 or len(template_kp) == 0:
         return None
 
-    # feature_matcher = cv2.FlannBasedMatcher()
-    feature_matcher = cv2.BFMatcher()
-    matches = feature_matcher.knnMatch(template_desc, source_desc, k=2)
+    matches = get_feature_matcher().knnMatch(template_desc, source_desc, k=2)
     # 应用比值测试，筛选匹配点
     good_matches = []
     for t in matches:
@@ -433,9 +569,7 @@ def feature_match_for_multi(
     if len(source_kp) == 0 or len(template_kp) == 0:
         return match_result_list
 
-    # feature_matcher = cv2.FlannBasedMatcher()
-    feature_matcher = cv2.BFMatcher()
-    matches = feature_matcher.knnMatch(template_desc, source_desc, k=3)
+    matches = get_feature_matcher().knnMatch(template_desc, source_desc, k=3)
     # 应用比值测试，筛选匹配点
     good_matches = []
     for m, n, p in matches:
@@ -493,19 +627,50 @@ def connection_erase(mask: MatLike, threshold: int = 50, erase_white: bool = Tru
     :return: 消除噪点后的图
     """
     to_check_connection = mask if erase_white else cv2.bitwise_not(mask)
-    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(to_check_connection, connectivity=connectivity)
-    large_components = []
-    for label in range(1, num_labels):
-        if stats[label, cv2.CC_STAT_AREA] < threshold:
-            large_components.append(label)
+    small_components = get_connected_component_mask(to_check_connection, connectivity=connectivity,
+                                                     max_area=threshold - 1)
 
     result = mask.copy()
-    for label in large_components:
-        result[labels == label] = 0 if erase_white else 255
+    result[small_components > 0] = 0 if erase_white else 255
 
     return result
 
 
+def get_connected_component_mask(mask: MatLike, connectivity: int = 8,
+                                 min_area: Optional[int] = None, max_area: Optional[int] = None,
+                                 min_width: Optional[int] = None, max_width: Optional[int] = None,
+                                 min_height: Optional[int] = None, max_height: Optional[int] = None) -> MatLike:
+    """
+    连通性检测后 保留满足条件的连通块
+    根据每个连通块的统计信息生成一个是否保留的查找表 再一次性映射到整张图上
+    :param mask: 黑白图 掩码图 对白色部分做连通性检测
+    :param connectivity: 连通性检测方向 4 or 8
+    :param min_area: 最小面积(包含)
+    :param max_area: 最大面积(包含)
+    :param min_width: 外接矩形的最小宽度(包含)
+    :param max_width: 外接矩形的最大宽度(包含)
+    :param min_height: 外接矩形的最小高度(包含)
+    :param max_height: 外接矩形的最大高度(包含)
+    :return: 满足条件的连通块为255 其余为0
+    """
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=connectivity)
+    keep = np.ones(num_labels, dtype=bool)
+    keep[0] = False  # 0是背景
+
+    for stat_idx, min_value, max_value in [
+        (cv2.CC_STAT_AREA, min_area, max_area),
+        (cv2.CC_STAT_WIDTH, min_width, max_width),
+        (cv2.CC_STAT_HEIGHT, min_height, max_height),
+    ]:
+        if min_value is not None:
+            keep &= stats[:, stat_idx] >= min_value
+        if max_value is not None:
+            keep &= stats[:, stat_idx] <= max_value
+
+    lut = np.where(keep, 255, 0).astype(np.uint8)
+    return lut[labels]
+
+
 def crop_image(img, rect: Rect = None, copy: bool = False) -> Tuple[MatLike, Optional[Rect]]:
     """
     裁剪图片 裁剪区域可能超出图片范围
@@ -716,6 +881,22 @@ def scale_image(img: Optional[MatLike] = None, scale: Optional[float] = None, co
     return cv2.resize(img, target_size)
 
 
+def get_pyramid_image(image: MatLike, pyramid_scale: float = PYRAMID_SCALE,
+                      pyramid_image: Optional[MatLike] = None) -> MatLike:
+    """
+    获取按图像金字塔比例缩小的图片
+    :param image: 原图
+    :param pyramid_scale: 缩小比例
+    :param pyramid_image: 预先缩小好的图片 例如大地图 bundle 中保存的 尺寸符合时直接使用
+    :return: 缩小后的图片
+    """
+    if pyramid_image is not None:
+        expected_shape = (round(image.shape[0] * pyramid_scale), round(image.shape[1] * pyramid_scale))
+        if pyramid_image.shape[:2] == expected_shape:
+            return pyramid_image
+    return cv2.resize(image, None, fx=pyramid_scale, fy=pyramid_scale, interpolation=cv2.INTER_AREA)
+
+
 def to_base64(img: MatLike) -> str:
     """
     将图片转化成base64编码展示
@@ -768,3 +949,25 @@ def color_in_range(img: MatLike, lower: List[int], upper: List[int],
         return part
     else:
         return connection_erase(part, noise_threshold)
+
+
+def get_thumbnail(img: MatLike, width: int = 64) -> MatLike:
+    """
+    缩小成灰度的缩略图 用于快速比较两个画面的差异
+    :param img: 原图
+    :param width: 缩略图宽度 高度按比例缩放
+    :return: 缩略图
+    """
+    gray = img if len(img.shape) == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    height = max(1, round(gray.shape[0] * width / gray.shape[1]))
+    return cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def get_mean_diff(img1: MatLike, img2: MatLike) -> float:
+    """
+    两张相同大小图片的平均像素差
+    :param img1: 图片1
+    :param img2: 图片2
+    :return: 平均差 0~255
+    """
+    return float(np.mean(cv2.absdiff(img1, img2)))
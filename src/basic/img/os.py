@@ -1,11 +1,12 @@
 import os
+import threading
 import time
 from typing import Optional
 
 import cv2
 from cv2.typing import MatLike
 
-from basic import os_utils
+from basic import os_utils, debug_utils
 from basic.img import cv2_utils
 from basic.log_utils import log
 
@@ -14,6 +15,10 @@ def get_debug_image_dir():
     return os_utils.get_path_under_work_dir('.debug', 'images')
 
 
+def get_debug_screenshot_dir():
+    return os_utils.get_path_under_work_dir('.debug', 'screenshot')
+
+
 def get_debug_world_patrol_dir():
     return os_utils.get_path_under_work_dir('.debug', 'world_patrol')
 
@@ -44,10 +49,52 @@ def get_test_image(filename, suffix: str = '.png', sub_dir: str = None) -> MatLi
     return cv2_utils.read_image(get_test_image_path(filename, suffix, sub_dir))
 
 
-def save_debug_image(image, file_name: Optional[str] = None, prefix: str = '') -> str:
+_last_file_time: int = 0
+_file_time_lock = threading.Lock()
+
+
+def _get_file_time() -> int:
+    """
+    用于文件名的毫秒时间 同一毫秒内多次调用时顺延 保证文件名不重复
+    :return:
+    """
+    global _last_file_time
+    with _file_time_lock:
+        _last_file_time = max(round(time.time() * 1000), _last_file_time + 1)
+        return _last_file_time
+
+
+def save_debug_image(image, file_name: Optional[str] = None, prefix: Optional[str] = None) -> Optional[str]:
+    """
+    保存调试图片
+    :param image: 图片
+    :param file_name: 文件名 传入时同步保存 之后可以用 get_debug_image 读取
+    :param prefix: 不传入文件名时必须传入 使用前缀加时间作为文件名 在后台保存 同一前缀每分钟有数量限制
+    :return: 文件名 因为频率限制或者队列已满没有保存时返回空
+    """
     if file_name is None:
-        file_name = '%s_%d' % (prefix, round(time.time() * 1000))
+        if not prefix:
+            raise ValueError('没有文件名时需要传入前缀')
+        file_name = '%s_%d' % (prefix, _get_file_time())
+        path = debug_utils.get_debug_image_writer().save_image(os.path.join(get_debug_image_dir(), file_name),
+                                                               image, key=prefix)
+        if path is None:
+            log.debug('临时图片未保存 %s', file_name)
+            return None
+        log.debug('临时图片保存 %s', path)
+        return file_name
     path = get_debug_image_path(file_name)
     log.debug('临时图片保存 %s', path)
     cv2.imwrite(path, image)
     return file_name
+
+
+def save_debug_screenshot(image) -> str:
+    """
+    保存手动截取的图片 同步保存 不受调试图片的频率限制和大小控制
+    :param image: 图片
+    :return: 保存的路径
+    """
+    path = os.path.join(get_debug_screenshot_dir(), '_%d.png' % _get_file_time())
+    cv2.imwrite(path, image)
+    return path
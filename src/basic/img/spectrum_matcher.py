@@ -0,0 +1,97 @@
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+
+class SpectrumMatcher:
+
+    def __init__(self, source: MatLike, template_shape: Tuple[int, int]):
+        """
+        基于频域的带掩码模板匹配 结果与 cv2.matchTemplate(TM_CCOEFF_NORMED, mask) 一致
+        原图的频谱只在创建时计算一次 之后同样大小的模板(例如不同缩放比例)都复用这份频谱
+        :param source: 原图 单通道或多通道
+        :param template_shape: 模板的高和宽
+        """
+        source = source.astype(np.float32)
+        if source.ndim == 2:
+            source = source[:, :, np.newaxis]
+        # 减去均值 不影响归一化相关系数 但能减少 float32 下平方和相减时的精度损失
+        source -= source.reshape(-1, source.shape[2]).mean(axis=0)
+
+        self.source_height, self.source_width, self.channels = source.shape
+        self.template_height, self.template_width = template_shape[:2]
+        self.result_height: int = self.source_height - self.template_height + 1
+        self.result_width: int = self.source_width - self.template_width + 1
+
+        # 频谱尺寸不小于原图即可 有效区域内的循环相关不会发生回绕
+        self.dft_height: int = cv2.getOptimalDFTSize(self.source_height)
+        self.dft_width: int = cv2.getOptimalDFTSize(self.source_width)
+
+        if not self.valid:
+            return
+
+        self.source_spectrum: List[np.ndarray] = [self._spectrum(source[:, :, c]) for c in range(self.channels)]
+        # 各通道平方的频谱可以先相加 之后只需要一次逆变换
+        square_spectrum = self._spectrum(source[:, :, 0] * source[:, :, 0])
+        for c in range(1, self.channels):
+            square_spectrum += self._spectrum(source[:, :, c] * source[:, :, c])
+        self.square_spectrum: np.ndarray = square_spectrum
+
+    @property
+    def valid(self) -> bool:
+        """
+        原图是否不小于模板
+        :return:
+        """
+        return self.result_height > 0 and self.result_width > 0
+
+    def match(self, template: MatLike, mask: MatLike) -> Optional[np.ndarray]:
+        """
+        使用带掩码的 TM_CCOEFF_NORMED 进行匹配
+        :param template: 模板 大小需要与创建时一致
+        :param mask: 模板掩码 非0的部分参与匹配
+        :return: 匹配结果 与 cv2.matchTemplate 的结果大小一致 可能包含无限大或NaN。原图比模板小或掩码为空时返回空
+        """
+        if not self.valid:
+            return None
+        template = template.astype(np.float32).reshape(self.template_height, self.template_width, self.channels)
+        mask = (mask > 0).astype(np.float32)
+        n = float(np.sum(mask))
+        if n == 0:
+            return None
+
+        mask_spectrum = self._spectrum(mask)
+        square_sum = self._correlate(self.square_spectrum, mask_spectrum)
+
+        numerator = None  # 分子部分 各通道的频谱相加后只需一次逆变换
+        template_square_sum: float = 0  # 模板的方差和
+        source_square_sum = square_sum  # 原图各窗口的方差和
+        for c in range(self.channels):
+            t = template[:, :, c]
+            t_mean = float(np.sum(t * mask)) / n
+            t_zero_mean = (t - t_mean) * mask
+            template_square_sum += float(np.sum(t_zero_mean * t_zero_mean))
+
+            product = cv2.mulSpectrums(self.source_spectrum[c], self._spectrum(t_zero_mean), 0, conjB=True)
+            numerator = product if numerator is None else numerator + product
+
+            window_sum = self._correlate(self.source_spectrum[c], mask_spectrum)
+            source_square_sum = source_square_sum - window_sum * window_sum / n
+
+        numerator = self._inverse(numerator)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return numerator / np.sqrt(template_square_sum * np.maximum(source_square_sum, 0))
+
+    def _spectrum(self, image: np.ndarray) -> np.ndarray:
+        padded = np.zeros((self.dft_height, self.dft_width), dtype=np.float32)
+        padded[:image.shape[0], :image.shape[1]] = image
+        return cv2.dft(padded, flags=cv2.DFT_COMPLEX_OUTPUT)
+
+    def _correlate(self, source_spectrum: np.ndarray, kernel_spectrum: np.ndarray) -> np.ndarray:
+        return self._inverse(cv2.mulSpectrums(source_spectrum, kernel_spectrum, 0, conjB=True))
+
+    def _inverse(self, spectrum: np.ndarray) -> np.ndarray:
+        result = cv2.idft(spectrum, flags=cv2.DFT_REAL_OUTPUT | cv2.DFT_SCALE)
+        return result[:self.result_height, :self.result_width]
@@ -1,11 +1,104 @@
+import atexit
+import copy
 import logging
 import os
-from logging.handlers import TimedRotatingFileHandler
+import queue
+import threading
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
+from typing import Dict, Optional
 
 from basic import os_utils
 
+# 这些类型的参数不会再被修改 可以放到后台线程再格式化
+_IMMUTABLE_ARG_TYPES = (str, int, float, bool, bytes, type(None))
+
+
+class DropOldestQueueHandler(QueueHandler):
+
+    def __init__(self, log_queue: queue.Queue):
+        """
+        把日志放入有界队列 由后台线程写文件和控制台 调用方不做磁盘IO
+        队列满时丢弃最旧的日志 保证调用方永远不会被阻塞
+        :param log_queue: 有界队列
+        """
+        super().__init__(log_queue)
+        self.dropped_cnt: int = 0
+        self._drop_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        入队前的处理 参数都是不可变类型时不在这里格式化 留给后台线程
+        :param record: 日志
+        :return: 入队的日志
+        """
+        record = copy.copy(record)
+        if record.args and not _is_immutable_args(record.args):  # 参数之后可能被修改 需要现在格式化
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:  # 异常堆栈引用了调用方的帧 现在转成文本
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped_cnt += 1
+                except queue.Empty:
+                    pass
+                try:
+                    self.queue.put_nowait(record)
+                except queue.Full:
+                    self.dropped_cnt += 1
+
+
+class BlockingStopQueueListener(QueueListener):
+
+    def enqueue_sentinel(self) -> None:
+        """
+        停止时等待队列有空位 保证之前的日志都能写完
+        :return:
+        """
+        self.queue.put(self._sentinel)
+
+
+class ModuleLevelFilter(logging.Filter):
+
+    def __init__(self):
+        """
+        按模块过滤日志等级 运行时可以修改
+        模块名为日志所在的文件名 不带后缀
+        """
+        super().__init__()
+        self.module_level: Dict[str, int] = {}
+        self.default_level: Optional[int] = None  # 为了单独开启某些模块 降低了logger等级时 其它模块使用原来的等级
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        level = self.module_level.get(record.module)
+        if level is None:
+            level = self.default_level
+        return level is None or record.levelno >= level
+
+
+def _is_immutable_args(args) -> bool:
+    if isinstance(args, dict):
+        return all(isinstance(i, _IMMUTABLE_ARG_TYPES) for i in args.values())
+    return all(isinstance(i, _IMMUTABLE_ARG_TYPES) for i in args)
+
+
+_log_queue: queue.Queue = queue.Queue(maxsize=10000)
+_queue_handler: DropOldestQueueHandler = DropOldestQueueHandler(_log_queue)
+_module_filter: ModuleLevelFilter = ModuleLevelFilter()
+_queue_handler.addFilter(_module_filter)
+_listener: Optional[QueueListener] = None
+
 
 def get_logger():
+    global _listener
     logger = logging.getLogger('StarRailOneDragon')
     logger.handlers.clear()
     logger.setLevel(logging.DEBUG if os_utils.is_debug() else logging.INFO)
@@ -13,17 +106,96 @@ def get_logger():
     formatter = logging.Formatter('[%(asctime)s.%(msecs)03d] [%(filename)s %(lineno)d] [%(levelname)s]: %(message)s', '%H:%M:%S')
 
     log_file_path = os.path.join(os_utils.get_path_under_work_dir('.log'), 'log.txt')
+    # 等级由 logger 和模块过滤控制 这里不再过滤
     archive_handler = TimedRotatingFileHandler(log_file_path, when='midnight', interval=1, backupCount=3, encoding='utf-8')
-    archive_handler.setLevel(logging.DEBUG if os_utils.is_debug() else logging.INFO)
     archive_handler.setFormatter(formatter)
-    logger.addHandler(archive_handler)
 
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.DEBUG if os_utils.is_debug() else logging.INFO)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+
+    if _listener is not None:
+        _listener.stop()
+    # 文件和控制台在后台线程写入 调用方只需要放入队列
+    _listener = BlockingStopQueueListener(_log_queue, archive_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    logger.addHandler(_queue_handler)
 
     return logger
 
 
+def add_handler(handler: logging.Handler) -> None:
+    """
+    增加一个在后台线程处理日志的handler 例如界面上的日志
+    直接 log.addHandler 会在调用方的线程中处理
+    :param handler: handler
+    :return:
+    """
+    if _listener is None:
+        logging.getLogger('StarRailOneDragon').addHandler(handler)
+        return
+    _listener.handlers = _listener.handlers + (handler,)
+
+
+def set_module_level(module: str, level: Optional[int]) -> None:
+    """
+    运行时修改某个模块的日志等级
+    :param module: 模块名 即日志所在的文件名 不带后缀
+    :param level: 日志等级 为空时恢复默认
+    :return:
+    """
+    if level is None:
+        _module_filter.module_level.pop(module, None)
+    else:
+        _module_filter.module_level[module] = level
+    _update_logger_level()
+
+
+def reset_module_level(module_level: Dict[str, str]) -> None:
+    """
+    按配置重新设置各模块的日志等级 不在配置中的模块恢复默认
+    :param module_level: 模块名 -> 等级名称 例如 DEBUG
+    :return:
+    """
+    _module_filter.module_level.clear()
+    for module, level_name in module_level.items():
+        level = logging.getLevelName(str(level_name).upper())
+        if not isinstance(level, int):
+            log.warning('日志等级配置错误 %s: %s', module, level_name)
+            continue
+        _module_filter.module_level[module] = level
+    _update_logger_level()
+
+
+def _update_logger_level() -> None:
+    """
+    logger 的等级降到各模块中最低的 其它模块由过滤器保持原来的等级
+    :return:
+    """
+    if _module_filter.default_level is None:
+        _module_filter.default_level = log.level
+    min_level = min([_module_filter.default_level] + list(_module_filter.module_level.values()))
+    log.setLevel(min_level)
+
+
+def get_dropped_cnt() -> int:
+    """
+    队列满了被丢弃的日志数量
+    :return:
+    """
+    return _queue_handler.dropped_cnt
+
+
+def shutdown() -> None:
+    """
+    等待队列中的日志都写完后 停止后台线程 仅在退出时调用
+    之后的日志不会再被写入
+    :return:
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 log = get_logger()
+atexit.register(shutdown)
@@ -0,0 +1,192 @@
+import os
+import threading
+from typing import Optional, List, Tuple
+
+import onnxruntime as ort
+
+from basic.log_utils import log
+
+EXECUTION_MODE_SEQUENTIAL: str = 'sequential'
+EXECUTION_MODE_PARALLEL: str = 'parallel'
+
+GRAPH_OPTIMIZATION_LEVEL_MAP: dict = {
+    'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+PARALLEL_SESSION_CNT: int = 2  # 可能同时推理的大模型数量 例如OCR的检测模型和YOLO 默认线程数由它们平分
+
+
+class OnnxSessionConfig:
+
+    def __init__(self,
+                 intra_op_num_threads: int = 0,
+                 inter_op_num_threads: int = 1,
+                 execution_mode: str = EXECUTION_MODE_SEQUENTIAL,
+                 graph_optimization_level: str = 'all',
+                 enable_mem_arena: bool = True,
+                 optimized_model_dir: Optional[str] = None):
+        """
+        创建 onnxruntime 会话的参数
+        :param intra_op_num_threads: 算子内并行的线程数 0时自动分配 见 get_default_thread_num
+        :param inter_op_num_threads: 算子间并行的线程数 只在并行模式下生效
+        :param execution_mode: 执行模式 sequential / parallel 模型分支不多 一般顺序执行即可
+        :param graph_optimization_level: 图优化等级 disable / basic / extended / all
+        :param enable_mem_arena: 是否使用内存池
+        :param optimized_model_dir: 优化后模型的保存目录 为空时不保存。保存后下次直接加载 跳过图优化
+        """
+        self.intra_op_num_threads: int = intra_op_num_threads
+        self.inter_op_num_threads: int = inter_op_num_threads
+        self.execution_mode: str = execution_mode
+        self.graph_optimization_level: str = graph_optimization_level
+        self.enable_mem_arena: bool = enable_mem_arena
+        self.optimized_model_dir: Optional[str] = optimized_model_dir
+
+    @property
+    def key(self) -> Tuple:
+        """
+        参数相同的会话可以共用
+        :return:
+        """
+        return (self.intra_op_num_threads, self.inter_op_num_threads, self.execution_mode,
+                self.graph_optimization_level, self.enable_mem_arena, self.optimized_model_dir)
+
+
+_session_map: dict = {}
+_session_lock = threading.Lock()
+
+
+def get_default_thread_num(light: bool = False) -> int:
+    """
+    默认的算子内线程数
+    所有模型共用CPU核数的一半 避免和截图、图片匹配等线程抢占
+    小模型固定1个线程 其余由可能同时推理的大模型平分
+    :param light: 是否小模型 例如OCR的方向分类和文本识别
+    :return:
+    """
+    if light:
+        return 1
+    cpu_cnt = os.cpu_count()
+    return 1 if cpu_cnt is None else max(1, cpu_cnt // 2 // PARALLEL_SESSION_CNT)
+
+
+def get_providers(cuda: bool = False) -> List[str]:
+    """
+    获取可用的推理后端
+    :param cuda: 是否使用CUDA
+    :return:
+    """
+    if cuda:
+        if 'CUDAExecutionProvider' in ort.get_available_providers():
+            return ['CUDAExecutionProvider']
+        log.error('机器未支持CUDA 使用CPU')
+    return ['CPUExecutionProvider']
+
+
+def get_session_options(config: OnnxSessionConfig, optimized_model_path: Optional[str] = None,
+                        light: bool = False) -> ort.SessionOptions:
+    """
+    根据配置生成会话参数
+    :param config: 配置
+    :param optimized_model_path: 优化后模型的保存路径
+    :param light: 是否小模型 配置没有指定线程数时使用
+    :return:
+    """
+    sess_options = ort.SessionOptions()
+    sess_options.intra_op_num_threads = (config.intra_op_num_threads if config.intra_op_num_threads > 0
+                                         else get_default_thread_num(light))
+    sess_options.inter_op_num_threads = max(config.inter_op_num_threads, 0)
+    sess_options.execution_mode = (ort.ExecutionMode.ORT_PARALLEL if config.execution_mode == EXECUTION_MODE_PARALLEL
+                                   else ort.ExecutionMode.ORT_SEQUENTIAL)
+    sess_options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVEL_MAP.get(
+        config.graph_optimization_level, ort.GraphOptimizationLevel.ORT_ENABLE_ALL)
+    sess_options.enable_cpu_mem_arena = config.enable_mem_arena
+    if optimized_model_path is not None:
+        sess_options.optimized_model_filepath = optimized_model_path
+    return sess_options
+
+
+def get_optimized_model_path(model_path: str, config: OnnxSessionConfig, providers: List[str]) -> Optional[str]:
+    """
+    优化后模型的保存路径 优化结果与推理后端、优化等级、onnxruntime版本相关 都体现在文件名上
+    :param model_path: 原模型路径
+    :param config: 配置
+    :param providers: 推理后端
+    :return: 不保存时返回空
+    """
+    if config.optimized_model_dir is None:
+        return None
+    model_name = os.path.splitext(os.path.basename(model_path))[0]
+    parent_name = os.path.basename(os.path.dirname(os.path.abspath(model_path)))
+    provider_name = providers[0].replace('ExecutionProvider', '').lower()
+    file_name = '%s_%s_%s_%s_ort%s.onnx' % (parent_name, model_name, provider_name,
+                                            config.graph_optimization_level, ort.__version__)
+    return os.path.join(config.optimized_model_dir, file_name)
+
+
+def create_session(model_path: str, cuda: bool = False,
+                   config: Optional[OnnxSessionConfig] = None,
+                   light: bool = False) -> ort.InferenceSession:
+    """
+    创建一个新的会话
+    有优化后模型的缓存时 直接加载缓存 否则加载原模型 并按配置保存优化后的模型
+    :param model_path: 模型路径
+    :param cuda: 是否使用CUDA
+    :param config: 配置 为空时使用默认配置
+    :param light: 是否小模型 配置没有指定线程数时只使用1个线程
+    :return:
+    """
+    if config is None:
+        config = OnnxSessionConfig()
+    providers = get_providers(cuda)
+    optimized_path = get_optimized_model_path(model_path, config, providers)
+
+    if (optimized_path is not None and os.path.exists(optimized_path)
+            and os.path.getmtime(optimized_path) >= os.path.getmtime(model_path)):
+        sess_options = get_session_options(config, light=light)
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL  # 已经优化过了
+        try:
+            log.info('加载优化后的模型 %s', optimized_path)
+            return ort.InferenceSession(optimized_path, sess_options=sess_options, providers=providers)
+        except Exception:
+            log.error('加载优化后的模型失败 重新加载原模型 %s', model_path, exc_info=True)
+
+    if optimized_path is not None:  # 需要保存时才创建文件夹
+        os.makedirs(os.path.dirname(optimized_path), exist_ok=True)
+    sess_options = get_session_options(config, optimized_path, light)
+    log.info('加载模型 %s', model_path)
+    return ort.InferenceSession(model_path, sess_options=sess_options, providers=providers)
+
+
+def get_session(model_path: str, cuda: bool = False,
+                config: Optional[OnnxSessionConfig] = None,
+                light: bool = False) -> ort.InferenceSession:
+    """
+    获取共用的会话 相同模型、后端和配置只会创建一次
+    InferenceSession.run 是线程安全的 多处使用同一个模型时不需要各自创建线程池
+    :param model_path: 模型路径
+    :param cuda: 是否使用CUDA
+    :param config: 配置 为空时使用默认配置
+    :param light: 是否小模型 配置没有指定线程数时只使用1个线程
+    :return:
+    """
+    if config is None:
+        config = OnnxSessionConfig()
+    key = (os.path.abspath(model_path), cuda, config.key, light)
+    with _session_lock:
+        session = _session_map.get(key)
+        if session is None:
+            session = create_session(model_path, cuda, config, light)
+            _session_map[key] = session
+        return session
+
+
+def clear_sessions() -> None:
+    """
+    清除所有共用的会话 之后再获取时会重新创建
+    :return:
+    """
+    with _session_lock:
+        _session_map.clear()
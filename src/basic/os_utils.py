@@ -150,21 +150,3 @@ def dt_day_diff(dt_1: str, dt_2: str) -> int:
     date2 = datetime.datetime.strptime(dt_2, "%Y%m%d")
     diff = date1 - date2
     return diff.days
-
-
-def clear_outdated_debug_files(days: int = 1):
-    """
-    清理过期的调试临时文件
-    :return:
-    """
-    directory = get_path_under_work_dir('.debug')
-    now = datetime.datetime.now()
-    cutoff = now - datetime.timedelta(days=days)
-
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            path = os.path.join(root, file)
-            stat = os.stat(path)
-            modified_time = datetime.datetime.fromtimestamp(stat.st_mtime)
-            if modified_time < cutoff:
-                os.remove(path)
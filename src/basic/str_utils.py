@@ -1,5 +1,7 @@
 import re
-from typing import Optional, List
+from collections import Counter
+from functools import lru_cache
+from typing import Optional, List, Tuple
 
 from basic.log_utils import log
 
@@ -44,25 +46,42 @@ def find_by_lcs(source: str, target: str, percent: float = 0.3,
 def longest_common_subsequence_length(str1: str, str2: str) -> int:
     """
     找两个字符串的最长公共子序列长度
+    使用位并行算法 (Hyyrö 2004) 用整数的每一位代表 str1 的一个字符 每处理 str2 的一个字符只需要几次位运算
     :param str1:
     :param str2:
     :return: 长度
     """
-    m = len(str1)
-    n = len(str2)
+    return lcs_length_by_match_mask(get_lcs_match_mask(str1), len(str1), str2)
 
-    # 创建一个二维数组用于存储中间结果
-    dp = [[0] * (n + 1) for _ in range(m + 1)]
 
-    # 动态规划求解
-    for i in range(1, m + 1):
-        for j in range(1, n + 1):
-            if str1[i - 1] == str2[j - 1]:
-                dp[i][j] = dp[i - 1][j - 1] + 1
-            else:
-                dp[i][j] = max(dp[i - 1][j], dp[i][j - 1])
+def get_lcs_match_mask(s: str) -> dict:
+    """
+    位并行LCS使用的字符掩码 第i位为1代表 s[i] 是这个字符
+    :param s: 字符串
+    :return: 字符 -> 掩码
+    """
+    match_mask = {}
+    for i, c in enumerate(s):
+        match_mask[c] = match_mask.get(c, 0) | (1 << i)
+    return match_mask
+
 
-    return dp[m][n]
+def lcs_length_by_match_mask(match_mask: dict, m: int, str2: str) -> int:
+    """
+    位并行计算最长公共子序列长度
+    :param match_mask: 第一个字符串的字符掩码 见 get_lcs_match_mask
+    :param m: 第一个字符串的长度
+    :param str2: 第二个字符串
+    :return: 长度
+    """
+    if m == 0:
+        return 0
+    full = (1 << m) - 1
+    v = full
+    for c in str2:
+        u = v & match_mask.get(c, 0)
+        v = ((v + u) | (v - u)) & full
+    return m - bin(v).count('1')
 
 
 def get_positive_digits(v: str, err: Optional[int] = 0) -> Optional[int]:
@@ -97,18 +116,74 @@ def find_best_match_by_lcs(word: str, target_word_list: List[str],
     :param lcs_percent_threshold: 要求的LCS阈值
     :return: 最符合的目标词的下标
     """
-    target_idx: Optional[int] = None
-    target_lcs_percent: Optional[float] = None
-
-    for idx, target_word in enumerate(target_word_list):
-        lcs = longest_common_subsequence_length(word, target_word)
-        if lcs == 0:  # 至少要有一个匹配
-            continue
-        lcs_percent = lcs * 1.0 / len(target_word)
-        if lcs_percent_threshold is not None and lcs_percent < lcs_percent_threshold:
-            continue
-        if target_idx is None or lcs_percent > target_lcs_percent:
-            target_idx = idx
-            target_lcs_percent = lcs_percent
-
-    return target_idx
+    if word is None or len(word) == 0:
+        return None
+    return get_lcs_index(tuple(target_word_list)).find_best_match(word, lcs_percent_threshold)
+
+
+class LcsIndex:
+
+    def __init__(self, target_word_list: Tuple[str, ...]):
+        """
+        用于在一组目标词中 找LCS比例最大的
+        预先建立 字符 -> 目标词 的倒排索引 LCS至少为1时一定有相同的字符 只需要计算有相同字符的目标词
+        再用相同字符的数量作为LCS的上限 按上限从大到小计算 上限已经不可能超过当前最优时提前结束
+        :param target_word_list: 目标词列表
+        """
+        self.target_word_list: Tuple[str, ...] = target_word_list
+        self.char_cnt_list: List[Counter] = [Counter(i) for i in target_word_list]
+        self.char_2_idx: dict[str, List[int]] = {}
+        for idx, target_word in enumerate(target_word_list):
+            for c in set(target_word):
+                if c not in self.char_2_idx:
+                    self.char_2_idx[c] = []
+                self.char_2_idx[c].append(idx)
+
+    def find_best_match(self, word: str, lcs_percent_threshold: Optional[float] = None) -> Optional[int]:
+        """
+        找出LCS比例最大的目标词 结果与逐个计算LCS一致 比例相同时取下标最小的
+        :param word: 候选词
+        :param lcs_percent_threshold: 要求的LCS阈值
+        :return: 最符合的目标词的下标
+        """
+        word_char_cnt = Counter(word)
+        candidate_set = set()
+        for c in word_char_cnt:
+            candidate_set.update(self.char_2_idx.get(c, []))
+
+        # 相同字符的数量 是LCS的上限
+        candidate_list = []
+        for idx in candidate_set:
+            target_char_cnt = self.char_cnt_list[idx]
+            upper_bound = sum(min(cnt, target_char_cnt[c]) for c, cnt in word_char_cnt.items())
+            candidate_list.append((upper_bound * 1.0 / len(self.target_word_list[idx]), idx))
+        candidate_list.sort(key=lambda x: (-x[0], x[1]))
+
+        match_mask = get_lcs_match_mask(word)
+        target_idx: Optional[int] = None
+        target_lcs_percent: Optional[float] = None
+        for upper_percent, idx in candidate_list:
+            if lcs_percent_threshold is not None and upper_percent < lcs_percent_threshold:
+                break
+            if target_idx is not None and upper_percent < target_lcs_percent:
+                break
+            lcs = lcs_length_by_match_mask(match_mask, len(word), self.target_word_list[idx])
+            lcs_percent = lcs * 1.0 / len(self.target_word_list[idx])
+            if lcs_percent_threshold is not None and lcs_percent < lcs_percent_threshold:
+                continue
+            if (target_idx is None or lcs_percent > target_lcs_percent
+                    or (lcs_percent == target_lcs_percent and idx < target_idx)):
+                target_idx = idx
+                target_lcs_percent = lcs_percent
+
+        return target_idx
+
+
+@lru_cache(maxsize=64)
+def get_lcs_index(target_word_list: Tuple[str, ...]) -> LcsIndex:
+    """
+    获取目标词列表的索引 相同列表只建立一次
+    :param target_word_list: 目标词列表
+    :return:
+    """
+    return LcsIndex(target_word_list)
@@ -357,6 +357,5 @@ def clear_after_shutdown():
 if __name__ == '__main__':
     if os_utils.is_debug():
         logging.getLogger("flet_core").setLevel(logging.INFO)
-    # os_utils.clear_outdated_debug_files(1)  # 清理文件
     ft.app(target=run_app, name='StarRailOneDragon')  # 这里会阻塞运行
     clear_after_shutdown()
@@ -3,7 +3,7 @@ import logging
 import flet as ft
 
 from basic import os_utils
-from basic.log_utils import log
+from basic import log_utils
 from gui import components
 from gui.sr_basic_view import SrBasicView
 from sr.context.context import Context
@@ -32,7 +32,7 @@ class LogView(components.Card, SrBasicView):
         self.ctx: Context = ctx
 
         log_list = ft.ListView(spacing=10, auto_scroll=True)
-        log.addHandler(GuiHandler(page, list_view=log_list))
+        log_utils.add_handler(GuiHandler(page, list_view=log_list))
 
         title = components.CardTitleText('日志记录')
 
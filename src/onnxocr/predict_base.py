@@ -1,17 +1,12 @@
-import onnxruntime
+from basic import onnx_utils
 
 class PredictBase(object):
     def __init__(self):
         pass
 
-    def get_onnx_session(self, model_dir, use_gpu):
-        # 使用gpu
-        if use_gpu:
-            providers = providers=['CUDAExecutionProvider']
-        else:
-            providers = providers = ['CPUExecutionProvider']
-
-        onnx_session = onnxruntime.InferenceSession(model_dir, None,providers=providers)
+    def get_onnx_session(self, model_dir, use_gpu, session_config=None, light=False):
+        # 使用共用的会话 线程数等参数见 onnx_utils.OnnxSessionConfig 小模型默认只用1个线程
+        onnx_session = onnx_utils.get_session(model_dir, cuda=use_gpu, config=session_config, light=light)
 
         # print("providers:", onnxruntime.get_device())
         return onnx_session
@@ -44,7 +44,8 @@ class TextDetector(PredictBase):
         self.postprocess_op = DBPostProcess(**postprocess_params)
 
         # 初始化模型
-        self.det_onnx_session = self.get_onnx_session(args.det_model_dir, args.use_gpu)
+        self.det_onnx_session = self.get_onnx_session(args.det_model_dir, args.use_gpu,
+                                                      getattr(args, 'session_config', None))
         self.det_input_name = self.get_input_name(self.det_onnx_session)
         self.det_output_name = self.get_output_name(self.det_onnx_session)
 
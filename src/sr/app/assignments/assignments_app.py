@@ -74,7 +74,7 @@ class AssignmentsApp(Application):
             return self.round_success(AssignmentsApp.STATUS_NO_ALERT)
         else:
             self.ctx.controller.click(result.center)
-            return self.round_success(AssignmentsApp.STATUS_WITH_ALERT, wait=2)
+            return self.round_success(AssignmentsApp.STATUS_WITH_ALERT, wait=2, wait_stable=True)
 
     def _claim_all(self) -> OperationOneRoundResult:
         screen = self.screenshot()
@@ -100,7 +100,7 @@ class AssignmentsApp(Application):
         area = ScreenPhoneMenu.ASSIGNMENTS_CLAIM.value
         click = self.find_and_click_area(area, screen)
         if click == Operation.OCR_CLICK_SUCCESS:
-            return self.round_success(wait=1)
+            return self.round_success(wait=1, wait_stable=True)
         elif click == Operation.OCR_CLICK_NOT_FOUND:
             return self.round_success(status=AssignmentsApp.STATUS_NO_CLAIM)
         else:
@@ -111,7 +111,7 @@ class AssignmentsApp(Application):
         area = ScreenPhoneMenu.ASSIGNMENTS_CLICK_EMPTY.value
         click = self.find_and_click_area(area, screen)
         if click == Operation.OCR_CLICK_SUCCESS:
-            return self.round_success(wait=1)
+            return self.round_success(wait=1, wait_stable=True)
         else:
             return self.round_retry(status='点击%s失败' % area.status, wait=1)
 
@@ -123,7 +123,7 @@ class AssignmentsApp(Application):
 
         if len(result_list) > 0:  # 有红点
             self.ctx.controller.click(area.rect.left_top + result_list.max.center)
-            return self.round_success(wait=1)
+            return self.round_success(wait=1, wait_stable=True)
 
         return self.round_retry('无红点')
 
@@ -1,6 +1,8 @@
 import os
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
+import cv2
+import numpy as np
 from cv2.typing import MatLike
 
 from basic import Rect
@@ -9,6 +11,55 @@ from basic.log_utils import log
 from sr.sim_uni.sim_uni_const import SimUniLevelType
 from sr.sim_uni.sim_uni_route import SimUniRoute
 
+ROUTE_MM_TEMPLATE_RECT = Rect(30, 30, 160, 160)  # 使用小地图中间的部分 匹配路线的开始点小地图
+ROUTE_INDEX_SCALE: float = 0.25  # 路线索引中缩略图的缩放比例
+ROUTE_INDEX_TOP_K: int = 5  # 缩略图筛选后 进行精确匹配的路线数量
+
+
+class SimUniRouteIndex:
+
+    def __init__(self, route_list: List[SimUniRoute]):
+        """
+        路线的索引 加载路线时为每条路线的开始点小地图生成缩略图
+        匹配时先用缩略图筛选出最相似的几条路线 再对这几条进行精确的模板匹配
+        :param route_list: 路线列表
+        """
+        self.route_list: List[SimUniRoute] = route_list
+        self.thumbnail_list: List[List[MatLike]] = [
+            [get_route_thumbnail(mm) for mm in [route.mm, route.mm2] if mm is not None]
+            for route in route_list
+        ]
+
+    def get_candidate_list(self, template: MatLike, top_k: int = ROUTE_INDEX_TOP_K) -> List[SimUniRoute]:
+        """
+        根据缩略图的相似度 获取最可能的路线
+        :param template: 当前小地图中间的部分
+        :param top_k: 返回的数量
+        :return: 按相似度从高到低排列的路线
+        """
+        template_thumbnail = get_route_thumbnail(template)
+        score_list: List[float] = []
+        for thumbnail_list in self.thumbnail_list:
+            score = -1
+            for thumbnail in thumbnail_list:
+                if thumbnail.shape[0] < template_thumbnail.shape[0] or thumbnail.shape[1] < template_thumbnail.shape[1]:
+                    continue
+                result = cv2.matchTemplate(thumbnail, template_thumbnail, cv2.TM_CCOEFF_NORMED)
+                score = max(score, float(np.nanmax(result)))
+            score_list.append(score)
+
+        idx_list = np.argsort(-np.array(score_list), kind='stable')[:top_k]
+        return [self.route_list[idx] for idx in idx_list]
+
+
+def get_route_thumbnail(image: MatLike) -> MatLike:
+    """
+    路线索引使用的缩略图
+    :param image: 小地图
+    :return:
+    """
+    return cv2.resize(image, None, fx=ROUTE_INDEX_SCALE, fy=ROUTE_INDEX_SCALE, interpolation=cv2.INTER_AREA)
+
 
 class SimUniRouteHolder:
 
@@ -16,6 +67,9 @@ class SimUniRouteHolder:
         self.uni_2_route_list: dict[str, List[SimUniRoute]] = {}
         """宇宙对用的路线配置列表 key为第几宇宙第几层"""
 
+        self.uni_2_route_index: dict[str, SimUniRouteIndex] = {}
+        """宇宙对用的路线索引 key为第几宇宙第几层"""
+
     def get_route_list(self, level_type: SimUniLevelType) -> List[SimUniRoute]:
         """
         获取宇宙对用的路线配置列表
@@ -41,18 +95,34 @@ class SimUniRouteHolder:
         self.uni_2_route_list[key] = arr
         return arr
 
+    def get_route_index(self, level_type: SimUniLevelType) -> SimUniRouteIndex:
+        """
+        获取宇宙对应的路线索引 第一次使用时生成
+        :param level_type: 楼层类型
+        :return:
+        """
+        key = level_type.route_id
+        if key not in self.uni_2_route_index:
+            self.uni_2_route_index[key] = SimUniRouteIndex(self.get_route_list(level_type))
+        return self.uni_2_route_index[key]
+
     def clear_cache(self):
         self.uni_2_route_list.clear()
+        self.uni_2_route_index.clear()
 
 
 _sim_uni_route_holder: Optional[SimUniRouteHolder] = None
 
 
-def get_sim_uni_route_list(level_type: SimUniLevelType) -> List[SimUniRoute]:
+def get_sim_uni_route_holder() -> SimUniRouteHolder:
     global _sim_uni_route_holder
     if _sim_uni_route_holder is None:
         _sim_uni_route_holder = SimUniRouteHolder()
-    return _sim_uni_route_holder.get_route_list(level_type)
+    return _sim_uni_route_holder
+
+
+def get_sim_uni_route_list(level_type: SimUniLevelType) -> List[SimUniRoute]:
+    return get_sim_uni_route_holder().get_route_list(level_type)
 
 
 def clear_sim_uni_route_cache():
@@ -68,7 +138,36 @@ def match_best_sim_uni_route(uni_num: int, level_type: SimUniLevelType, mm: MatL
     :param mm: 开始点的小地图截图
     :return:
     """
-    route_list = get_sim_uni_route_list(level_type)
+    holder = get_sim_uni_route_holder()
+    route_list = holder.get_route_list(level_type)
+    template, _ = cv2_utils.crop_image(mm, ROUTE_MM_TEMPLATE_RECT)
+
+    # 先精确匹配缩略图最相似的几条路线 都匹配不上时(例如新的路线) 再逐个匹配剩下的路线
+    candidate_list = holder.get_route_index(level_type).get_candidate_list(template)
+    target_route, target_mr = match_best_route_in_list(uni_num, candidate_list, template)
+    if target_route is None:
+        target_route, target_mr = match_best_route_in_list(
+            uni_num, [route for route in route_list if route not in candidate_list], template)
+
+    if target_route is not None and uni_num not in target_route.support_world:
+        target_route.add_support_world(uni_num)
+        target_route.save()
+
+    if target_mr is not None:
+        log.debug(f'当前匹配路线置信度 {target_mr.confidence:.2f}')
+
+    return target_route
+
+
+def match_best_route_in_list(uni_num: int, route_list: List[SimUniRoute],
+                             template: MatLike) -> Tuple[Optional[SimUniRoute], Optional[MatchResult]]:
+    """
+    在路线列表中 找到开始点小地图最匹配的路线
+    :param uni_num: 第几宇宙
+    :param route_list: 路线列表
+    :param template: 当前小地图中间的部分
+    :return: 路线和匹配结果
+    """
     target_route: Optional[SimUniRoute] = None
     target_mr: Optional[MatchResult] = None
 
@@ -76,14 +175,10 @@ def match_best_sim_uni_route(uni_num: int, level_type: SimUniLevelType, mm: MatL
         for route in route_list:
             if (uni_num in route.support_world) != same_world:
                 continue
-            source = route.mm
-            template, _ = cv2_utils.crop_image(mm, Rect(30, 30, 160, 160))
-            mr = cv2_utils.match_template(source, template, threshold=0.6, only_best=True)
+            mr = cv2_utils.match_template(route.mm, template, threshold=0.6, only_best=True)
 
             if mr.max is None and route.mm2 is not None:
-                source = route.mm2
-                template, _ = cv2_utils.crop_image(mm, Rect(30, 30, 160, 160))
-                mr = cv2_utils.match_template(source, template, threshold=0.6, only_best=True)
+                mr = cv2_utils.match_template(route.mm2, template, threshold=0.6, only_best=True)
 
             if mr.max is None:
                 continue
@@ -92,11 +187,4 @@ def match_best_sim_uni_route(uni_num: int, level_type: SimUniLevelType, mm: MatL
                 target_route = route
                 target_mr = mr.max
 
-    if target_route is not None and uni_num not in target_route.support_world:
-        target_route.add_support_world(uni_num)
-        target_route.save()
-
-    if target_mr is not None:
-        log.debug(f'当前匹配路线置信度 {target_mr.confidence:.2f}')
-
-    return target_route
+    return target_route, target_mr
@@ -8,17 +8,22 @@ import os
 import numpy as np
 from cv2.typing import MatLike
 
-from basic import cal_utils, Rect, Point, os_utils
+from basic import cal_utils, Rect, Point, os_utils, debug_utils
 from basic.img import MatchResult, cv2_utils, MatchResultList
+from basic.img.spectrum_matcher import SpectrumMatcher
 from basic.log_utils import log
 from sr.const import map_const
 from sr.const.map_const import Region
 from sr.image import ImageMatcher
 from sr.image.sceenshot import mini_map, MiniMapInfo, LargeMapInfo
-from sr.performance_recorder import record_performance
+from sr.performance_recorder import record_performance, trace_submit
 
 cal_pos_executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix='sr_od_cal_pos')
 
+PYRAMID_TOP_K: int = 5  # 图像金字塔 低分辨率匹配时每个缩放比例保留的候选位置数量
+PYRAMID_MIN_AREA_RATIO: int = 9  # 原图面积至少是模板的多少倍时 才使用图像金字塔
+TEMPLATE_MATCH_TIMEOUT: float = 1  # 每个缩放比例等待模板匹配的最长时间 秒
+
 
 def get_mini_map_scale_list(running: bool, real_move_time: float = 0):
     """
@@ -183,7 +188,8 @@ def cal_character_pos_by_gray(im: ImageMatcher,
                               lm_info: LargeMapInfo, mm_info: MiniMapInfo,
                               lm_rect: Rect = None,
                               scale_list: List[float] = None,
-                              show: bool = False) -> Optional[MatchResult]:
+                              show: bool = False,
+                              pyramid: bool = True) -> Optional[MatchResult]:
     """
     使用模板匹配 在大地图上匹配小地图的位置 会对小地图进行缩放尝试
     使用灰度图进行匹配
@@ -193,6 +199,7 @@ def cal_character_pos_by_gray(im: ImageMatcher,
     :param lm_rect: 圈定的大地图区域 传入后更准确
     :param scale_list: 缩放比例
     :param show: 是否显示调试结果
+    :param pyramid: 原图较大时 是否使用图像金字塔匹配
     :return:
     """
     source, lm_rect = cv2_utils.crop_image(lm_info.origin, lm_rect)
@@ -204,8 +211,13 @@ def cal_character_pos_by_gray(im: ImageMatcher,
     mini_map.init_road_mask_for_world_patrol(mm_info, another_floor=lm_info.region.another_floor)
     template_mask = mm_info.road_mask_with_edge
 
-    target: MatchResult = template_match_with_scale_list_parallely(im, source, template, template_mask,
-                                                                   scale_list, 0.3)
+    pyramid_source = None
+    if lm_rect is None and lm_info.origin_pyramid is not None:
+        pyramid_source = cv2.cvtColor(lm_info.origin_pyramid, cv2.COLOR_BGR2GRAY)
+
+    target: MatchResult = template_match_with_scale_list(im, source, template, template_mask,
+                                                         scale_list, 0.3, pyramid=pyramid,
+                                                         pyramid_source=pyramid_source)
 
     if show:
         scale = target.template_scale if target is not None else 1
@@ -231,7 +243,8 @@ def cal_character_pos_by_original(im: ImageMatcher,
                                   lm_rect: Rect = None,
                                   show: bool = False,
                                   scale_list: List[float] = None,
-                                  match_threshold: float = 0.3) -> Optional[MatchResult]:
+                                  match_threshold: float = 0.3,
+                                  pyramid: bool = True) -> Optional[MatchResult]:
     """
     使用模板匹配 在大地图上匹配小地图的位置 会对小地图进行缩放尝试
     使用小地图原图 - 需要到这一步 说明背景比较杂乱 因此道路掩码只使用中心点包含的连通块
@@ -242,6 +255,7 @@ def cal_character_pos_by_original(im: ImageMatcher,
     :param show: 是否显示调试结果
     :param scale_list: 缩放比例
     :param match_threshold: 模板匹配的阈值
+    :param pyramid: 原图较大时 是否使用图像金字塔匹配
     :return:
     """
     source, lm_rect = cv2_utils.crop_image(lm_info.origin, lm_rect)
@@ -250,8 +264,11 @@ def cal_character_pos_by_original(im: ImageMatcher,
     mini_map.init_road_mask_for_world_patrol(mm_info, another_floor=lm_info.region.another_floor)
     template_mask = mm_info.road_mask_with_edge
 
-    target: MatchResult = template_match_with_scale_list_parallely(im, source, template, template_mask,
-                                                                   scale_list, match_threshold)
+    pyramid_source = lm_info.origin_pyramid if lm_rect is None else None
+
+    target: MatchResult = template_match_with_scale_list(im, source, template, template_mask,
+                                                         scale_list, match_threshold, pyramid=pyramid,
+                                                         pyramid_source=pyramid_source)
 
     if show:
         scale = target.template_scale if target is not None else 1
@@ -350,7 +367,8 @@ def cal_character_pos_by_road_mask(im: ImageMatcher,
                                    lm_info: LargeMapInfo, mm_info: MiniMapInfo,
                                    lm_rect: Rect = None,
                                    show: bool = False,
-                                   scale_list: List[float] = None) -> Optional[MatchResult]:
+                                   scale_list: List[float] = None,
+                                   pyramid: bool = True) -> Optional[MatchResult]:
     """
     使用模板匹配 在大地图上匹配小地图的位置 会对小地图进行缩放尝试
     使用处理过后的道路掩码图
@@ -360,6 +378,7 @@ def cal_character_pos_by_road_mask(im: ImageMatcher,
     :param lm_rect: 圈定的大地图区域 传入后更准确
     :param show: 是否显示调试结果
     :param scale_list: 缩放比例
+    :param pyramid: 原图较大时 是否使用图像金字塔匹配
     :return:
     """
     source, lm_rect = cv2_utils.crop_image(lm_info.mask, lm_rect)
@@ -368,9 +387,12 @@ def cal_character_pos_by_road_mask(im: ImageMatcher,
     template = cv2.bitwise_or(mm_info.road_mask, mm_info.arrow_mask)  # 需要把中心补上
     template_mask = mm_info.circle_mask
 
-    target: MatchResult = template_match_with_scale_list_parallely(im, source, template, template_mask,
-                                                                   scale_list,
-                                                                   0.4)
+    pyramid_source = lm_info.mask_pyramid if lm_rect is None else None
+
+    target: MatchResult = template_match_with_scale_list(im, source, template, template_mask,
+                                                         scale_list,
+                                                         0.4, pyramid=pyramid,
+                                                         pyramid_source=pyramid_source)
 
     if show:
         scale = target.template_scale if target is not None else 1
@@ -397,13 +419,11 @@ def merge_road_mask(road_mask, edge_mask):
     return mask
 
 
-def template_match_with_scale_list_parallely(im: ImageMatcher,
-                                             source: MatLike, template: MatLike, template_mask: MatLike,
+def template_match_with_scale_list_parallely(source: MatLike, template: MatLike, template_mask: MatLike,
                                              scale_list: List[float],
                                              threshold: float) -> MatchResult:
     """
     按一定缩放比例进行模板匹配，并行处理不同的缩放比例，返回置信度最高的结果
-    :param im: 图片匹配器
     :param source: 原图
     :param template: 模板图
     :param template_mask: 模板掩码
@@ -411,25 +431,211 @@ def template_match_with_scale_list_parallely(im: ImageMatcher,
     :param threshold: 匹配阈值
     :return: 置信度最高的结果
     """
+    scale_result_list = template_match_with_scale_space(source, template, template_mask, scale_list)
+    log.debug('各缩放比例的置信度 %s', get_scale_confidence_curve(scale_result_list))
+
+    target: Optional[MatchResult] = None
+    for result in scale_result_list:
+        if result is None or result.confidence < threshold:
+            continue
+        if target is None or result.confidence > target.confidence:
+            target = result
+
+    return target
+
+
+def template_match_with_scale_space(source: MatLike, template: MatLike, template_mask: MatLike,
+                                    scale_list: List[float]) -> List[Optional[MatchResult]]:
+    """
+    按一定缩放比例进行模板匹配 返回每个缩放比例置信度最高的结果
+    缩放后的模板都截取成原模板大小 因此原图的频谱只需计算一次 所有缩放比例共用
+    :param source: 原图
+    :param template: 模板图
+    :param template_mask: 模板掩码
+    :param scale_list: 模板的缩放比例
+    :return: 与 scale_list 一一对应的结果 无法匹配或超时时为空
+    """
+    matcher = SpectrumMatcher(source, template.shape[:2])
+    if not matcher.valid:
+        return [None for _ in scale_list]
+
     future_list: List[Future] = []
     for scale in scale_list:
         future_list.append(
-            cal_pos_executor.submit(template_match_with_scale, im, source, template, template_mask, scale, threshold))
+            trace_submit(cal_pos_executor, template_match_with_scale_by_spectrum, matcher, template, template_mask, scale))
 
-    target: Optional[MatchResult] = None
+    result_list: List[Optional[MatchResult]] = []
     for future in future_list:
         try:
-            result: MatchResult = future.result(1)
-            if result is not None:
-                # log.debug('缩放比例 %.2f 置信度 %.2f', result.template_scale, result.confidence)
-                if target is None or result.confidence > target.confidence:
-                    target = result
+            result_list.append(future.result(TEMPLATE_MATCH_TIMEOUT))
         except concurrent.futures.TimeoutError:
             log.error('模板匹配超时', exc_info=True)
+            result_list.append(None)
+    return result_list
+
+
+def template_match_with_scale_by_spectrum(matcher: SpectrumMatcher,
+                                          template: MatLike, template_mask: MatLike,
+                                          scale: float) -> Optional[MatchResult]:
+    """
+    使用预先计算好原图频谱的匹配器 按一定缩放比例进行模板匹配 返回置信度最高的结果
+    :param matcher: 原图的频域匹配器
+    :param template: 模板图
+    :param template_mask: 模板掩码
+    :param scale: 模板的缩放比例
+    :return: 不考虑阈值的最好结果
+    """
+    template_usage, template_mask_usage, sx, sy, scale_width, scale_height = get_template_usage_with_scale(
+        template, template_mask, scale)
+
+    result = matcher.match(template_usage, template_mask_usage)
+    if result is None:
+        return None
+
+    result[~np.isfinite(result)] = -1  # 忽略无限大的结果
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    if max_val <= -1:
+        return None
+
+    return MatchResult(max_val, max_loc[0] - sx, max_loc[1] - sy, scale_width, scale_height, template_scale=scale)
+
+
+def get_scale_confidence_curve(scale_result_list: List[Optional[MatchResult]]) -> str:
+    """
+    缩放比例与置信度的曲线 用于调试时观察
+    :param scale_result_list: 每个缩放比例的结果
+    :return: 形如 1.00:0.52 1.05:0.61 的文本
+    """
+    return ' '.join('%.2f:%.2f' % (r.template_scale, r.confidence) for r in scale_result_list if r is not None)
+
+
+def template_match_with_scale_list(im: ImageMatcher,
+                                   source: MatLike, template: MatLike, template_mask: MatLike,
+                                   scale_list: List[float],
+                                   threshold: float,
+                                   pyramid: bool = True,
+                                   pyramid_source: Optional[MatLike] = None) -> MatchResult:
+    """
+    按一定缩放比例进行模板匹配 返回置信度最高的结果
+    原图比模板大很多时(例如全图搜索) 使用图像金字塔由粗到细地匹配
+    :param im: 图片匹配器
+    :param source: 原图
+    :param template: 模板图
+    :param template_mask: 模板掩码
+    :param scale_list: 模板的缩放比例
+    :param threshold: 匹配阈值
+    :param pyramid: 是否允许使用图像金字塔
+    :param pyramid_source: 预先缩小好的原图 为空时临时计算
+    :return: 置信度最高的结果
+    """
+    if pyramid and is_source_large_for_pyramid(source, template):
+        return template_match_with_scale_list_by_pyramid(im, source, template, template_mask, scale_list, threshold,
+                                                         pyramid_source=pyramid_source)
+    else:
+        return template_match_with_scale_list_parallely(source, template, template_mask, scale_list, threshold)
+
+
+def is_source_large_for_pyramid(source: MatLike, template: MatLike) -> bool:
+    """
+    原图是否足够大 需要使用图像金字塔匹配
+    圈定了大地图区域时 原图只比模板大一点 直接匹配更快也更准确
+    :param source: 原图
+    :param template: 模板图
+    :return:
+    """
+    source_area = source.shape[0] * source.shape[1]
+    template_area = template.shape[0] * template.shape[1]
+    return source_area >= template_area * PYRAMID_MIN_AREA_RATIO
+
+
+@record_performance
+def template_match_with_scale_list_by_pyramid(im: ImageMatcher,
+                                              source: MatLike, template: MatLike, template_mask: MatLike,
+                                              scale_list: List[float],
+                                              threshold: float,
+                                              pyramid_scale: float = cv2_utils.PYRAMID_SCALE,
+                                              top_k: int = PYRAMID_TOP_K,
+                                              pyramid_source: Optional[MatLike] = None) -> Optional[MatchResult]:
+    """
+    使用图像金字塔 由粗到细地进行模板匹配
+    1. 将原图和各缩放比例的模板缩小 在低分辨率下匹配 每个缩放比例保留置信度最高的 top_k 个候选位置
+    2. 回到原分辨率 只在候选位置附近的小窗口内重新匹配 返回置信度最高的结果
+    3. 候选位置都匹配失败时 回退到原分辨率的全图匹配
+    :param im: 图片匹配器
+    :param source: 原图
+    :param template: 模板图
+    :param template_mask: 模板掩码
+    :param scale_list: 模板的缩放比例
+    :param threshold: 匹配阈值
+    :param pyramid_scale: 低分辨率匹配时的缩小比例
+    :param top_k: 每个缩放比例保留的候选位置数量
+    :param pyramid_source: 预先缩小好的原图 为空或尺寸不符时临时计算
+    :return: 置信度最高的结果
+    """
+    small_source = cv2_utils.get_pyramid_image(source, pyramid_scale, pyramid_source)
+    height, width = template.shape[:2]
+    small_width = max(1, int(width * pyramid_scale))
+    small_height = max(1, int(height * pyramid_scale))
+    if small_source.shape[0] < small_height or small_source.shape[1] < small_width:
+        return template_match_with_scale_list_parallely(source, template, template_mask, scale_list, threshold)
+
+    # 低分辨率下一个像素对应原图多个像素 精细匹配时需要多留一些边缘
+    margin = int(math.ceil(1 / pyramid_scale)) * 2 + 2
+
+    target: Optional[MatchResult] = None
+    for scale in scale_list:
+        template_usage, template_mask_usage, sx, sy, _, _ = get_template_usage_with_scale(template, template_mask,
+                                                                                           scale)
+        small_template = cv2.resize(template_usage, (small_width, small_height), interpolation=cv2.INTER_AREA)
+        small_mask = cv2.resize(template_mask_usage, (small_width, small_height), interpolation=cv2.INTER_NEAREST)
+        if not np.any(small_mask):
+            continue
+
+        coarse = cv2.matchTemplate(small_source, small_template, cv2.TM_CCOEFF_NORMED, mask=small_mask)
+        for px, py in get_top_k_peaks(coarse, top_k, suppress_radius=max(1, small_width // 4)):
+            x1 = int(px / pyramid_scale) - margin
+            y1 = int(py / pyramid_scale) - margin
+            window_rect = Rect(x1, y1, x1 + width + margin * 2, y1 + height + margin * 2)
+            window, window_rect = cv2_utils.crop_image(source, window_rect)
+            if window.shape[0] < height or window.shape[1] < width:
+                continue
+
+            result = template_match_with_scale(im, window, template, template_mask, scale, threshold)
+            if result is None:
+                continue
+            if target is None or result.confidence > target.confidence:
+                result.x += window_rect.x1
+                result.y += window_rect.y1
+                target = result
+
+    if target is None:  # 真正的峰值可能不在低分辨率的候选位置中 回退到全图匹配
+        log.debug('图像金字塔匹配失败 使用全图匹配')
+        return template_match_with_scale_list_parallely(source, template, template_mask, scale_list, threshold)
 
     return target
 
 
+def get_top_k_peaks(result: MatLike, top_k: int, suppress_radius: int) -> List[Tuple[int, int]]:
+    """
+    在模板匹配的结果中 找出置信度最高的若干个峰值
+    找到一个峰值后 会抑制其附近的结果 避免候选位置都挤在同一处
+    :param result: cv2.matchTemplate 的结果
+    :param top_k: 峰值个数
+    :param suppress_radius: 峰值附近抑制的半径
+    :return: 峰值位置 (x, y)
+    """
+    result = np.where(np.isfinite(result), result, -1).astype(np.float32)
+    peak_list: List[Tuple[int, int]] = []
+    for _ in range(top_k):
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        if max_val <= -1:
+            break
+        peak_list.append(max_loc)
+        cv2.circle(result, max_loc, suppress_radius, -1, -1)
+
+    return peak_list
+
+
 def template_match_with_scale(im: ImageMatcher,
                               source: MatLike, template: MatLike, template_mask: MatLike, scale: float,
                               threshold: float) -> MatchResult:
@@ -443,6 +649,29 @@ def template_match_with_scale(im: ImageMatcher,
     :param threshold: 匹配阈值
     :return:
     """
+    template_usage, template_mask_usage, sx, sy, scale_width, scale_height = get_template_usage_with_scale(
+        template, template_mask, scale)
+
+    result: MatchResultList = im.match_image(source, template_usage, mask=template_mask_usage, threshold=threshold,
+                                             only_best=True, ignore_inf=True)
+    if result.max is not None:
+        result.max.x -= sx
+        result.max.y -= sy
+        result.max.w = scale_width
+        result.max.h = scale_height
+        result.max.template_scale = scale
+
+    return result.max
+
+
+def get_template_usage_with_scale(template: MatLike, template_mask: MatLike, scale: float):
+    """
+    按缩放比例缩放模板 并截取中心部分 使得模板大小不变
+    :param template: 模板图
+    :param template_mask: 模板掩码
+    :param scale: 模板的缩放比例
+    :return: 截取后的模板、截取后的掩码、截取的偏移量x、截取的偏移量y、缩放后的宽度、缩放后的高度
+    """
     template_scale = cv2_utils.scale_image(template, scale, copy=False)
     template_mask_scale = cv2_utils.scale_image(template_mask, scale, copy=False)
 
@@ -462,16 +691,7 @@ def template_match_with_scale(im: ImageMatcher,
     template_usage[:, :] = template_scale[sy:ey, sx:ex]
     template_mask_usage[:, :] = template_mask_scale[sy:ey, sx:ex]
 
-    result: MatchResultList = im.match_image(source, template_usage, mask=template_mask_usage, threshold=threshold,
-                                             only_best=True, ignore_inf=True)
-    if result.max is not None:
-        result.max.x -= sx
-        result.max.y -= sy
-        result.max.w = scale_width
-        result.max.h = scale_height
-        result.max.template_scale = scale
-
-    return result.max
+    return template_usage, template_mask_usage, sx, sy, scale_width, scale_height
 
 
 def sim_uni_cal_pos(
@@ -560,7 +780,7 @@ def sim_uni_cal_pos_by_gray(im: ImageMatcher,
     mini_map.init_road_mask_for_sim_uni(mm_info)
     template_mask = mm_info.road_mask_with_edge  # 把白色边缘包括进来
 
-    target: MatchResult = template_match_with_scale_list_parallely(im, source, template, template_mask, scale_list,
+    target: MatchResult = template_match_with_scale_list_parallely(source, template, template_mask, scale_list,
                                                                    match_threshold)
 
     if show:
@@ -606,7 +826,7 @@ def sim_uni_cal_pos_by_original(im: ImageMatcher,
     mini_map.init_road_mask_for_sim_uni(mm_info)
     template_mask = mm_info.road_mask_with_edge
 
-    target: MatchResult = template_match_with_scale_list_parallely(im, source, template, template_mask,
+    target: MatchResult = template_match_with_scale_list_parallely(source, template, template_mask,
                                                                    scale_list,
                                                                    threshold=match_threshold)
 
@@ -707,12 +927,14 @@ def save_as_test_case(mm: MatLike, region: Region, verify: VerifyPosInfo):
     :param verify: 验证信息
     :return:
     """
+    writer = debug_utils.get_debug_image_writer()
+    if not writer.is_allowed('cal_pos_fail'):
+        return
     now = os_utils.now_timestamp_str()
     log.info('保存样例 %s %s', region.prl_id, now)
     base = os_utils.get_path_under_work_dir('.debug', 'cal_pos_fail',
                                             region.prl_id, now)
 
-    cv2.imwrite(os.path.join(base, 'mm.png'), mm)
-
-    with open(os.path.join(base, 'verify.yml'), 'w', encoding='utf-8') as file:
-        file.write(verify.yml_str)
+    # 测试样例需要用png读取
+    writer.save_image(os.path.join(base, 'mm'), mm, image_format=debug_utils.DebugImageWriter.FORMAT_PNG)
+    writer.save_text(os.path.join(base, 'verify.yml'), verify.yml_str)
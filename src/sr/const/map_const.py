@@ -1,8 +1,9 @@
 import difflib
-from typing import Optional, List, Dict
+from functools import lru_cache
+from typing import Optional, List, Dict, Tuple
 
 from basic import cal_utils, Rect, Point, str_utils
-from basic.i18_utils import gt
+from basic.i18_utils import gt, get_default_lang
 
 
 class Planet:
@@ -43,6 +44,10 @@ P04 = Planet(4, "PNKN", "匹诺康尼")
 
 PLANET_LIST = [P01, P02, P03, P04]
 
+_PLANET_BY_CN: Dict[str, Planet] = {}  # 星球中文 -> 星球
+for _planet in PLANET_LIST:
+    _PLANET_BY_CN.setdefault(_planet.cn, _planet)
+
 
 def get_planet_by_cn(cn: str) -> Optional[Planet]:
     """
@@ -50,10 +55,17 @@ def get_planet_by_cn(cn: str) -> Optional[Planet]:
     :param cn: 星球中文
     :return: 常量
     """
-    for i in PLANET_LIST:
-        if i.cn == cn:
-            return i
-    return None
+    return _PLANET_BY_CN.get(cn)
+
+
+@lru_cache(maxsize=8)
+def _get_planet_name_list(lang: str) -> List[str]:
+    """
+    星球名称的翻译 按语言缓存
+    :param lang: 语言
+    :return: 与 PLANET_LIST 顺序一致的名称
+    """
+    return [gt(p.cn, 'ocr', lang) for p in PLANET_LIST]
 
 
 def best_match_planet_by_name(ocr_word: str) -> Optional[Planet]:
@@ -62,7 +74,7 @@ def best_match_planet_by_name(ocr_word: str) -> Optional[Planet]:
     :param ocr_word: OCR结果
     :return:
     """
-    planet_names = [gt(p.cn, 'ocr') for p in PLANET_LIST]
+    planet_names = _get_planet_name_list(get_default_lang())
     idx = str_utils.find_best_match_by_lcs(ocr_word, target_word_list=planet_names)
     if idx is None:
         return None
@@ -268,6 +280,19 @@ PLANET_2_REGION: Dict[str, List[Region]] = {
                 P04_R10, P04_R10_SUB_01_F2, P04_R10_SUB_01_F3]
 }
 
+# 区域的索引 导入时构建一次 重复的键保留列表中的第一个 与原来遍历查找的结果一致
+_REGION_BY_CN: Dict[Tuple[str, str, int], Region] = {}  # (星球, 区域中文, 层数) -> 区域
+_REGION_FLOOR_LIST_BY_CN: Dict[Tuple[str, str], List[Region]] = {}  # (星球, 区域中文) -> 所有楼层
+_SUB_REGION_BY_CN: Dict[Tuple[str, str, int], Region] = {}  # (所属区域, 子区域中文, 层数) -> 子区域
+_REGION_BY_PRL_ID: Dict[str, Region] = {}  # 区域唯一ID -> 区域
+for _np_id, _region_list in PLANET_2_REGION.items():
+    for _region in _region_list:
+        _REGION_BY_CN.setdefault((_np_id, _region.cn, _region.floor), _region)
+        _REGION_FLOOR_LIST_BY_CN.setdefault((_np_id, _region.cn), []).append(_region)
+        if _region.parent is not None:
+            _SUB_REGION_BY_CN.setdefault((_region.parent.prl_id, _region.cn, _region.floor), _region)
+        _REGION_BY_PRL_ID.setdefault(_region.prl_id, _region)
+
 
 def get_region_by_cn(cn: str, planet: Planet, floor: int = 0) -> Optional[Region]:
     """
@@ -277,13 +302,10 @@ def get_region_by_cn(cn: str, planet: Planet, floor: int = 0) -> Optional[Region
     :param floor: 层数
     :return: 常量
     """
-    for i in PLANET_2_REGION[planet.np_id]:
-        if i.cn != cn:
-            continue
-        if floor is not None and i.floor != floor:
-            continue
-        return i
-    return None
+    if floor is not None:
+        return _REGION_BY_CN.get((planet.np_id, cn, floor))
+    floor_list = _REGION_FLOOR_LIST_BY_CN.get((planet.np_id, cn))
+    return None if floor_list is None else floor_list[0]
 
 
 def get_sub_region_by_cn(cn: str, region: Region, floor: int = 0) -> Optional[Region]:
@@ -294,11 +316,25 @@ def get_sub_region_by_cn(cn: str, region: Region, floor: int = 0) -> Optional[Re
     :param floor: 子区域的层数
     :return: 常量
     """
-    for regions in PLANET_2_REGION.values():
-        for r in regions:
-            if r.parent is not None and r.parent == region and r.cn == cn and r.floor == floor:
-                return r
-    return None
+    return _SUB_REGION_BY_CN.get((region.prl_id, cn, floor))
+
+
+@lru_cache(maxsize=16)
+def _get_region_name_index(lang: str, np_id: Optional[str]) -> Tuple[List[str], Dict[str, Region]]:
+    """
+    区域名称的模糊匹配索引 按语言和星球缓存
+    同名的多个楼层只保留第一个 不影响匹配结果
+    :param lang: 语言
+    :param np_id: 星球 为空时包含所有星球
+    :return: 去重后的名称列表, 名称 -> 区域
+    """
+    name_2_region: Dict[str, Region] = {}
+    for planet_np_id, region_list in PLANET_2_REGION.items():
+        if np_id is not None and np_id != planet_np_id:
+            continue
+        for region in region_list:
+            name_2_region.setdefault(gt(region.cn, 'ocr', lang), region)
+    return list(name_2_region.keys()), name_2_region
 
 
 def best_match_region_by_name(ocr_word: Optional[str], planet: Optional[Planet] = None) -> Optional[Region]:
@@ -311,38 +347,18 @@ def best_match_region_by_name(ocr_word: Optional[str], planet: Optional[Planet]
     if ocr_word is None or len(ocr_word) == 0:
         return None
 
-    to_check_region_name_list: List[str] = []
-
-    for np_id, region_list in PLANET_2_REGION.items():
-        if planet is not None and planet.np_id != np_id:
-            continue
-        for region in region_list:
-            region_name = gt(region.cn, 'ocr')
-            to_check_region_name_list.append(region_name)
+    name_list, name_2_region = _get_region_name_index(get_default_lang(), None if planet is None else planet.np_id)
+    if ocr_word in name_2_region:  # 完全一致时不需要模糊匹配
+        return name_2_region[ocr_word]
 
-    match = difflib.get_close_matches(ocr_word, to_check_region_name_list, n=1)
+    match = difflib.get_close_matches(ocr_word, name_list, n=1)
     if len(match) == 0:
         return None
-    best_match = match[0]
-
-    for np_id, region_list in PLANET_2_REGION.items():
-        if planet is not None and planet.np_id != np_id:
-            continue
-        for region in region_list:
-            region_name = gt(region.cn, 'ocr')
-            if region_name == best_match:
-                return region
-
-    return None
+    return name_2_region[match[0]]
 
 
 def get_region_by_prl_id(prd_id: str) -> Optional[Region]:
-    for np_id, region_list in PLANET_2_REGION.items():
-        for region in region_list:
-            if region.prl_id == prd_id:
-                return region
-
-    return None
+    return _REGION_BY_PRL_ID.get(prd_id)
 
 
 class TransportPoint:
@@ -876,13 +892,17 @@ REGION_2_SP = {
     P04_R10.pr_id: [P04_R10_SP01, P04_R10_SP02, P04_R10_SP03, P04_R10_SP04, P04_R10_SP05, P04_R10_SP06, P04_R10_SP07, P04_R10_SP08, P04_R10_SP09],
 }
 
+# 传送点的索引 导入时构建一次 重复的键保留列表中的第一个
+_SP_BY_CN: Dict[Tuple[str, str], TransportPoint] = {}  # (区域, 传送点中文) -> 传送点
+for _pr_id, _sp_list in REGION_2_SP.items():
+    for _sp in _sp_list:
+        _SP_BY_CN.setdefault((_pr_id, _sp.cn), _sp)
+
+
 def get_sp_by_cn(planet_cn: str, region_cn: str, floor: int, tp_cn: str) -> TransportPoint:
     p: Planet = get_planet_by_cn(planet_cn)
     r: Region = get_region_by_cn(region_cn, p, floor)
-    for i in REGION_2_SP.get(r.pr_id):
-        if i.cn != tp_cn:
-            continue
-        return i
+    return _SP_BY_CN.get((r.pr_id, tp_cn))
 
 
 def region_with_another_floor(region: Region, floor: int) -> Optional[Region]:
@@ -895,6 +915,15 @@ def region_with_another_floor(region: Region, floor: int) -> Optional[Region]:
     return get_region_by_cn(region.cn, region.planet, floor)
 
 
+def get_all_floor_regions(region: Region) -> List[Region]:
+    """
+    获取同一区域的所有楼层 包括自己
+    :param region: 区域
+    :return:
+    """
+    return list(_REGION_FLOOR_LIST_BY_CN.get((region.planet.np_id, region.cn), []))
+
+
 def get_sp_type_in_rect(region: Region, rect: Rect) -> dict:
     """
     获取区域特定矩形内的特殊点 按种类分组
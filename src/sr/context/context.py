@@ -1,14 +1,13 @@
 import subprocess
 import time
 from enum import Enum
-from typing import Optional, List
-
-import keyboard
-import pyautogui
+from typing import Optional, List, TYPE_CHECKING
 
+from basic import config, log_utils
 from basic.i18_utils import gt
-from basic.img.os import save_debug_image
+from basic.img.os import save_debug_screenshot
 from basic.log_utils import log
+from basic.onnx_utils import OnnxSessionConfig
 from sr.app.assignments.assignments_run_record import AssignmentsRunRecord
 from sr.app.buy_xianzhou_parcel.buy_xianzhou_parcel_run_record import BuyXianZhouParcelRunRecord
 from sr.app.claim_email.email_run_record import EmailRunRecord
@@ -33,20 +32,22 @@ from sr.const import game_config_const
 from sr.const.character_const import Character, TECHNIQUE_BUFF, TECHNIQUE_BUFF_ATTACK, TECHNIQUE_ATTACK
 from sr.context.context_pos_info import ContextPosInfo
 from sr.control import GameController
-from sr.control.pc_controller import PcController
 from sr.event_bus import EventBus
 from sr.image import ImageMatcher
 from sr.image.cv2_matcher import CvImageMatcher
 from sr.image.image_holder import ImageHolder
 from sr.image.ocr_matcher import OcrMatcher
 from sr.image.onnx_ocr_matcher import OnnxOcrMatcher
-from sr.image.sceenshot import fill_uid_black
+from sr.image.sceenshot import fill_uid_black, mini_map_angle_alas
 from sr.image.yolo_screen_detector import YoloScreenDetector
 from sr.mystools.one_dragon_mys_config import MysConfig
 from sr.one_dragon_config import OneDragonConfig, OneDragonAccount
-from sr.performance_recorder import PerformanceRecorder, get_recorder, log_all_performance
+from sr.performance_recorder import PerformanceRecorder, get_recorder, log_all_performance, start_tracing, \
+    stop_tracing
 from sr.sim_uni.sim_uni_challenge_config import SimUniChallengeAllConfig, SimUniChallengeConfig
-from sr.win import Window
+
+if TYPE_CHECKING:
+    from sr.win import Window
 
 
 class TeamInfo:
@@ -355,7 +356,12 @@ class Context(ContextPosInfo):
         注册按键监听
         :return:
         """
-        keyboard.on_press(self.on_key_press)
+        try:
+            import keyboard  # Linux下需要root权限和输入设备 离线回放等没有按键的环境下跳过
+            keyboard.on_press(self.on_key_press)
+        except Exception:
+            log.error('注册按键监听失败 快捷键不可用', exc_info=True)
+            return
         self.register_key_press('f9', self.switch)
         self.register_key_press('f10', self.stop_running)
         self.register_key_press('f11', self.screenshot)
@@ -413,6 +419,9 @@ class Context(ContextPosInfo):
             return 'unknow'
 
     def _after_start(self):
+        log_utils.reset_module_level(self.one_dragon_config.log_module_level)  # 修改配置后 下次启动时生效
+        if self.one_dragon_config.is_debug:  # 调试模式下 记录每段耗时 停止时导出火焰图
+            start_tracing()
         self.event_bus.dispatch_event(ContextEventId.CONTEXT_START.value)
 
     def stop_running(self):
@@ -427,7 +436,15 @@ class Context(ContextPosInfo):
 
     def _after_stop(self):
         self.event_bus.dispatch_event(ContextEventId.CONTEXT_STOP.value)
+        config.flush_all()  # 运行记录等配置在后台延迟写入 停止时立刻写入
         log_all_performance()
+        stop_tracing()
+        self.ih.log_cache_stats()
+        if self.ocr is not None:
+            self.ocr.log_cache_stats()
+        dropped_cnt = log_utils.get_dropped_cnt()
+        if dropped_cnt > 0:
+            log.warning('日志过多 已丢弃 %d 条', dropped_cnt)
 
     def switch(self):
         if self.running == 1:
@@ -449,12 +466,18 @@ class Context(ContextPosInfo):
         self.open_game_by_script = False
         if renew:
             self.controller = None
+        if self.controller is not None:  # 已有的控制器 例如离线回放时传入的
+            log.info('加载游戏控制器完毕')
+            return True
+
+        # 没有图形界面的环境下 导入就会失败 只在需要控制游戏窗口时导入
+        import pyautogui
+        from sr.control.pc_controller import PcController
         try:
-            if self.controller is None:
-                if self.platform == 'PC':
-                    win = get_game_win()
-                    win.active()
-                    self.controller = PcController(win=win, ocr=self.ocr, gc=self.game_config)
+            if self.platform == 'PC':
+                win = get_game_win()
+                win.active()
+                self.controller = PcController(win=win, ocr=self.ocr, gc=self.game_config)
 
         except pyautogui.PyAutoGUIException:
             log.info('未开打游戏')
@@ -482,8 +505,11 @@ class Context(ContextPosInfo):
     def init_image_matcher(self, renew: bool = False) -> bool:
         if renew:
             self.im = None
+        self.ih.set_memory_budget(large_map_max_mb=self.one_dragon_config.large_map_cache_mb,
+                                  template_max_mb=self.one_dragon_config.template_cache_mb)
         if self.im is None:
             self.im = CvImageMatcher(self.ih)
+        mini_map_angle_alas.preheat()
         log.info('加载图片匹配器完毕')
         return True
 
@@ -491,7 +517,9 @@ class Context(ContextPosInfo):
         if renew:
             self.ocr = None
         if self.ocr is None:
-            self.ocr = get_ocr_matcher(self.game_config.lang)
+            self.ocr = get_ocr_matcher(self.game_config.lang,
+                                       self.one_dragon_config.get_onnx_session_config(
+                                           self.one_dragon_config.ocr_onnx_threads))
             self.ocr.init_model()
         log.info('加载OCR识别器完毕')
         return True
@@ -510,6 +538,7 @@ class Context(ContextPosInfo):
     def mouse_position(self):
         self.init_controller(False)
         rect = self.controller.win.get_win_rect()
+        import pyautogui
         pos = pyautogui.position()
         log.info('当前鼠标坐标 %s', (pos.x - rect.x, pos.y - rect.y))
 
@@ -521,7 +550,8 @@ class Context(ContextPosInfo):
         self.init_controller(False)
         img = self.controller.screenshot()
         fill_uid_black(img)
-        save_debug_image(img)
+        path = save_debug_screenshot(img)
+        log.info('截图保存 %s', path)
 
     @property
     def is_pc(self) -> bool:
@@ -571,25 +601,30 @@ class Context(ContextPosInfo):
         if renew:
             self.yolo_detector = None
         if self.yolo_detector is None:
-            self.yolo_detector = YoloScreenDetector(sim_uni_model_name=self.one_dragon_config.sim_uni_yolo)
+            self.yolo_detector = YoloScreenDetector(
+                sim_uni_model_name=self.one_dragon_config.sim_uni_yolo,
+                session_config=self.one_dragon_config.get_onnx_session_config(
+                    self.one_dragon_config.yolo_onnx_threads)
+            )
 
         return True
 
 
-def get_game_win() -> Window:
+def get_game_win() -> 'Window':
+    from sr.win import Window
     return Window(gt('崩坏：星穹铁道', model='ui'))
 
 
 _ocr_matcher = {}
 
 
-def get_ocr_matcher(lang: str) -> OcrMatcher:
+def get_ocr_matcher(lang: str, session_config: Optional[OnnxSessionConfig] = None) -> OcrMatcher:
     matcher: Optional[OcrMatcher] = None
     if lang not in _ocr_matcher:
         if lang == game_config_const.LANG_CN:
-            matcher = OnnxOcrMatcher()
+            matcher = OnnxOcrMatcher(session_config=session_config)
         elif lang == game_config_const.LANG_EN:
-            matcher = OnnxOcrMatcher()
+            matcher = OnnxOcrMatcher(session_config=session_config)
         _ocr_matcher[lang] = matcher
     else:
         matcher = _ocr_matcher[lang]
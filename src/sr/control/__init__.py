@@ -87,9 +87,10 @@ class GameController:
         """
         pass
 
-    def screenshot(self) -> MatLike:
+    def screenshot(self, roi: Optional[Rect] = None) -> MatLike:
         """
         截图 如果分辨率和默认不一样则进行缩放
+        :param roi: 只截取这个区域 默认分辨率下的游戏窗口里的坐标 为空时截取整个窗口
         :return: 缩放到默认分辨率的截图
         """
         pass
@@ -182,11 +183,12 @@ class GameController:
         """
         pass
 
-    def move(self, direction: str, press_time: float = 0):
+    def move(self, direction: str, press_time: float = 0, run: bool = False):
         """
         往固定方向移动
         :param direction: 方向 wsad
         :param press_time: 持续秒数
+        :param run: 是否启用疾跑
         :return:
         """
         pass
@@ -0,0 +1,284 @@
+import ctypes
+import sys
+import threading
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from basic import Rect
+from basic.log_utils import log
+from sr.const import STANDARD_RESOLUTION_W, STANDARD_RESOLUTION_H
+from sr.performance_recorder import add_record
+
+
+class FrameSource:
+
+    def __init__(self, name: str, color_conversion: Optional[int] = None):
+        """
+        截图来源 负责把屏幕上的游戏窗口区域转换成默认分辨率的BGR图片
+        子类只需要实现 _grab 把画面写到自己预分配的缓冲区中
+        返回给调用方的截图总是新的数组 调用方会保留、修改截图(例如UID打码)
+        :param name: 名称 用于记录耗时
+        :param color_conversion: _grab 结果转成BGR使用的 cv2 颜色转换 为空时已经是BGR
+        """
+        self.name: str = name
+        self.color_conversion: Optional[int] = color_conversion
+        self.last_capture_seconds: float = 0  # 最近一次截图的耗时
+        self._lock = threading.Lock()
+        self._convert_buffer: Optional[np.ndarray] = None  # 需要缩放时 先在这里转换颜色
+
+    def capture(self, left: int, top: int, width: int, height: int, roi: Optional[Rect] = None) -> MatLike:
+        """
+        截图 如果分辨率和默认不一样则进行缩放
+        :param left: 游戏窗口在屏幕上的横坐标
+        :param top: 游戏窗口在屏幕上的纵坐标
+        :param width: 游戏窗口的宽度
+        :param height: 游戏窗口的高度
+        :param roi: 只截取这个区域 默认分辨率下的游戏窗口里的坐标 为空时截取整个窗口
+        :return: BGR截图 默认分辨率 传入roi时为roi的大小
+        """
+        if roi is None:
+            grab_rect = (left, top, width, height)
+            output_size = (STANDARD_RESOLUTION_W, STANDARD_RESOLUTION_H)
+        else:
+            grab_rect = get_grab_rect(left, top, width, height, roi)
+            output_size = (roi.width, roi.height)
+
+        with self._lock:
+            start_time = time.time()
+            raw = self._grab(*grab_rect)
+            result = self._to_output(raw, output_size)
+            self.last_capture_seconds = time.time() - start_time
+        add_record('截图_%s' % self.name, self.last_capture_seconds)
+        return result
+
+    def _grab(self, left: int, top: int, width: int, height: int) -> MatLike:
+        """
+        截取屏幕区域 返回的图片可以是内部的缓冲区 下一次截图前都不会被使用方持有
+        :param left: 屏幕横坐标
+        :param top: 屏幕纵坐标
+        :param width: 宽度
+        :param height: 高度
+        :return: 截图 颜色按 color_conversion 转换
+        """
+        pass
+
+    def _to_output(self, raw: MatLike, output_size: Tuple[int, int]) -> MatLike:
+        """
+        转换成BGR并缩放到目标大小 只产生一份新的图片
+        :param raw: _grab 的结果
+        :param output_size: 目标大小 (w, h)
+        :return:
+        """
+        same_size = raw.shape[1] == output_size[0] and raw.shape[0] == output_size[1]
+        if same_size:
+            return raw.copy() if self.color_conversion is None else cv2.cvtColor(raw, self.color_conversion)
+
+        if self.color_conversion is not None:
+            shape = (raw.shape[0], raw.shape[1], 3)
+            if self._convert_buffer is None or self._convert_buffer.shape != shape:
+                self._convert_buffer = np.empty(shape, dtype=np.uint8)
+            raw = cv2.cvtColor(raw, self.color_conversion, dst=self._convert_buffer)
+        return cv2.resize(raw, output_size)
+
+    def close(self) -> None:
+        """
+        释放截图使用的资源
+        :return:
+        """
+        pass
+
+
+def get_grab_rect(left: int, top: int, width: int, height: int, roi: Rect) -> Tuple[int, int, int, int]:
+    """
+    默认分辨率下的区域 对应到屏幕上的区域
+    :param left: 游戏窗口在屏幕上的横坐标
+    :param top: 游戏窗口在屏幕上的纵坐标
+    :param width: 游戏窗口的宽度
+    :param height: 游戏窗口的高度
+    :param roi: 默认分辨率下的游戏窗口里的区域
+    :return: 屏幕上的区域 (left, top, width, height)
+    """
+    xs = width / STANDARD_RESOLUTION_W
+    ys = height / STANDARD_RESOLUTION_H
+    x1 = min(max(int(round(roi.x1 * xs)), 0), width - 1)
+    y1 = min(max(int(round(roi.y1 * ys)), 0), height - 1)
+    x2 = min(max(int(round(roi.x2 * xs)), x1 + 1), width)
+    y2 = min(max(int(round(roi.y2 * ys)), y1 + 1), height)
+    return left + x1, top + y1, x2 - x1, y2 - y1
+
+
+class PyAutoGuiFrameSource(FrameSource):
+
+    def __init__(self):
+        """
+        使用 pyautogui 截图 所有平台都可以使用
+        """
+        super().__init__('pyautogui', color_conversion=cv2.COLOR_RGB2BGR)
+
+    def _grab(self, left: int, top: int, width: int, height: int) -> MatLike:
+        import pyautogui  # 没有图形界面的环境下 导入就会失败 只在使用时导入
+        return np.asarray(pyautogui.screenshot(region=(left, top, width, height)))
+
+
+class _BitmapInfoHeader(ctypes.Structure):
+    _fields_ = [
+        ('biSize', ctypes.c_uint32),
+        ('biWidth', ctypes.c_int32),
+        ('biHeight', ctypes.c_int32),
+        ('biPlanes', ctypes.c_uint16),
+        ('biBitCount', ctypes.c_uint16),
+        ('biCompression', ctypes.c_uint32),
+        ('biSizeImage', ctypes.c_uint32),
+        ('biXPelsPerMeter', ctypes.c_int32),
+        ('biYPelsPerMeter', ctypes.c_int32),
+        ('biClrUsed', ctypes.c_uint32),
+        ('biClrImportant', ctypes.c_uint32),
+    ]
+
+
+class _BitmapInfo(ctypes.Structure):
+    _fields_ = [
+        ('bmiHeader', _BitmapInfoHeader),
+        ('bmiColors', ctypes.c_uint32 * 3),
+    ]
+
+
+class BitBltFrameSource(FrameSource):
+
+    SRCCOPY = 0x00CC0020
+    CAPTUREBLT = 0x40000000  # 包括分层窗口 与 pyautogui(PIL) 的截图一致
+
+    def __init__(self):
+        """
+        Windows下使用 GDI BitBlt 截图
+        屏幕DC、内存DC和DIB位图在尺寸不变时一直复用 画面直接拷贝到DIB的内存中 由numpy直接读取
+        """
+        super().__init__('bitblt', color_conversion=cv2.COLOR_BGRA2BGR)
+        self.user32 = ctypes.windll.user32
+        self.gdi32 = ctypes.windll.gdi32
+        self._init_function_types()
+
+        self._screen_dc = None
+        self._memory_dc = None
+        self._bitmap = None
+        self._old_bitmap = None
+        self._buffer: Optional[np.ndarray] = None  # DIB的内存 BGRA
+
+    def _init_function_types(self) -> None:
+        """
+        64位下句柄不能用默认的int传递
+        :return:
+        """
+        handle = ctypes.c_void_p
+        self.user32.GetDC.argtypes = [handle]
+        self.user32.GetDC.restype = handle
+        self.user32.ReleaseDC.argtypes = [handle, handle]
+        self.gdi32.CreateCompatibleDC.argtypes = [handle]
+        self.gdi32.CreateCompatibleDC.restype = handle
+        self.gdi32.CreateDIBSection.argtypes = [handle, ctypes.c_void_p, ctypes.c_uint32,
+                                                ctypes.POINTER(ctypes.c_void_p), handle, ctypes.c_uint32]
+        self.gdi32.CreateDIBSection.restype = handle
+        self.gdi32.SelectObject.argtypes = [handle, handle]
+        self.gdi32.SelectObject.restype = handle
+        self.gdi32.DeleteObject.argtypes = [handle]
+        self.gdi32.DeleteDC.argtypes = [handle]
+        self.gdi32.BitBlt.argtypes = [handle, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                      handle, ctypes.c_int, ctypes.c_int, ctypes.c_uint32]
+
+    def _prepare(self, width: int, height: int) -> None:
+        """
+        尺寸变化时重新创建位图
+        :param width: 宽度
+        :param height: 高度
+        :return:
+        """
+        if self._buffer is not None and self._buffer.shape[0] == height and self._buffer.shape[1] == width:
+            return
+        self._release()
+
+        self._screen_dc = self.user32.GetDC(None)
+        self._memory_dc = self.gdi32.CreateCompatibleDC(self._screen_dc)
+
+        bmi = _BitmapInfo()
+        bmi.bmiHeader.biSize = ctypes.sizeof(_BitmapInfoHeader)
+        bmi.bmiHeader.biWidth = width
+        bmi.bmiHeader.biHeight = -height  # 负数时从上到下 与numpy的行顺序一致
+        bmi.bmiHeader.biPlanes = 1
+        bmi.bmiHeader.biBitCount = 32
+        bmi.bmiHeader.biCompression = 0  # BI_RGB
+
+        bits = ctypes.c_void_p()
+        self._bitmap = self.gdi32.CreateDIBSection(self._memory_dc, ctypes.byref(bmi), 0, ctypes.byref(bits), None, 0)
+        if not self._bitmap or not bits.value:
+            self._release()
+            raise RuntimeError('创建截图位图失败')
+        self._old_bitmap = self.gdi32.SelectObject(self._memory_dc, self._bitmap)
+
+        data = (ctypes.c_uint8 * (width * height * 4)).from_address(bits.value)
+        self._buffer = np.ctypeslib.as_array(data).reshape((height, width, 4))
+
+    def _grab(self, left: int, top: int, width: int, height: int) -> MatLike:
+        self._prepare(width, height)
+        if not self.gdi32.BitBlt(self._memory_dc, 0, 0, width, height,
+                                 self._screen_dc, left, top, BitBltFrameSource.SRCCOPY | BitBltFrameSource.CAPTUREBLT):
+            raise RuntimeError('BitBlt截图失败')
+        return self._buffer
+
+    def _release(self) -> None:
+        self._buffer = None
+        if self._memory_dc is not None:
+            if self._old_bitmap is not None:
+                self.gdi32.SelectObject(self._memory_dc, self._old_bitmap)
+            self.gdi32.DeleteDC(self._memory_dc)
+        if self._bitmap is not None:
+            self.gdi32.DeleteObject(self._bitmap)
+        if self._screen_dc is not None:
+            self.user32.ReleaseDC(None, self._screen_dc)
+        self._screen_dc = None
+        self._memory_dc = None
+        self._bitmap = None
+        self._old_bitmap = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._release()
+
+
+class MemoryFrameSource(FrameSource):
+
+    def __init__(self, frame: Optional[MatLike] = None):
+        """
+        从内存中的图片截图 用于测试 或者没有游戏窗口的环境
+        图片看作整个屏幕 截图区域就是图片上的坐标
+        :param frame: BGR图片
+        """
+        super().__init__('memory')
+        self.frame: Optional[MatLike] = frame
+
+    def set_frame(self, frame: MatLike) -> None:
+        """
+        更换当前画面
+        :param frame: BGR图片
+        :return:
+        """
+        self.frame = frame
+
+    def _grab(self, left: int, top: int, width: int, height: int) -> MatLike:
+        return self.frame[top:top + height, left:left + width]
+
+
+def create_frame_source() -> FrameSource:
+    """
+    创建当前平台最快的截图来源
+    :return:
+    """
+    if sys.platform == 'win32':
+        try:
+            return BitBltFrameSource()
+        except Exception:
+            log.error('初始化BitBlt截图失败 使用pyautogui截图', exc_info=True)
+    return PyAutoGuiFrameSource()
@@ -2,16 +2,15 @@ import ctypes
 import time
 from typing import Optional
 
-import cv2
 import pyautogui
 from cv2.typing import MatLike
 
-from basic import win_utils, Point
+from basic import win_utils, Point, Rect
 from basic.log_utils import log
-from sr import const
 from sr.config.game_config import GameConfig
 from sr.const import STANDARD_RESOLUTION_W, STANDARD_RESOLUTION_H
 from sr.control import GameController
+from sr.control.frame_source import FrameSource, PyAutoGuiFrameSource, create_frame_source
 from sr.image.ocr_matcher import OcrMatcher
 from sr.win import Window, WinRect
 
@@ -22,10 +21,12 @@ class PcController(GameController):
     MOUSEEVENTF_LEFTDOWN = 0x0002
     MOUSEEVENTF_LEFTUP = 0x0004
 
-    def __init__(self, win: Window, ocr: OcrMatcher, gc: GameConfig):
+    def __init__(self, win: Window, ocr: OcrMatcher, gc: GameConfig,
+                 frame_source: Optional[FrameSource] = None):
         super().__init__(ocr)
         self.win: Window = win
         self.gc: GameConfig = gc
+        self.frame_source: FrameSource = create_frame_source() if frame_source is None else frame_source
         self.turn_dx: float = self.gc.get('turn_dx')
         self.run_speed: float = 30
         self.is_moving: bool = False
@@ -70,19 +71,38 @@ class PcController(GameController):
             pyautogui.keyUp('alt')
         return True
 
-    def screenshot(self) -> MatLike:
+    def screenshot(self, roi: Optional[Rect] = None) -> MatLike:
         """
         截图 如果分辨率和默认不一样则进行缩放
+        :param roi: 只截取这个区域 默认分辨率下的游戏窗口里的坐标 为空时截取整个窗口
         :return: 截图
         """
         rect: WinRect = self.win.get_win_rect()
+        self._move_mouse_to_uid(rect)
         try:
-            pyautogui.moveTo(rect.x + 50, rect.y + rect.h - 30)  # 移动到uid位置
+            return self.frame_source.capture(rect.x, rect.y, rect.w, rect.h, roi=roi)
+        except Exception:
+            if isinstance(self.frame_source, PyAutoGuiFrameSource):
+                raise
+            log.error('截图失败 切换到pyautogui截图', exc_info=True)
+            self.frame_source.close()
+            self.frame_source = PyAutoGuiFrameSource()
+            return self.frame_source.capture(rect.x, rect.y, rect.w, rect.h, roi=roi)
+
+    def _move_mouse_to_uid(self, rect: WinRect) -> None:
+        """
+        截图前把鼠标移动到uid位置 避免遮挡画面
+        鼠标已经在这里时不再移动 pyautogui 每次移动后都会停顿
+        :param rect: 游戏窗口
+        :return:
+        """
+        x, y = rect.x + 50, rect.y + rect.h - 30
+        try:
+            pos = pyautogui.position()
+            if pos.x != x or pos.y != y:
+                pyautogui.moveTo(x, y)
         except Exception:
             log.error('请将游戏窗口移动至可完整看到')
-        img = win_utils.screenshot(rect.x, rect.y, rect.w, rect.h)
-        result = cv2.resize(img, (const.STANDARD_RESOLUTION_W, const.STANDARD_RESOLUTION_H)) if rect.is_scale() else img
-        return result
 
     def scroll(self, down: int, pos: Point = None):
         """
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import cv2
+from cv2.typing import MatLike
+
+from basic import Point, Rect, debug_utils, os_utils
+from basic.img import cv2_utils
+from basic.log_utils import log
+from sr.control import GameController
+from sr.control.replay_controller import RECORD_FILE_NAME, EVENT_TYPE_SCREENSHOT, EVENT_TYPE_ACTION, to_json_args
+
+
+class RecordController(GameController):
+
+    def __init__(self, controller: GameController, record_dir: Optional[str] = None):
+        """
+        录制真实运行过程的控制器 包装一个真正的控制器
+        截图和操作照常执行 同时把截图和操作保存成 ReplayController 可以回放的格式
+        :param controller: 真正的控制器
+        :param record_dir: 保存的文件夹 为空时保存在 .debug/replay 下 按开始时间命名
+        """
+        super().__init__(controller.ocr)
+        self.controller: GameController = controller
+        self.turn_dx = controller.turn_dx
+        self.run_speed = controller.run_speed
+        self.walk_speed = controller.walk_speed
+
+        if record_dir is None:
+            record_dir = os_utils.get_path_under_work_dir('.debug', 'replay', time.strftime('%Y%m%d_%H%M%S'))
+        elif not os.path.exists(record_dir):
+            os.makedirs(record_dir)
+        self.record_dir: str = record_dir
+        self.start_time: float = time.time()
+        self.frame_idx: int = 0
+        self._file_lock = threading.Lock()
+
+        log.info('开始录制 保存至 %s', self.record_dir)
+
+    def __getattr__(self, item):
+        # 其余属性 例如 PcController.win 交给真正的控制器
+        if item == 'controller':
+            raise AttributeError(item)
+        return getattr(self.controller, item)
+
+    @property
+    def is_moving(self) -> bool:
+        return self.controller.is_moving if hasattr(self, 'controller') else False
+
+    @is_moving.setter
+    def is_moving(self, new_value: bool):
+        if hasattr(self, 'controller'):
+            self.controller.is_moving = new_value
+
+    def _append_event(self, event: dict) -> None:
+        with self._file_lock:
+            with open(os.path.join(self.record_dir, RECORD_FILE_NAME), 'a', encoding='utf-8') as file:
+                file.write(json.dumps(event, ensure_ascii=False))
+                file.write('\n')
+
+    def record_action(self, method: str, **kwargs) -> None:
+        """
+        记录一个操作
+        :param method: 操作方法名
+        :param kwargs: 参数
+        :return:
+        """
+        self._append_event({'t': time.time() - self.start_time, 'frame': self.frame_idx - 1,
+                            'type': EVENT_TYPE_ACTION, 'method': method, 'args': to_json_args(kwargs)})
+
+    def screenshot(self, roi: Optional[Rect] = None) -> MatLike:
+        screen = self.controller.screenshot()  # 回放时需要完整的画面 有roi时也录制整个窗口
+        file_name = '%06d.png' % self.frame_idx
+        self.frame_idx += 1
+        self._append_event({'t': time.time() - self.start_time, 'type': EVENT_TYPE_SCREENSHOT, 'frame': file_name})
+        # 图片在后台保存 不影响指令的运行速度
+        debug_utils.get_executor().submit(cv2.imwrite, os.path.join(self.record_dir, file_name), screen)
+        return screen if roi is None else cv2_utils.crop_image_only(screen, roi, copy=True)
+
+    def init(self):
+        self.record_action('init')
+        return self.controller.init()
+
+    def esc(self) -> bool:
+        self.record_action('esc')
+        return self.controller.esc()
+
+    def open_map(self) -> bool:
+        self.record_action('open_map')
+        return self.controller.open_map()
+
+    def click(self, pos: Point = None, press_time: float = 0, pc_alt: bool = False) -> bool:
+        self.record_action('click', pos=pos, press_time=press_time, pc_alt=pc_alt)
+        return self.controller.click(pos, press_time=press_time, pc_alt=pc_alt)
+
+    def scroll(self, down: int, pos: Point = None):
+        self.record_action('scroll', down=down, pos=pos)
+        return self.controller.scroll(down, pos=pos)
+
+    def drag_to(self, end: Point, start: Point = None, duration: float = 0.5):
+        self.record_action('drag_to', end=end, start=start, duration=duration)
+        return self.controller.drag_to(end, start=start, duration=duration)
+
+    def turn_by_distance(self, d: float):
+        self.record_action('turn_by_distance', d=d)
+        return self.controller.turn_by_distance(d)
+
+    def turn_down(self, distance: float):
+        self.record_action('turn_down', distance=distance)
+        return self.controller.turn_down(distance)
+
+    def start_moving_forward(self, run: bool = False):
+        self.record_action('start_moving_forward', run=run)
+        return self.controller.start_moving_forward(run=run)
+
+    def stop_moving_forward(self):
+        self.record_action('stop_moving_forward')
+        return self.controller.stop_moving_forward()
+
+    def enter_running(self, run: bool):
+        self.record_action('enter_running', run=run)
+        return self.controller.enter_running(run)
+
+    def move(self, direction: str, press_time: float = 0, run: bool = False):
+        self.record_action('move', direction=direction, press_time=press_time, run=run)
+        return self.controller.move(direction, press_time=press_time, run=run)
+
+    def get_move_time(self) -> float:
+        return self.controller.get_move_time()
+
+    def initiate_attack(self):
+        self.record_action('initiate_attack')
+        return self.controller.initiate_attack()
+
+    def interact(self, pos: Optional[Point] = None, interact_type: int = 0) -> bool:
+        self.record_action('interact', pos=pos, interact_type=interact_type)
+        return self.controller.interact(pos=pos, interact_type=interact_type)
+
+    def switch_character(self, idx: int):
+        self.record_action('switch_character', idx=idx)
+        return self.controller.switch_character(idx)
+
+    def use_technique(self):
+        self.record_action('use_technique')
+        return self.controller.use_technique()
+
+    def close_game(self):
+        self.record_action('close_game')
+        return self.controller.close_game()
+
+    def input_str(self, to_input: str, interval: float = 0.1):
+        self.record_action('input_str', to_input=to_input, interval=interval)
+        return self.controller.input_str(to_input, interval=interval)
+
+    def delete_all_input(self):
+        self.record_action('delete_all_input')
+        return self.controller.delete_all_input()
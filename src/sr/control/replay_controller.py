@@ -0,0 +1,256 @@
+import json
+import os
+import time
+from typing import Optional, List, Callable, Any
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from basic import Point, Rect
+from basic.img import cv2_utils
+from basic.log_utils import log
+from sr.control import GameController
+from sr.image.ocr_matcher import OcrMatcher
+
+# 录制的格式 一个文件夹下
+# - 每张截图保存为 {帧序号}.png
+# - record.jsonl 每行一个事件 截图为 {"t": 时间, "type": "screenshot", "frame": 文件名} 操作为 {"t": 时间, "type": "action", "method": 方法名, "args": 参数}
+RECORD_FILE_NAME: str = 'record.jsonl'
+EVENT_TYPE_SCREENSHOT: str = 'screenshot'
+EVENT_TYPE_ACTION: str = 'action'
+
+
+class ReplayController(GameController):
+
+    def __init__(self, ocr: OcrMatcher, replay_path: str,
+                 run_speed: float = 30, turn_dx: float = 1,
+                 on_finished: Optional[Callable[[], None]] = None):
+        """
+        离线回放的控制器 不需要游戏也能运行指令
+        截图按顺序返回录制好的画面 所有操作只记录下来不真正执行
+        :param ocr: OCR识别器
+        :param replay_path: 录制的文件夹 或者一个视频文件
+        :param run_speed: 移动速度
+        :param turn_dx: 转向的系数
+        :param on_finished: 所有画面都回放完之后的回调 例如停止运行。之后的截图会一直返回最后一帧
+        """
+        super().__init__(ocr)
+        self.replay_path: str = replay_path
+        self.run_speed: float = run_speed
+        self.turn_dx: float = turn_dx
+        self.on_finished: Optional[Callable[[], None]] = on_finished
+
+        self.frame_list: List[str] = []  # 文件夹回放时 每帧的文件名
+        self.frame_time_list: List[float] = []  # 每帧录制时的时间 相对于开始录制
+        self.video: Optional[cv2.VideoCapture] = None  # 视频回放时使用
+        self.frame_idx: int = -1  # 当前回放到的帧
+        self.last_frame: Optional[MatLike] = None
+        self.finished: bool = False
+
+        self.action_list: List[dict] = []  # 回放过程中收到的操作
+        self.screenshot_time_list: List[float] = []  # 每次截图的真实时间 用于计算每轮指令的耗时
+        self.start_move_time: float = 0
+
+        self._load()
+
+    def _load(self) -> None:
+        """
+        加载录制的内容
+        :return:
+        """
+        if os.path.isdir(self.replay_path):
+            record_path = os.path.join(self.replay_path, RECORD_FILE_NAME)
+            if os.path.exists(record_path):
+                with open(record_path, 'r', encoding='utf-8') as file:
+                    for line in file:
+                        if len(line.strip()) == 0:
+                            continue
+                        event = json.loads(line)
+                        if event['type'] == EVENT_TYPE_SCREENSHOT:
+                            self.frame_list.append(event['frame'])
+                            self.frame_time_list.append(event['t'])
+            else:  # 没有记录文件时 按文件名顺序回放所有图片
+                self.frame_list = sorted(i for i in os.listdir(self.replay_path) if i.endswith('.png'))
+        else:
+            self.video = cv2.VideoCapture(self.replay_path)
+            if not self.video.isOpened():
+                log.error('无法打开回放视频 %s', self.replay_path)
+                self.video = None
+                return
+            fps = self.video.get(cv2.CAP_PROP_FPS)
+            frame_cnt = int(self.video.get(cv2.CAP_PROP_FRAME_COUNT))
+            if fps > 0:
+                self.frame_time_list = [i / fps for i in range(frame_cnt)]
+
+        log.info('加载回放 %s 共 %d 帧', self.replay_path,
+                 len(self.frame_list) if self.video is None else len(self.frame_time_list))
+
+    def screenshot(self, roi: Optional[Rect] = None) -> MatLike:
+        """
+        返回下一帧录制的画面
+        :param roi: 只返回这个区域
+        :return: 回放结束后一直返回最后一帧
+        """
+        self.screenshot_time_list.append(time.time())
+        frame = self._next_frame()
+        if frame is None:
+            if not self.finished:
+                self.finished = True
+                log.info('回放结束 共 %d 帧', self.frame_idx + 1)
+                if self.on_finished is not None:
+                    self.on_finished()
+            frame = self.last_frame
+        else:
+            self.last_frame = frame
+
+        return frame if roi is None or frame is None else cv2_utils.crop_image_only(frame, roi, copy=True)
+
+    def _next_frame(self) -> Optional[MatLike]:
+        if self.video is not None:
+            ret, frame = self.video.read()
+            if not ret:
+                return None
+            self.frame_idx += 1
+            return frame
+
+        if self.frame_idx + 1 >= len(self.frame_list):
+            return None
+        self.frame_idx += 1
+        return cv2_utils.read_image(os.path.join(self.replay_path, self.frame_list[self.frame_idx]))
+
+    @property
+    def replay_time(self) -> float:
+        """
+        当前帧录制时的时间 没有记录时使用真实时间
+        :return:
+        """
+        if 0 <= self.frame_idx < len(self.frame_time_list):
+            return self.frame_time_list[self.frame_idx]
+        return time.time()
+
+    def record_action(self, method: str, **kwargs) -> None:
+        """
+        记录一个操作
+        :param method: 操作方法名
+        :param kwargs: 参数
+        :return:
+        """
+        action = {'t': self.replay_time, 'frame': self.frame_idx, 'type': EVENT_TYPE_ACTION,
+                  'method': method, 'args': to_json_args(kwargs)}
+        log.debug('回放操作 %s', action)
+        self.action_list.append(action)
+
+    def get_round_time_list(self) -> List[float]:
+        """
+        每两次截图之间的真实耗时 近似每一轮指令的耗时
+        :return:
+        """
+        return [self.screenshot_time_list[i] - self.screenshot_time_list[i - 1]
+                for i in range(1, len(self.screenshot_time_list))]
+
+    def log_statistics(self) -> None:
+        """
+        输出每轮耗时的统计
+        :return:
+        """
+        round_time_list = self.get_round_time_list()
+        if len(round_time_list) == 0:
+            return
+        arr = np.array(round_time_list)
+        log.info('回放 %d 帧 操作 %d 次 每轮耗时 平均 %.4f 中位 %.4f P90 %.4f 最大 %.4f',
+                 self.frame_idx + 1, len(self.action_list),
+                 np.mean(arr), np.median(arr), np.percentile(arr, 90), np.max(arr))
+
+    def init(self):
+        self.record_action('init')
+
+    def esc(self) -> bool:
+        self.record_action('esc')
+        return True
+
+    def open_map(self) -> bool:
+        self.record_action('open_map')
+        return True
+
+    def click(self, pos: Point = None, press_time: float = 0, pc_alt: bool = False) -> bool:
+        self.record_action('click', pos=pos, press_time=press_time, pc_alt=pc_alt)
+        return True
+
+    def scroll(self, down: int, pos: Point = None):
+        self.record_action('scroll', down=down, pos=pos)
+
+    def drag_to(self, end: Point, start: Point = None, duration: float = 0.5):
+        self.record_action('drag_to', end=end, start=start, duration=duration)
+
+    def turn_by_distance(self, d: float):
+        self.record_action('turn_by_distance', d=d)
+
+    def turn_down(self, distance: float):
+        self.record_action('turn_down', distance=distance)
+
+    def start_moving_forward(self, run: bool = False):
+        if not self.is_moving:
+            self.start_move_time = self.replay_time
+        self.is_moving = True
+        self.record_action('start_moving_forward', run=run)
+
+    def stop_moving_forward(self):
+        if not self.is_moving:
+            return
+        self.is_moving = False
+        self.record_action('stop_moving_forward')
+
+    def enter_running(self, run: bool):
+        self.record_action('enter_running', run=run)
+
+    def move(self, direction: str, press_time: float = 0, run: bool = False):
+        self.record_action('move', direction=direction, press_time=press_time, run=run)
+        return True
+
+    def get_move_time(self) -> float:
+        return self.replay_time - self.start_move_time if self.is_moving else 0
+
+    def initiate_attack(self):
+        self.record_action('initiate_attack')
+
+    def interact(self, pos: Optional[Point] = None, interact_type: int = 0) -> bool:
+        self.record_action('interact', pos=pos, interact_type=interact_type)
+        return True
+
+    def switch_character(self, idx: int):
+        self.record_action('switch_character', idx=idx)
+
+    def use_technique(self):
+        self.record_action('use_technique')
+
+    def close_game(self):
+        self.record_action('close_game')
+
+    def input_str(self, to_input: str, interval: float = 0.1):
+        self.record_action('input_str', to_input=to_input, interval=interval)
+
+    def delete_all_input(self):
+        self.record_action('delete_all_input')
+
+
+def to_json_args(args: dict) -> dict:
+    """
+    将操作的参数转化成可以保存为json的格式
+    :param args: 参数
+    :return:
+    """
+    result = {}
+    for k, v in args.items():
+        result[k] = to_json_value(v)
+    return result
+
+
+def to_json_value(v: Any) -> Any:
+    if isinstance(v, Point):
+        return [v.x, v.y]
+    if isinstance(v, (np.integer, np.floating)):
+        return v.item()
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return v
+    return str(v)
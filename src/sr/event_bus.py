@@ -1,25 +1,157 @@
-from concurrent.futures import ThreadPoolExecutor
-from typing import Callable, Any, List
+import inspect
+import threading
+import types
+import weakref
+from collections import deque
+from enum import Enum
+from typing import Callable, Any, List, Dict, Set, Tuple, Optional, Deque
 
 from basic.log_utils import log
 
-_sr_event_bus_executor = ThreadPoolExecutor(thread_name_prefix='sr_od_event_bus', max_workers=1)
+
+class EventPriority(Enum):
+
+    HIGH: int = 0
+    NORMAL: int = 1
+    LOW: int = 2
+
+
+class EventOption:
+
+    def __init__(self, priority: EventPriority = EventPriority.NORMAL,
+                 max_pending: Optional[int] = None,
+                 coalesce: bool = False):
+        """
+        事件的下发方式
+        :param priority: 优先级 高优先级的事件先处理
+        :param max_pending: 最多等待处理的数量 超过时丢弃最旧的 为空时不限制
+        :param coalesce: 合并 等待处理时只保留最新的事件体 用于高频的状态更新
+        """
+        self.priority: EventPriority = priority
+        self.max_pending: Optional[int] = 1 if coalesce else max_pending
+
+
+class _Listener:
+
+    def __init__(self, callback: Callable[[Any], None], on_dead: Optional[Callable[[], None]] = None):
+        """
+        一个监听 对象的方法只保留弱引用 对象被回收时自动解除监听 避免界面没有解除监听时无法回收
+        :param callback: 回调
+        :param on_dead: 对象被回收时的处理
+        """
+        if on_dead is not None and inspect.ismethod(callback):
+            try:
+                self._ref = weakref.WeakMethod(callback, lambda _: on_dead())
+                return
+            except TypeError:  # 对象不支持弱引用
+                pass
+        self._ref = lambda: callback
+
+    def get(self) -> Optional[Callable[[Any], None]]:
+        return self._ref()
+
+
+def _get_owner(callback: Callable[[Any], None]) -> Any:
+    """
+    回调所属的对象 普通函数时为空
+    :param callback: 回调
+    :return:
+    """
+    owner = getattr(callback, '__self__', None)
+    if isinstance(owner, types.ModuleType):  # 内置函数的 __self__ 是模块
+        return None
+    return owner
+
+
+def _get_callback_key(callback: Callable[[Any], None]) -> Tuple[int, Any]:
+    """
+    回调的唯一标识 同一个对象每次获取的方法都是新的对象 需要用 (对象, 函数) 判断是否相同
+    :param callback: 回调
+    :return:
+    """
+    owner = _get_owner(callback)
+    if owner is None:
+        return 0, callback
+    return id(owner), getattr(callback, '__func__', callback.__name__)
 
 
 class EventBus:
 
     def __init__(self):
-        self.callbacks: dict[str, List[Callable[[Any], None]]] = {}
+        self.callbacks: Dict[str, Dict[Tuple[int, Any], _Listener]] = {}
+        self.event_options: Dict[str, EventOption] = {}
+        self.dropped_cnt: int = 0  # 超过等待数量被丢弃的事件数量
+
+        self._owner_subscriptions: Dict[int, Set[Tuple[str, Tuple[int, Any]]]] = {}  # 对象 -> 监听 用于解除对象的所有监听
+        self._lock = threading.RLock()  # 对象被回收时解除监听 可能发生在持有锁的线程中
+        self._condition = threading.Condition(self._lock)
+        self._lanes: List[Deque[str]] = [deque() for _ in EventPriority]  # 每个优先级等待处理的事件ID
+        self._pending: Dict[str, Deque[Any]] = {}  # 事件ID -> 等待处理的事件体
+        self._running_cnt: int = 0  # 正在处理的事件数量
+        self._thread: Optional[threading.Thread] = None
+
+    def set_event_option(self, event_id: str, option: EventOption) -> None:
+        """
+        设置事件的下发方式
+        :param event_id: 事件ID
+        :param option: 下发方式
+        :return:
+        """
+        with self._lock:
+            self.event_options[event_id] = option
 
     def dispatch_event(self, event_id: str, event_obj: Any = None):
         """
-        下发事件
+        下发事件 在后台线程中按优先级触发回调
         :param event_id: 事件ID
         :param event_obj: 事件体
         :return:
         """
-        log.debug("事件触发 %s", event_id)
-        _sr_event_bus_executor.submit(self._trigger_callback, event_id, event_obj)
+        with self._condition:  # 高频事件会在这里调用很多次 日志在后台线程触发时再记录
+            option = self.event_options.get(event_id)
+            pending = self._pending.get(event_id)
+            if pending is None:
+                pending = deque()
+                self._pending[event_id] = pending
+
+            if option is not None and option.max_pending is not None and len(pending) >= option.max_pending:
+                pending.popleft()  # 等待处理的位置不变 只替换成新的事件体
+                self.dropped_cnt += 1
+            else:
+                lane = EventPriority.NORMAL if option is None else option.priority
+                self._lanes[lane.value].append(event_id)
+            pending.append(event_obj)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sr_od_event_bus', daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                event_id = self._next_event_id()
+                while event_id is None:
+                    self._condition.wait()
+                    event_id = self._next_event_id()
+                event_obj = self._pending[event_id].popleft()
+                self._running_cnt += 1
+            try:
+                self._trigger_callback(event_id, event_obj)
+            finally:
+                with self._condition:
+                    self._running_cnt -= 1
+                    self._condition.notify_all()
+
+    def _next_event_id(self) -> Optional[str]:
+        """
+        优先级最高的等待处理的事件
+        :return:
+        """
+        for lane in self._lanes:
+            if len(lane) > 0:
+                return lane.popleft()
+        return None
 
     def _trigger_callback(self, event_id: str, event_obj: Any = None):
         """
@@ -28,26 +160,52 @@ class EventBus:
         :param event_obj: 事件体
         :return:
         """
-        if event_id not in self.callbacks:
-            pass
-        for callback in self.callbacks[event_id]:
+        log.debug("事件触发 %s", event_id)
+        with self._lock:
+            if event_id not in self.callbacks:
+                return
+            listener_list = list(self.callbacks[event_id].values())
+        for listener in listener_list:
+            callback = listener.get()
+            if callback is None:
+                continue
             try:
                 callback(event_obj)
             except:
                 log.error('事件处理失败', exc_info=True)
 
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待已经下发的事件都处理完
+        :param timeout: 超时时间 秒
+        :return: 是否都处理完了
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._running_cnt == 0 and all(len(lane) == 0 for lane in self._lanes),
+                timeout=timeout
+            )
+
     def listen(self, event_id: str, callback: Callable[[Any], None]):
         """
         新增监听事件
+        对象的方法只保留弱引用 对象被回收后不再触发
         :param event_id:
         :param callback:
         :return:
         """
-        if event_id not in self.callbacks:
-            self.callbacks[event_id] = []
-        existed_callbacks = self.callbacks[event_id]
-        if callback not in existed_callbacks:
-            existed_callbacks.append(callback)
+        key = _get_callback_key(callback)
+        with self._lock:
+            if event_id not in self.callbacks:
+                self.callbacks[event_id] = {}
+            existed_callbacks = self.callbacks[event_id]
+            if key in existed_callbacks:
+                return
+            existed_callbacks[key] = _Listener(callback, on_dead=lambda: self._remove(event_id, key))
+            if key[0] != 0:
+                if key[0] not in self._owner_subscriptions:
+                    self._owner_subscriptions[key[0]] = set()
+                self._owner_subscriptions[key[0]].add((event_id, key))
 
     def unlisten(self, event_id: str, callback: Callable[[Any], None]):
         """
@@ -56,9 +214,23 @@ class EventBus:
         :param callback:
         :return:
         """
-        if event_id not in self.callbacks:
-            return
-        self.callbacks[event_id].remove(callback)
+        self._remove(event_id, _get_callback_key(callback))
+
+    def _remove(self, event_id: str, key: Tuple[int, Any]) -> None:
+        """
+        删除一个监听
+        :param event_id: 事件ID
+        :param key: 回调的唯一标识
+        :return:
+        """
+        with self._lock:
+            if event_id in self.callbacks:
+                self.callbacks[event_id].pop(key, None)
+            subscriptions = self._owner_subscriptions.get(key[0])
+            if subscriptions is not None:
+                subscriptions.discard((event_id, key))
+                if len(subscriptions) == 0:
+                    self._owner_subscriptions.pop(key[0])
 
     def unlisten_all(self, obj: Any):
         """
@@ -66,13 +238,7 @@ class EventBus:
         :param obj:
         :return:
         """
-        to_remove = {}
-        for key, existed_callbacks in self.callbacks.items():
-            to_remove[key] = []
-            for existed in existed_callbacks:
-                if id(existed.__self__) == id(obj):
-                    to_remove[key].append(existed)
-
-        for key, removes in to_remove.items():
-            for remove in removes:
-                self.callbacks[key].remove(remove)
+        with self._lock:
+            subscriptions = self._owner_subscriptions.pop(id(obj), set())
+            for event_id, key in subscriptions:
+                self.callbacks[event_id].pop(key, None)
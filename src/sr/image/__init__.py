@@ -1,10 +1,11 @@
-from typing import Optional
+from typing import Optional, List
 
 import numpy as np
 from cv2.typing import MatLike
 
 from basic import os_utils
 from basic.img import MatchResultList
+from basic.img.cv2_utils import FeatureTemplateGroup
 from sr.const.map_const import Region
 
 
@@ -39,6 +40,16 @@ class ImageMatcher:
         """
         pass
 
+    def get_feature_template_group(self, template_id_list: List[str],
+                                   template_sub_dir: Optional[str] = None) -> FeatureTemplateGroup:
+        """
+        获取一组模板的特征 用于一次匹配多个模板
+        :param template_id_list: 模板id
+        :param template_sub_dir: 模板的子文件夹
+        :return: 模板组
+        """
+        pass
+
     def match_image(self, source: MatLike, template: MatLike,
                     threshold: float = 0.5, mask: np.ndarray = None,
                     only_best: bool = True,
@@ -1,13 +1,15 @@
-from typing import Optional
+from typing import Optional, List
 
 import cv2
 import numpy as np
 from cv2.typing import MatLike
 
 from basic.img import MatchResultList, cv2_utils
+from basic.img.cv2_utils import FeatureTemplateGroup
 from basic.log_utils import log
 from sr.image import ImageMatcher, TemplateImage
 from sr.image.image_holder import ImageHolder
+from sr.performance_recorder import record_performance
 
 
 class CvImageMatcher(ImageMatcher):
@@ -25,6 +27,17 @@ class CvImageMatcher(ImageMatcher):
         """
         return self.ih.get_template(template_id, sub_dir=template_sub_dir)
 
+    def get_feature_template_group(self, template_id_list: List[str],
+                                   template_sub_dir: Optional[str] = None) -> FeatureTemplateGroup:
+        """
+        获取一组模板的特征 用于一次匹配多个模板
+        :param template_id_list: 模板id
+        :param template_sub_dir: 模板的子文件夹
+        :return: 模板组
+        """
+        return self.ih.get_feature_template_group(template_id_list, sub_dir=template_sub_dir)
+
+    @record_performance
     def match_image(self, source: MatLike, template: MatLike,
                     threshold: float = 0.5, mask: np.ndarray = None,
                     only_best: bool = True,
@@ -1,67 +1,90 @@
 import os
-from typing import Optional
+from typing import Optional, Set, List
 
 import cv2
 
 from basic import os_utils
+from basic.cache_utils import LruCache
 from basic.img import cv2_utils
+from basic.img.cv2_utils import FeatureTemplateGroup
+from basic.log_utils import log
+from sr.const import map_const
 from sr.const.map_const import Region
 from sr.image import TemplateImage, get_large_map_dir_path
+from sr.image import large_map_bundle
 from sr.image.sceenshot import LargeMapInfo
 
 
 class ImageHolder:
 
-    def __init__(self):
-        self.large_map = {}
-        self.template = {}
+    def __init__(self, large_map_max_mb: Optional[int] = None, template_max_mb: Optional[int] = None):
+        """
+        图片的缓存
+        :param large_map_max_mb: 大地图缓存的上限 单位MB 为空时不限制
+        :param template_max_mb: 模板缓存的上限 单位MB 为空时不限制
+        """
+        self.large_map: LruCache = LruCache()
+        self.template: LruCache = LruCache()
+        self.feature_template_group: LruCache = LruCache(max_cnt=16)  # 合并了描述符的模板组
+        self.set_memory_budget(large_map_max_mb, template_max_mb)
+
+    def set_memory_budget(self, large_map_max_mb: Optional[int] = None, template_max_mb: Optional[int] = None):
+        """
+        设置缓存的上限 超出时淘汰最久未使用的
+        :param large_map_max_mb: 大地图缓存的上限 单位MB 为空时不限制
+        :param template_max_mb: 模板缓存的上限 单位MB 为空时不限制
+        :return:
+        """
+        self.large_map.set_max_bytes(None if large_map_max_mb is None else large_map_max_mb * 1024 * 1024)
+        self.template.set_max_bytes(None if template_max_mb is None else template_max_mb * 1024 * 1024)
 
     def load_large_map(self, region: Region) -> LargeMapInfo:
         """
         加载某张大地图到内存中
+        优先使用编译好的 bundle 没有时再读取原始图片
         :param region: 对应区域
         :return: 地图图片
         """
-        dir_path = get_large_map_dir_path(region)
-        info = LargeMapInfo()
-        info.region = region
-        info.raw = cv2_utils.read_image(os.path.join(dir_path, 'raw.png'))
-        info.origin = cv2_utils.read_image(os.path.join(dir_path, 'origin.png'))
-        info.gray = cv2_utils.read_image(os.path.join(dir_path, 'gray.png'))
-        info.mask = cv2_utils.read_image(os.path.join(dir_path, 'mask.png'))
-        feature_path = os.path.join(dir_path, 'features.xml')
-        if os.path.exists(feature_path):
-            file_storage = cv2.FileStorage(feature_path, cv2.FILE_STORAGE_READ)
-            # 读取特征点和描述符
-            info.kps = cv2_utils.feature_keypoints_from_np(file_storage.getNode("keypoints").mat())
-            info.desc = file_storage.getNode("descriptors").mat()
-            # 释放文件存储对象
-            file_storage.release()
-        self.large_map[region.prl_id] = info
+        info = large_map_bundle.load_large_map_bundle(region)
+        if info is None:
+            info = read_large_map(region)
+        self.large_map.put(region.prl_id, info)
         return info
 
-    def pop_large_map(self, region: Region, map_type: str):
+    def pop_large_map(self, region: Region, map_type: Optional[str] = None):
         """
         将某张地图从内存中删除
         :param region: 对应区域
         :param map_type: 地图类型
         :return:
         """
-        key = region.prl_id
-        if key in self.large_map:
-            del self.large_map[key]
+        self.large_map.pop(region.prl_id)
 
     def get_large_map(self, region: Region) -> LargeMapInfo:
         """
-        获取某张大地图
+        获取某张大地图 同时固定当前区域及其其它楼层 使其不会被淘汰
         :param region: 区域
         :return: 地图图片
         """
-        if region.prl_id not in self.large_map:
+        self.pin_large_map(region)
+        info = self.large_map.get(region.prl_id)
+        if info is None:
             # 尝试加载一次
             return self.load_large_map(region)
         else:
-            return self.large_map[region.prl_id]
+            return info
+
+    def pin_large_map(self, region: Region):
+        """
+        固定当前区域以及它的其它楼层 这些大地图不会被淘汰
+        :param region: 当前区域
+        :return:
+        """
+        key_set: Set[str] = {region.prl_id}
+        for floor_region in map_const.get_all_floor_regions(region):
+            key_set.add(floor_region.prl_id)
+        if key_set != self.large_map.pinned:
+            self.large_map.pin(key_set)
 
     def load_template(self, template_id: str, sub_dir: Optional[str] = None) -> Optional[TemplateImage]:
         """
@@ -90,18 +113,17 @@ class ImageHolder:
             if template.origin is not None and template.mask is not None:
                 template.kps, template.desc = cv2_utils.feature_detect_and_compute(template.origin, template.mask)
 
-        key = '%s:%s' % ('' if sub_dir is None else sub_dir, template_id)
-        self.template[key] = template
+        self.template.put(get_template_key(template_id, sub_dir), template)
         return template
 
-    def pop_template(self, template_id: str):
+    def pop_template(self, template_id: str, sub_dir: Optional[str] = None):
         """
         将某个模板从内存中删除
         :param template_id: 模板id
+        :param sub_dir: 子文件夹
         :return:
         """
-        if template_id in self.template:
-            del self.template[template_id]
+        self.template.pop(get_template_key(template_id, sub_dir))
 
     def get_template(self, template_id: str, sub_dir: Optional[str] = None) -> TemplateImage:
         """
@@ -110,12 +132,32 @@ class ImageHolder:
         :param sub_dir: 子文件夹
         :return: 模板图片
         """
-        key = '%s:%s' % ('' if sub_dir is None else sub_dir, template_id)
-        if key in self.template:
-            return self.template[key]
+        template = self.template.get(get_template_key(template_id, sub_dir))
+        if template is not None:
+            return template
         else:
             return self.load_template(template_id, sub_dir)
 
+    def get_feature_template_group(self, template_id_list: List[str],
+                                   sub_dir: Optional[str] = None) -> FeatureTemplateGroup:
+        """
+        获取一组模板的特征 描述符合并后缓存起来 用于一次匹配多个模板
+        :param template_id_list: 模板id
+        :param sub_dir: 子文件夹
+        :return: 模板组
+        """
+        key = (sub_dir, tuple(template_id_list))
+        group = self.feature_template_group.get(key)
+        if group is not None:
+            return group
+
+        template_list = [self.get_template(template_id, sub_dir) for template_id in template_id_list]
+        group = FeatureTemplateGroup(template_id_list,
+                                     [None if t is None else t.kps for t in template_list],
+                                     [None if t is None else t.desc for t in template_list])
+        self.feature_template_group.put(key, group)
+        return group
+
     def preheat_for_world_patrol(self):
         """
         锄大地预热加载模板
@@ -154,3 +196,40 @@ class ImageHolder:
         :return: 模板图片
         """
         return self.get_template(template_id, sub_dir='sim_uni')
+
+    def log_cache_stats(self):
+        """
+        输出缓存的统计信息
+        :return:
+        """
+        log.debug('大地图缓存 %s', self.large_map)
+        log.debug('模板缓存 %s', self.template)
+
+
+def get_template_key(template_id: str, sub_dir: Optional[str] = None) -> str:
+    return '%s:%s' % ('' if sub_dir is None else sub_dir, template_id)
+
+
+def read_large_map(region: Region, map_dir_path: Optional[str] = None) -> LargeMapInfo:
+    """
+    从原始图片中读取大地图
+    :param region: 区域
+    :param map_dir_path: 大地图文件夹 为空时使用区域对应的文件夹
+    :return: 地图图片
+    """
+    dir_path = get_large_map_dir_path(region) if map_dir_path is None else map_dir_path
+    info = LargeMapInfo()
+    info.region = region
+    info.raw = cv2_utils.read_image(os.path.join(dir_path, 'raw.png'))
+    info.origin = cv2_utils.read_image(os.path.join(dir_path, 'origin.png'))
+    info.gray = cv2_utils.read_image(os.path.join(dir_path, 'gray.png'))
+    info.mask = cv2_utils.read_image(os.path.join(dir_path, 'mask.png'))
+    feature_path = os.path.join(dir_path, 'features.xml')
+    if os.path.exists(feature_path):
+        file_storage = cv2.FileStorage(feature_path, cv2.FILE_STORAGE_READ)
+        # 读取特征点和描述符
+        info.kps = cv2_utils.feature_keypoints_from_np(file_storage.getNode("keypoints").mat())
+        info.desc = file_storage.getNode("descriptors").mat()
+        # 释放文件存储对象
+        file_storage.release()
+    return info
@@ -0,0 +1,153 @@
+import os
+from typing import Optional, List
+
+import cv2
+import numpy as np
+
+from basic import os_utils
+from basic.img import cv2_utils
+from basic.log_utils import log
+from sr.const.map_const import Region
+from sr.image import get_large_map_dir_path
+from sr.image.sceenshot import LargeMapInfo
+
+# 大地图的编译格式 每个区域的 bundle 文件夹下 将图片、金字塔、特征点等保存为未压缩的 .npy
+# 加载时使用 mmap 切换区域时只需要缺页读取 不需要解码PNG
+BUNDLE_DIR_NAME: str = 'bundle'
+IMAGE_TYPE_LIST: List[str] = ['raw', 'origin', 'gray', 'mask']
+PYRAMID_TYPE_LIST: List[str] = ['origin', 'mask']
+SOURCE_FILE_LIST: List[str] = ['raw.png', 'origin.png', 'gray.png', 'mask.png', 'features.xml']
+
+
+def get_bundle_dir_path(map_dir_path: str) -> str:
+    """
+    获取大地图对应的 bundle 文件夹路径 不会创建文件夹
+    :param map_dir_path: 大地图文件夹
+    :return:
+    """
+    return os.path.join(map_dir_path, BUNDLE_DIR_NAME)
+
+
+def get_pyramid_file_name(image_type: str) -> str:
+    return '%s_pyramid' % image_type
+
+
+def build_large_map_bundle(map_dir_path: str) -> bool:
+    """
+    将一个大地图文件夹中的图片和特征点 编译成 bundle
+    :param map_dir_path: 大地图文件夹
+    :return: 是否成功
+    """
+    to_save: dict = {}
+    for image_type in IMAGE_TYPE_LIST:
+        image = cv2_utils.read_image(os.path.join(map_dir_path, '%s.png' % image_type))
+        if image is None:
+            continue
+        to_save[image_type] = image
+
+    if 'mask' not in to_save:
+        log.error('大地图缺少掩码 无法编译 %s', map_dir_path)
+        return False
+
+    for image_type in PYRAMID_TYPE_LIST:
+        if image_type not in to_save:
+            continue
+        to_save[get_pyramid_file_name(image_type)] = cv2_utils.get_pyramid_image(to_save[image_type])
+
+    feature_path = os.path.join(map_dir_path, 'features.xml')
+    if os.path.exists(feature_path):
+        file_storage = cv2.FileStorage(feature_path, cv2.FILE_STORAGE_READ)
+        to_save['keypoints'] = file_storage.getNode("keypoints").mat()
+        to_save['descriptors'] = file_storage.getNode("descriptors").mat()
+        file_storage.release()
+
+    bundle_dir_path = get_bundle_dir_path(map_dir_path)
+    if not os.path.exists(bundle_dir_path):
+        os.mkdir(bundle_dir_path)
+    else:  # 删除旧文件 防止原始文件删除后 还残留着旧的结果
+        for file_name in os.listdir(bundle_dir_path):
+            os.remove(os.path.join(bundle_dir_path, file_name))
+
+    # 掩码最后保存 用于判断 bundle 是否完整
+    for key in sorted(to_save.keys(), key=lambda k: k == 'mask'):
+        np.save(os.path.join(bundle_dir_path, '%s.npy' % key), np.ascontiguousarray(to_save[key]))
+
+    return True
+
+
+def build_all_large_map_bundle() -> None:
+    """
+    编译 images/map 下所有的大地图
+    :return:
+    """
+    map_root = os_utils.get_path_under_work_dir('images', 'map')
+    for planet_dir in sorted(os.listdir(map_root)):
+        planet_dir_path = os.path.join(map_root, planet_dir)
+        if not os.path.isdir(planet_dir_path):
+            continue
+        for region_dir in sorted(os.listdir(planet_dir_path)):
+            region_dir_path = os.path.join(planet_dir_path, region_dir)
+            if not os.path.isdir(region_dir_path):
+                continue
+            if build_large_map_bundle(region_dir_path):
+                log.info('大地图编译完成 %s %s', planet_dir, region_dir)
+
+
+def is_bundle_outdated(map_dir_path: str) -> bool:
+    """
+    bundle 是否比原始文件旧 不存在时也认为是旧的
+    :param map_dir_path: 大地图文件夹
+    :return:
+    """
+    mask_path = os.path.join(get_bundle_dir_path(map_dir_path), 'mask.npy')
+    if not os.path.exists(mask_path):
+        return True
+
+    bundle_time = os.path.getmtime(mask_path)
+    for file_name in SOURCE_FILE_LIST:
+        file_path = os.path.join(map_dir_path, file_name)
+        if os.path.exists(file_path) and os.path.getmtime(file_path) > bundle_time:
+            return True
+
+    return False
+
+
+def load_large_map_bundle(region: Region, map_dir_path: Optional[str] = None) -> Optional[LargeMapInfo]:
+    """
+    使用 mmap 加载编译好的大地图
+    :param region: 区域
+    :param map_dir_path: 大地图文件夹 为空时使用区域对应的文件夹
+    :return: 没有可用的 bundle 时返回空
+    """
+    if map_dir_path is None:
+        map_dir_path = get_large_map_dir_path(region)
+    if is_bundle_outdated(map_dir_path):
+        return None
+
+    bundle_dir_path = get_bundle_dir_path(map_dir_path)
+    info = LargeMapInfo()
+    info.region = region
+    info.raw = _load_npy(bundle_dir_path, 'raw')
+    info.origin = _load_npy(bundle_dir_path, 'origin')
+    info.gray = _load_npy(bundle_dir_path, 'gray')
+    info.mask = _load_npy(bundle_dir_path, 'mask')
+    info.origin_pyramid = _load_npy(bundle_dir_path, get_pyramid_file_name('origin'))
+    info.mask_pyramid = _load_npy(bundle_dir_path, get_pyramid_file_name('mask'))
+
+    keypoints = _load_npy(bundle_dir_path, 'keypoints')
+    if keypoints is not None:
+        info.kps = cv2_utils.feature_keypoints_from_np(keypoints)
+        info.desc = _load_npy(bundle_dir_path, 'descriptors')
+
+    return info
+
+
+def _load_npy(bundle_dir_path: str, key: str) -> Optional[np.ndarray]:
+    file_path = os.path.join(bundle_dir_path, '%s.npy' % key)
+    if not os.path.exists(file_path):
+        return None
+    return np.load(file_path, mmap_mode='r')
+
+
+if __name__ == '__main__':
+    build_all_large_map_bundle()
@@ -122,3 +122,19 @@ class OcrMatcher:
         :return: [("text", "score"),]
         """
         pass
+
+    def run_ocr_single_line_batch(self, image_list: List[MatLike], threshold: float = None) -> List[str]:
+        """
+        对多张图片进行单行文本识别 默认逐张识别 子类可以合并成一次批量识别
+        :param image_list: 图片列表
+        :param threshold: 阈值
+        :return: 每张图片识别的文本
+        """
+        return [self.run_ocr_single_line(image, threshold=threshold) for image in image_list]
+
+    def log_cache_stats(self) -> None:
+        """
+        输出识别结果缓存的统计
+        :return:
+        """
+        pass
@@ -1,13 +1,25 @@
+import copy
+import hashlib
 import os
 import time
+from typing import Optional, List
 
+import cv2
+import numpy as np
 from cv2.typing import MatLike
 
 from basic import os_utils
+from basic.cache_utils import LruCache
+from basic.onnx_utils import OnnxSessionConfig
 from basic.img import MatchResultList, MatchResult
 from basic.log_utils import log
 from sr.image import ocr_utils
 from sr.image.ocr_matcher import OcrMatcher
+from sr.performance_recorder import record_performance
+
+OCR_CACHE_MAX_CNT: int = 256  # OCR结果缓存的数量上限
+OCR_CACHE_TTL: float = 10  # OCR结果缓存的有效秒数 避免画面长时间不变时一直使用旧结果
+OCR_CACHE_QUANTIZE_BITS: int = 3  # 计算图片哈希时 每个像素值丢弃的低位 用于忽略轻微的噪点
 
 
 class OnnxOcrMatcher(OcrMatcher):
@@ -16,9 +28,19 @@ class OnnxOcrMatcher(OcrMatcher):
     TODO 未测试使用 RGB图片是否有影响
     """
 
-    def __init__(self):
+    def __init__(self, cache_max_cnt: int = OCR_CACHE_MAX_CNT, cache_ttl: Optional[float] = OCR_CACHE_TTL,
+                 session_config: Optional[OnnxSessionConfig] = None):
+        """
+        :param cache_max_cnt: OCR结果缓存的数量上限 为0时不使用缓存
+        :param cache_ttl: OCR结果缓存的有效秒数
+        :param session_config: 模型推理会话的配置 为空时使用默认配置
+        """
         OcrMatcher.__init__(self)
         self._model = None
+        self.session_config: Optional[OnnxSessionConfig] = session_config
+        # 状态判断时 会在画面不变的情况下反复识别同一个区域 按区域图片的哈希缓存识别结果
+        self.cache_enabled: bool = cache_max_cnt > 0
+        self.cache: LruCache = LruCache(max_cnt=cache_max_cnt, ttl=cache_ttl)
 
     def init_model(self) -> bool:
         log.info('正在加载OCR模型')
@@ -35,6 +57,7 @@ class OnnxOcrMatcher(OcrMatcher):
                     cls_model_dir=os.path.join(models_dir, 'cls.onnx'),
                     rec_char_dict_path=os.path.join(models_dir, 'ppocr_keys_v1.txt'),
                     vis_font_path=os.path.join(models_dir, 'simfang.tt'),
+                    session_config=self.session_config,
                 )
                 return True
             except Exception:
@@ -68,6 +91,27 @@ class OnnxOcrMatcher(OcrMatcher):
         :param merge_line_distance: 多少行距内合并结果 -1为不合并 理论中文情况不会出现过长分行的 这里只是为了兼容英语的情况
         :return: {key_word: []}
         """
+        if not self.cache_enabled:
+            return self._run_ocr_by_model(image, threshold, merge_line_distance)
+
+        key = get_ocr_cache_key(image, 'det', threshold, merge_line_distance)
+        result_map = self.cache.get(key)
+        if result_map is None:
+            result_map = self._run_ocr_by_model(image, threshold, merge_line_distance)
+            self.cache.put(key, result_map)
+        # 调用方可能会修改结果的坐标 每次返回一份副本
+        return copy.deepcopy(result_map)
+
+    @record_performance
+    def _run_ocr_by_model(self, image: MatLike, threshold: float = None,
+                          merge_line_distance: float = -1) -> dict[str, MatchResultList]:
+        """
+        使用模型进行OCR 返回所有匹配结果
+        :param image: 图片
+        :param threshold: 匹配阈值
+        :param merge_line_distance: 多少行距内合并结果 -1为不合并
+        :return: {key_word: []}
+        """
         start_time = time.time()
         result_map: dict = {}
         scan_result_list: list = self._model.ocr(image, cls=False)
@@ -103,6 +147,24 @@ class OnnxOcrMatcher(OcrMatcher):
         默认传入的图片仅有文字信息
         :param image: 图片
         :param threshold: 匹配阈值
+        :return: 识别的文本
+        """
+        if not self.cache_enabled:
+            return self._run_rec_by_model(image, threshold)
+
+        key = get_ocr_cache_key(image, 'rec', threshold)
+        result = self.cache.get(key)
+        if result is None:
+            result = self._run_rec_by_model(image, threshold)
+            self.cache.put(key, result)
+        return result
+
+    @record_performance
+    def _run_rec_by_model(self, image: MatLike, threshold: float = None) -> str:
+        """
+        只使用识别模型进行OCR
+        :param image: 图片
+        :param threshold: 匹配阈值
         :return: [[("text", "score"),]] 由于禁用了空格，可以直接取第一个元素
         """
         start_time = time.time()
@@ -116,3 +178,70 @@ class OnnxOcrMatcher(OcrMatcher):
             return ""
         log.debug('OCR结果 %s 耗时 %.2f', scan_result, time.time() - start_time)
         return img_result[0][0]
+
+    def run_ocr_single_line_batch(self, image_list: List[MatLike], threshold: float = None) -> List[str]:
+        """
+        对多张图片进行单行文本识别 未命中缓存的图片合并成一次模型调用
+        :param image_list: 图片列表
+        :param threshold: 阈值
+        :return: 每张图片识别的文本
+        """
+        result_list: List[Optional[str]] = [None for _ in image_list]
+        key_list: List[Optional[tuple]] = [None for _ in image_list]
+        to_ocr_idx_list: List[int] = []
+        for idx, image in enumerate(image_list):
+            if self.cache_enabled:
+                key_list[idx] = get_ocr_cache_key(image, 'rec', threshold)
+                result_list[idx] = self.cache.get(key_list[idx])
+            if result_list[idx] is None:
+                to_ocr_idx_list.append(idx)
+
+        if len(to_ocr_idx_list) > 0:
+            ocr_result_list = self._run_rec_batch_by_model([image_list[idx] for idx in to_ocr_idx_list], threshold)
+            for idx, ocr_result in zip(to_ocr_idx_list, ocr_result_list):
+                result_list[idx] = ocr_result
+                if self.cache_enabled:
+                    self.cache.put(key_list[idx], ocr_result)
+
+        return result_list
+
+    @record_performance
+    def _run_rec_batch_by_model(self, image_list: List[MatLike], threshold: float = None) -> List[str]:
+        """
+        只使用识别模型 一次识别多张图片
+        :param image_list: 图片列表
+        :param threshold: 匹配阈值
+        :return: 每张图片识别的文本 置信度低于阈值的为空字符串
+        """
+        start_time = time.time()
+        scan_result: list = self._model.ocr(image_list, det=False, cls=False)
+        result_list: List[str] = []
+        for text, score in scan_result[0]:
+            result_list.append('' if threshold is not None and score < threshold else text)
+        log.debug('批量OCR结果 %s 耗时 %.2f', result_list, time.time() - start_time)
+        return result_list
+
+    def log_cache_stats(self) -> None:
+        log.info('OCR结果缓存 %s', self.cache)
+
+    def clear_cache(self) -> None:
+        self.cache.clear()
+
+
+def get_ocr_cache_key(image: MatLike, mode: str, *args) -> tuple:
+    """
+    OCR结果缓存的key 使用缩小并量化后的图片哈希 轻微的噪点不影响 文字变化时会不同
+    :param image: 图片
+    :param mode: OCR模式
+    :param args: 其它影响结果的参数
+    :return:
+    """
+    h, w = image.shape[:2]
+    if h >= 2 and w >= 2:
+        small = cv2.resize(image, (w // 2, h // 2), interpolation=cv2.INTER_AREA)
+    else:
+        small = image
+    if small.dtype == np.uint8:
+        small = small >> OCR_CACHE_QUANTIZE_BITS
+    digest = hashlib.blake2b(np.ascontiguousarray(small).tobytes(), digest_size=16).digest()
+    return (mode, image.shape, digest) + args
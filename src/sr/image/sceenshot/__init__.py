@@ -43,6 +43,8 @@ class LargeMapInfo:
         self.sp_result: Optional[dict] = None  # 特殊点坐标
         self.kps = None  # 特征点 用于特征匹配
         self.desc = None  # 描述子 用于特征匹配
+        self.origin_pyramid: Optional[MatLike] = None  # 按图像金字塔比例缩小的原图 全图搜索时使用
+        self.mask_pyramid: Optional[MatLike] = None  # 按图像金字塔比例缩小的掩码 全图搜索时使用
 
 
 class SimUniLevelInfo:
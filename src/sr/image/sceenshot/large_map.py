@@ -361,23 +361,12 @@ def get_large_map_road_mask(map_image: MatLike,
     to_check_connection = cv2.bitwise_or(road_mask, sp_mask) if sp_mask is not None else road_mask
 
     # 非道路连通块 < 50的(小的黑色块) 认为是噪点 加入道路
-    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(cv2.bitwise_not(to_check_connection), connectivity=4)
-    large_components = []
-    for label in range(1, num_labels):
-        if stats[label, cv2.CC_STAT_AREA] < 50:
-            large_components.append(label)
-    for label in large_components:
-        to_check_connection[labels == label] = 255
+    small_components = cv2_utils.get_connected_component_mask(cv2.bitwise_not(to_check_connection),
+                                                              connectivity=4, max_area=49)
+    to_check_connection[small_components > 0] = 255
 
     # 找到多于500个像素点的连通道路(大的白色块) 这些才是真的路
-    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(to_check_connection, connectivity=4)
-    large_components = []
-    for label in range(1, num_labels):
-        if stats[label, cv2.CC_STAT_AREA] > 500:
-            large_components.append(label)
-    real_road_mask = np.zeros(map_image.shape[:2], dtype=np.uint8)
-    for label in large_components:
-        real_road_mask[labels == label] = 255
+    real_road_mask = cv2_utils.get_connected_component_mask(to_check_connection, connectivity=4, min_area=501)
 
     # 排除掉特殊点
     if sp_mask is not None:
@@ -492,23 +481,12 @@ def get_road_mask_for_sim_uni(map_image: MatLike, sp_mask: Optional[MatLike] = N
     to_check_connection = cv2.bitwise_or(road_mask, sp_mask) if sp_mask is not None else road_mask
 
     # 非道路连通块 < 50的(小的黑色块) 认为是噪点 加入道路
-    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(cv2.bitwise_not(to_check_connection), connectivity=4)
-    large_components = []
-    for label in range(1, num_labels):
-        if stats[label, cv2.CC_STAT_AREA] < 50:
-            large_components.append(label)
-    for label in large_components:
-        to_check_connection[labels == label] = 255
+    small_components = cv2_utils.get_connected_component_mask(cv2.bitwise_not(to_check_connection),
+                                                              connectivity=4, max_area=49)
+    to_check_connection[small_components > 0] = 255
 
     # 找到多于500个像素点的连通道路(大的白色块) 这些才是真的路
-    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(to_check_connection, connectivity=4)
-    large_components = []
-    for label in range(1, num_labels):
-        if stats[label, cv2.CC_STAT_AREA] > 500:
-            large_components.append(label)
-    real_road_mask = np.zeros(map_image.shape[:2], dtype=np.uint8)
-    for label in large_components:
-        real_road_mask[labels == label] = 255
+    real_road_mask = cv2_utils.get_connected_component_mask(to_check_connection, connectivity=4, min_area=501)
 
     cv2_utils.show_image(real_road_mask, win_name='road_mask_sim', wait=0)
 
@@ -67,8 +67,7 @@ def preheat():
     预热缓存
     :return:
     """
-    for i in range(93, 100):  # 不同时期截图大小可能不一致
-        mini_map_angle_alas.RotationRemapData(i * 2)
+    mini_map_angle_alas.preheat()
 
     for i in range(int(360 // 1.875)):
         get_radio_to_del(i * 1.875)
@@ -97,13 +96,8 @@ def get_arrow_mask(mm: MatLike):
     arrow = extract_arrow(center)
     _, mask = cv2.threshold(arrow, 180, 255, cv2.THRESH_BINARY)
     # 做一个连通性检测 小于50个连通的认为是噪点
-    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
-    large_components = []
-    for label in range(1, num_labels):
-        if stats[label, cv2.CC_STAT_AREA] < 50:
-            large_components.append(label)
-    for label in large_components:
-        mask[labels == label] = 0
+    small_components = cv2_utils.get_connected_component_mask(mask, connectivity=8, max_area=49)
+    mask[small_components > 0] = 0
 
     whole_mask = np.zeros((h,w), dtype=np.uint8)
     whole_mask[cy-r:cy+r, cx-r:cx+r] = mask
@@ -206,6 +200,7 @@ def init_sp_mask_by_feature_match(mm_info: MiniMapInfo, im: ImageMatcher,
     source = mm_info.origin_del_radio
     source_mask = mm_info.circle_mask
     source_kps, source_desc = cv2_utils.feature_detect_and_compute(source, mask=source_mask)
+    template_id_list: List[str] = []
     for prefix in ['mm_tp', 'mm_sp', 'mm_boss', 'mm_sub']:
         for i in range(100):
             if i == 0:
@@ -217,54 +212,58 @@ def init_sp_mask_by_feature_match(mm_info: MiniMapInfo, im: ImageMatcher,
                 break
             if sp_types is not None and template_id not in sp_types:
                 continue
-
-            match_result_list = MatchResultList()
-            template = t.origin
-            template_mask = t.mask
-
-            template_kps, template_desc = t.kps, t.desc
-
-            good_matches, offset_x, offset_y, scale = cv2_utils.feature_match(
-                source_kps, source_desc,
-                template_kps, template_desc,
-                source_mask=source_mask)
+            template_id_list.append(template_id)
+
+    # 所有模板的描述符合并后 一次knn完成匹配
+    group = im.get_feature_template_group(template_id_list)
+    group_result = cv2_utils.feature_match_for_group(source_kps, source_desc, group, source_mask=source_mask)
+
+    for template_id in template_id_list:
+        t: TemplateImage = im.get_template(template_id)
+        match_result_list = MatchResultList()
+        template = t.origin
+        template_mask = t.mask
+
+        template_kps = t.kps
+
+        good_matches, offset_x, offset_y, scale = group_result[template_id]
+
+        if offset_x is not None:
+            mr = MatchResult(1, offset_x, offset_y, template.shape[1], template.shape[0], template_scale=scale)  #
+            match_result_list.append(mr, auto_merge=False)
+            sp_match_result[template_id] = match_result_list
+
+            # 缩放后的宽度和高度
+            sw = int(template.shape[1] * scale)
+            sh = int(template.shape[0] * scale)
+            # one_sp_mask = cv2.resize(template_mask, (sh, sw))
+            one_sp_mask = np.zeros((sh, sw))
+
+            rect1, rect2 = cv2_utils.get_overlap_rect(sp_mask, one_sp_mask, mr.x, mr.y)
+            sx_start, sy_start, sx_end, sy_end = rect1
+            tx_start, ty_start, tx_end, ty_end = rect2
+            # sp_mask[sy_start:sy_end, sx_start:sx_end] = cv2.bitwise_or(
+            #     sp_mask[sy_start:sy_end, sx_start:sx_end],
+            #     one_sp_mask[ty_start:ty_end, tx_start:tx_end]
+            # )
+            sp_mask[sy_start:sy_end, sx_start:sx_end] = 255
+
+        if show:
+            cv2_utils.show_image(source, win_name='source')
+            cv2_utils.show_image(source_mask, win_name='source_mask')
+            source_with_keypoints = cv2.drawKeypoints(source, source_kps, None)
+            cv2_utils.show_image(source_with_keypoints, win_name='source_with_keypoints_%s' % template_id)
+            template_with_keypoints = cv2.drawKeypoints(template, template_kps, None)
+            cv2_utils.show_image(
+                cv2.bitwise_and(template_with_keypoints, template_with_keypoints, mask=template_mask),
+                win_name='template_with_keypoints_%s' % template_id)
+            all_result = cv2.drawMatches(template, template_kps, source, source_kps, good_matches, None, flags=2)
+            cv2_utils.show_image(all_result, win_name='all_match_%s' % template_id)
 
             if offset_x is not None:
-                mr = MatchResult(1, offset_x, offset_y, template.shape[1], template.shape[0], template_scale=scale)  #
-                match_result_list.append(mr, auto_merge=False)
-                sp_match_result[template_id] = match_result_list
-
-                # 缩放后的宽度和高度
-                sw = int(template.shape[1] * scale)
-                sh = int(template.shape[0] * scale)
-                # one_sp_mask = cv2.resize(template_mask, (sh, sw))
-                one_sp_mask = np.zeros((sh, sw))
-
-                rect1, rect2 = cv2_utils.get_overlap_rect(sp_mask, one_sp_mask, mr.x, mr.y)
-                sx_start, sy_start, sx_end, sy_end = rect1
-                tx_start, ty_start, tx_end, ty_end = rect2
-                # sp_mask[sy_start:sy_end, sx_start:sx_end] = cv2.bitwise_or(
-                #     sp_mask[sy_start:sy_end, sx_start:sx_end],
-                #     one_sp_mask[ty_start:ty_end, tx_start:tx_end]
-                # )
-                sp_mask[sy_start:sy_end, sx_start:sx_end] = 255
-
-            if show:
-                cv2_utils.show_image(source, win_name='source')
-                cv2_utils.show_image(source_mask, win_name='source_mask')
-                source_with_keypoints = cv2.drawKeypoints(source, source_kps, None)
-                cv2_utils.show_image(source_with_keypoints, win_name='source_with_keypoints_%s' % template_id)
-                template_with_keypoints = cv2.drawKeypoints(template, template_kps, None)
-                cv2_utils.show_image(
-                    cv2.bitwise_and(template_with_keypoints, template_with_keypoints, mask=template_mask),
-                    win_name='template_with_keypoints_%s' % template_id)
-                all_result = cv2.drawMatches(template, template_kps, source, source_kps, good_matches, None, flags=2)
-                cv2_utils.show_image(all_result, win_name='all_match_%s' % template_id)
-
-                if offset_x is not None:
-                    cv2_utils.show_overlap(source, template, offset_x, offset_y, template_scale=scale, win_name='overlap_%s' % template_id)
-                cv2.waitKey(0)
-                cv2.destroyAllWindows()
+                cv2_utils.show_overlap(source, template, offset_x, offset_y, template_scale=scale, win_name='overlap_%s' % template_id)
+            cv2.waitKey(0)
+            cv2.destroyAllWindows()
 
     mm_info.sp_mask = sp_mask
     mm_info.sp_result = sp_match_result
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import List
 
 import cv2
 import numpy as np
@@ -6,17 +7,34 @@ from cv2.typing import MatLike
 from scipy import signal
 
 
+MINI_MAP_SIZE_LIST: List[int] = [i * 2 for i in range(93, 100)]  # 不同时期截图大小可能不一致
+
+
 @lru_cache
 def RotationRemapData(d: int):
-    mx = np.zeros((d, d), dtype=np.float32)
-    my = np.zeros((d, d), dtype=np.float32)
-    for i in range(d):
-        for j in range(d):
-            mx[i, j] = d / 2 + i / 2 * np.cos(2 * np.pi * j / d)
-            my[i, j] = d / 2 + i / 2 * np.sin(2 * np.pi * j / d)
+    """
+    把小地图的圆展开成矩形的映射表
+    第i行第j列 对应距离圆心 i/2 角度为 2πj/d 的点
+    使用float64计算后再转换 与逐个点计算的结果完全一致
+    :param d: 小地图的直径
+    :return:
+    """
+    i, j = np.meshgrid(np.arange(d), np.arange(d), indexing='ij')
+    radian = 2 * np.pi * j / d
+    mx = (d / 2 + i / 2 * np.cos(radian)).astype(np.float32)
+    my = (d / 2 + i / 2 * np.sin(radian)).astype(np.float32)
     return mx, my
 
 
+def preheat() -> None:
+    """
+    预先生成各种小地图大小的映射表 避免第一次计算朝向时卡顿
+    :return:
+    """
+    for d in MINI_MAP_SIZE_LIST:
+        RotationRemapData(d)
+
+
 def peak_confidence(arr, **kwargs):
     """
     Evaluate the prominence of the highest peak
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import List, Optional
+from typing import List, Optional, Callable
 
 from cv2.typing import MatLike
 
@@ -42,6 +42,31 @@ class TargetRect(Enum):
     """点击空白处关闭"""
 
 
+class TargetArea(Enum):
+
+    BATTLE_FAIL = ScreenArea(pc_rect=TargetRect.BATTLE_FAIL.value, text='战斗失败', lcs_percent=0.51)
+    """战斗失败"""
+
+    SIM_UNI_REWARD = ScreenArea(pc_rect=TargetRect.SIM_UNI_REWARD.value, text='沉浸奖励', lcs_percent=0.1)
+    """模拟宇宙 - 沉浸奖励"""
+
+
+class ScreenStateRule:
+
+    def __init__(self, status: str,
+                 area_list: Optional[List[ScreenArea]] = None,
+                 check: Optional[Callable[[], bool]] = None):
+        """
+        画面状态的判断规则 任一条件满足即认为在这个状态
+        :param status: 满足时返回的状态
+        :param area_list: 判断的区域 有模板的使用模板匹配 否则对区域文本进行单行识别
+        :param check: 无法用区域表示的判断 例如需要文本检测的 只在前面的规则都不满足时执行
+        """
+        self.status: str = status
+        self.area_list: List[ScreenArea] = [] if area_list is None else area_list
+        self.check: Optional[Callable[[], bool]] = check
+
+
 def is_normal_in_world(screen: MatLike, im: ImageMatcher) -> bool:
     """
     是否在普通大世界主界面 - 右上角是否有角色的图标
@@ -221,6 +246,46 @@ def in_screen_by_area_template(screen: MatLike, im: ImageMatcher, area: ScreenAr
     return mrl.max is not None
 
 
+def get_screen_state_by_rules(screen: MatLike, im: ImageMatcher, ocr: OcrMatcher,
+                              rule_list: List[ScreenStateRule]) -> Optional[str]:
+    """
+    按优先级判断画面状态 返回第一个满足的规则的状态
+    1. 先按顺序匹配所有模板区域 命中后 后面的规则都不需要判断
+    2. 命中规则之前的所有文本区域 合并成一次批量识别
+    3. 按顺序判断 规则的其它判断只在轮到时才执行
+    :param screen: 屏幕截图
+    :param im: 图片匹配器
+    :param ocr: 文本识别器
+    :param rule_list: 按优先级排列的规则
+    :return: 都不满足时返回空
+    """
+    template_hit_idx = len(rule_list)  # 第一个被模板命中的规则
+    for idx, rule in enumerate(rule_list):
+        if any(area.template_id is not None and in_screen_by_area_template(screen, im, area)
+               for area in rule.area_list):
+            template_hit_idx = idx
+            break
+
+    text_area_list: List[ScreenArea] = [area
+                                        for rule in rule_list[:template_hit_idx]
+                                        for area in rule.area_list
+                                        if area.template_id is None and area.text is not None]
+    part_list = [cv2_utils.crop_image_only(screen, area.rect) for area in text_area_list]
+    ocr_result_list = ocr.run_ocr_single_line_batch(part_list) if len(part_list) > 0 else []
+    text_hit_set = set(id(area)
+                       for area, ocr_result in zip(text_area_list, ocr_result_list)
+                       if str_utils.find_by_lcs(gt(area.text, 'ocr'), ocr_result, percent=area.lcs_percent))
+
+    for idx in range(template_hit_idx):
+        rule = rule_list[idx]
+        if any(id(area) in text_hit_set for area in rule.area_list):
+            return rule.status
+        if rule.check is not None and rule.check():
+            return rule.status
+
+    return rule_list[template_hit_idx].status if template_hit_idx < len(rule_list) else None
+
+
 def get_sim_uni_screen_state(
         screen: MatLike, im: ImageMatcher, ocr: OcrMatcher,
         in_world: bool = False,
@@ -259,26 +324,22 @@ def get_sim_uni_screen_state(
     :param sim_uni: 2.3版本新增 宇宙开始时选择祝福显示的是 模拟宇宙
     :return:
     """
-    if in_world and is_normal_in_world(screen, im):
-        return ScreenState.NORMAL_IN_WORLD.value
-
-    if battle_fail and is_battle_fail(screen, ocr):
-        return ScreenState.BATTLE_FAIL.value
-
-    if empty_to_close and is_empty_to_close(screen, ocr):
-        return ScreenState.EMPTY_TO_CLOSE.value
-
-    if reward and is_sim_uni_get_reward(screen, ocr):
-        return ScreenState.SIM_REWARD.value
-
-    if fast_recover and in_screen_by_area_text(screen, ocr, ScreenDialog.FAST_RECOVER_TITLE.value):
-        return ScreenDialog.FAST_RECOVER_TITLE.value.text
-
-    if express_supply and (
-            in_screen_by_area_text(screen, ocr, ScreenNormalWorld.EXPRESS_SUPPLY.value)
-            or in_screen_by_area_text(screen, ocr, ScreenNormalWorld.EXPRESS_SUPPLY_2.value)
-    ):
-        return ScreenNormalWorld.EXPRESS_SUPPLY.value.status
+    rule_list: List[ScreenStateRule] = []
+    if in_world:
+        rule_list.append(ScreenStateRule(ScreenState.NORMAL_IN_WORLD.value,
+                                         area_list=[ScreenNormalWorld.CHARACTER_ICON.value]))
+    if battle_fail:
+        rule_list.append(ScreenStateRule(ScreenState.BATTLE_FAIL.value, area_list=[TargetArea.BATTLE_FAIL.value]))
+    if empty_to_close:  # 文字位置不固定 需要使用文本检测
+        rule_list.append(ScreenStateRule(ScreenState.EMPTY_TO_CLOSE.value,
+                                         check=lambda: is_empty_to_close(screen, ocr)))
+    if reward:
+        rule_list.append(ScreenStateRule(ScreenState.SIM_REWARD.value, area_list=[TargetArea.SIM_UNI_REWARD.value]))
+    rule_list.extend(get_common_screen_state_rules(fast_recover=fast_recover, express_supply=express_supply))
+
+    state = get_screen_state_by_rules(screen, im, ocr, rule_list)
+    if state is not None:
+        return state
 
     titles = get_ui_title(screen, ocr, rect=TargetRect.SIM_UNI_UI_TITLE.value)
     sim_uni_idx = str_utils.find_best_match_by_lcs(ScreenState.SIM_TYPE_NORMAL.value, titles)
@@ -373,20 +434,17 @@ def get_world_patrol_screen_state(
     :param express_supply: 可能在列车补给
     :return:
     """
-    if in_world and is_normal_in_world(screen, im):
-        return ScreenState.NORMAL_IN_WORLD.value
-
-    if battle_fail and is_battle_fail(screen, ocr):
-        return ScreenState.BATTLE_FAIL.value
+    rule_list: List[ScreenStateRule] = []
+    if in_world:
+        rule_list.append(ScreenStateRule(ScreenState.NORMAL_IN_WORLD.value,
+                                         area_list=[ScreenNormalWorld.CHARACTER_ICON.value]))
+    if battle_fail:
+        rule_list.append(ScreenStateRule(ScreenState.BATTLE_FAIL.value, area_list=[TargetArea.BATTLE_FAIL.value]))
+    rule_list.extend(get_common_screen_state_rules(fast_recover=fast_recover, express_supply=express_supply))
 
-    if fast_recover and in_screen_by_area_text(screen, ocr, ScreenDialog.FAST_RECOVER_TITLE.value):
-        return ScreenDialog.FAST_RECOVER_TITLE.value.text
-
-    if express_supply and (
-            in_screen_by_area_text(screen, ocr, ScreenNormalWorld.EXPRESS_SUPPLY.value)
-            or in_screen_by_area_text(screen, ocr, ScreenNormalWorld.EXPRESS_SUPPLY_2.value)
-    ):
-        return ScreenNormalWorld.EXPRESS_SUPPLY.value.status
+    state = get_screen_state_by_rules(screen, im, ocr, rule_list)
+    if state is not None:
+        return state
 
     if battle:  # 有判断的时候 不在前面的情况 就认为是战斗
         return ScreenState.BATTLE.value
@@ -394,6 +452,24 @@ def get_world_patrol_screen_state(
     return None
 
 
+def get_common_screen_state_rules(fast_recover: bool = False, express_supply: bool = False) -> List[ScreenStateRule]:
+    """
+    大世界中可能出现的弹框的判断规则
+    :param fast_recover: 可能在快速恢复
+    :param express_supply: 可能在列车补给
+    :return:
+    """
+    rule_list: List[ScreenStateRule] = []
+    if fast_recover:
+        rule_list.append(ScreenStateRule(ScreenDialog.FAST_RECOVER_TITLE.value.text,
+                                         area_list=[ScreenDialog.FAST_RECOVER_TITLE.value]))
+    if express_supply:
+        rule_list.append(ScreenStateRule(ScreenNormalWorld.EXPRESS_SUPPLY.value.status,
+                                         area_list=[ScreenNormalWorld.EXPRESS_SUPPLY.value,
+                                                    ScreenNormalWorld.EXPRESS_SUPPLY_2.value]))
+    return rule_list
+
+
 def get_tp_battle_screen_state(
         screen: MatLike, im: ImageMatcher, ocr: OcrMatcher,
         in_world: bool = False,
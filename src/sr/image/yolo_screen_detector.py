@@ -4,8 +4,10 @@ from typing import Optional, Tuple
 from cv2.typing import MatLike
 
 from basic import os_utils
+from basic.onnx_utils import OnnxSessionConfig
 from sr.const import STANDARD_RESOLUTION_W, OPPOSITE_DIRECTION
-from sryolo.detector import StarRailYOLO, DetectFrameResult
+from sr.performance_recorder import record_performance, trace_submit
+from sryolo.detector import StarRailYOLO, DetectFrameResult, DetectTracker
 
 _EXECUTOR = concurrent.futures.ThreadPoolExecutor(thread_name_prefix='sr_yolo_detector', max_workers=1)
 
@@ -18,14 +20,21 @@ class YoloScreenDetector:
 
     def __init__(self,
                  sim_uni_model_name: Optional[str] = None,
-                 world_patrol_model_name: Optional[str] = None
+                 world_patrol_model_name: Optional[str] = None,
+                 session_config: Optional[OnnxSessionConfig] = None
                  ):
+        """
+        :param sim_uni_model_name: 模拟宇宙用的模型名称
+        :param world_patrol_model_name: 锄大地用的模型名称
+        :param session_config: 模型推理会话的配置 为空时使用默认配置
+        """
         self.sim_uni_yolo: Optional[StarRailYOLO] = None
         """模拟宇宙用的模型"""
         if sim_uni_model_name is not None:
             self.sim_uni_yolo = StarRailYOLO(
                 model_parent_dir_path=get_yolo_model_parent_dir(),
-                model_name=sim_uni_model_name
+                model_name=sim_uni_model_name,
+                session_config=session_config
             )
 
         self.world_patrol_yolo: Optional[StarRailYOLO] = None
@@ -33,14 +42,18 @@ class YoloScreenDetector:
         if world_patrol_model_name is not None:
             self.world_patrol_yolo = StarRailYOLO(
                 model_parent_dir_path=get_yolo_model_parent_dir(),
-                model_name=world_patrol_model_name
+                model_name=world_patrol_model_name,
+                session_config=session_config
             )
 
         self.last_async_future: Optional[concurrent.futures.Future] = None
         """上一次异步回调"""
         self.last_detect_result: Optional[DetectFrameResult] = None
         """上一次识别结果"""
+        self.attack_tracker: DetectTracker = DetectTracker(keep_seconds=2)
+        """最近的可攻击状态识别结果"""
 
+    @record_performance
     def detect_should_attack_in_world(self, screen: MatLike, detect_time: float) -> DetectFrameResult:
         """
         大世界画面下使用 识别当前的可攻击状态
@@ -60,6 +73,7 @@ class YoloScreenDetector:
             self.last_detect_result = yolo.detect(screen, conf=0.85, detect_time=detect_time, cates=['界面提示被锁定', '界面提示可攻击'])
         else:
             self.last_detect_result = DetectFrameResult(raw_image=screen, detect_time=detect_time, results=[])
+        self.attack_tracker.update(self.last_detect_result)
 
         return self.last_detect_result
 
@@ -86,41 +100,46 @@ class YoloScreenDetector:
         """
         if self.last_async_future is not None and not self.last_async_future.done():
             return False, None
-        self.last_async_future = _EXECUTOR.submit(self.detect_should_attack_in_world, screen, detect_time)
+        self.last_async_future = trace_submit(_EXECUTOR, self.detect_should_attack_in_world, screen, detect_time)
         return True, self.last_async_future
 
-    def should_attack_in_world_last_result(self, detect_time: float, timeout_seconds: float = 0.5) -> bool:
+    def should_attack_in_world_last_result(self, detect_time: float, timeout_seconds: float = 0.5,
+                                           min_frames: int = 1, last_frames: int = 1) -> bool:
         """
-        取上一次的结果
+        取最近几次的结果
         大世界画面下使用 判断目前是否处于应该攻击的状态
         :param detect_time: 识别时间
         :param timeout_seconds: 多久秒之前的结果被认为是无效的
+        :param min_frames: 最近 last_frames 次识别中 至少有多少次识别到
+        :param last_frames: 取最近多少次识别结果 隔帧识别时可以传入2
         :return:
         """
-        if self.last_detect_result is None:
-            return False
-
-        if self.last_detect_result.detect_time + timeout_seconds < detect_time:
-            return False
-
-        return len(self.last_detect_result.results) > 0
+        return self.attack_tracker.is_seen(min_frames=min_frames, last_frames=last_frames,
+                                           now_time=detect_time, timeout_seconds=timeout_seconds)
 
     def get_attack_direction(self, screen: MatLike,
                              last_direction: Optional[str],
-                             detect_time: float) -> Tuple[bool, str]:
+                             detect_time: float,
+                             min_frames: int = 1,
+                             last_frames: int = 1) -> Tuple[bool, str]:
         """
         根据画面结果 判断下一次的攻击方向
         多个候选方向时 优先选上一次反方向的 防止产生的位置越走越远
         :param screen: 游戏画面
         :param last_direction: 上一次的攻击方向
-        :param
         :param detect_time: 识别时间
+        :param min_frames: 最近 last_frames 次识别中 至少识别到多少次的目标才使用
+        :param last_frames: 使用最近多少次的识别结果 为1时只使用本次结果
         :return: 是否有警告, 攻击方向
         """
         direction_cnt: dict[str, int] = {'w': 0, 'a': 0, 's': 0, 'd': 0}
 
         frame_result = self.detect_should_attack_in_world(screen, detect_time)
-        for result in frame_result.results:
+        if last_frames > 1:
+            result_list = [i.last_result for i in self.attack_tracker.get_stable_tracks(min_frames, last_frames)]
+        else:
+            result_list = frame_result.results
+        for result in result_list:
             x, y = result.center
             direction = None
             if x < STANDARD_RESOLUTION_W // 3:
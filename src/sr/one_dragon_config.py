@@ -1,9 +1,10 @@
 import os
 import shutil
-from typing import List, Optional
+from typing import List, Optional, Dict
 
 from basic import os_utils
 from basic.config import ConfigHolder
+from basic.onnx_utils import OnnxSessionConfig
 
 
 class OneDragonAccount:
@@ -242,3 +243,128 @@ class OneDragonConfig(ConfigHolder):
     @sim_uni_yolo.setter
     def sim_uni_yolo(self, new_value: str):
         self.update('sim_uni_yolo', new_value)
+
+    @property
+    def large_map_cache_mb(self) -> int:
+        """
+        大地图缓存的上限 单位MB
+        :return:
+        """
+        return self.get('large_map_cache_mb', 1024)
+
+    @large_map_cache_mb.setter
+    def large_map_cache_mb(self, new_value: int):
+        self.update('large_map_cache_mb', new_value)
+
+    @property
+    def template_cache_mb(self) -> int:
+        """
+        模板缓存的上限 单位MB
+        :return:
+        """
+        return self.get('template_cache_mb', 256)
+
+    @template_cache_mb.setter
+    def template_cache_mb(self, new_value: int):
+        self.update('template_cache_mb', new_value)
+
+    @property
+    def log_module_level(self) -> Dict[str, str]:
+        """
+        单独设置部分模块的日志等级 模块名 -> 等级名称 例如 {'cal_pos': 'DEBUG'}
+        模块名为日志所在的文件名 不带后缀
+        :return:
+        """
+        return self.get('log_module_level', {})
+
+    @log_module_level.setter
+    def log_module_level(self, new_value: Dict[str, str]):
+        self.update('log_module_level', new_value)
+
+    @property
+    def ocr_onnx_threads(self) -> int:
+        """
+        OCR模型推理使用的线程数 0时自动分配 检测模型与YOLO平分CPU核数的一半 方向分类和文本识别只用1个
+        :return:
+        """
+        return self.get('ocr_onnx_threads', 0)
+
+    @ocr_onnx_threads.setter
+    def ocr_onnx_threads(self, new_value: int):
+        self.update('ocr_onnx_threads', new_value)
+
+    @property
+    def yolo_onnx_threads(self) -> int:
+        """
+        YOLO模型推理使用的线程数 0时自动分配 与OCR检测模型平分CPU核数的一半
+        :return:
+        """
+        return self.get('yolo_onnx_threads', 0)
+
+    @yolo_onnx_threads.setter
+    def yolo_onnx_threads(self, new_value: int):
+        self.update('yolo_onnx_threads', new_value)
+
+    @property
+    def onnx_execution_mode(self) -> str:
+        """
+        模型推理的执行模式 sequential / parallel
+        :return:
+        """
+        return self.get('onnx_execution_mode', 'sequential')
+
+    @onnx_execution_mode.setter
+    def onnx_execution_mode(self, new_value: str):
+        self.update('onnx_execution_mode', new_value)
+
+    @property
+    def onnx_graph_optimization(self) -> str:
+        """
+        模型的图优化等级 disable / basic / extended / all
+        :return:
+        """
+        return self.get('onnx_graph_optimization', 'all')
+
+    @onnx_graph_optimization.setter
+    def onnx_graph_optimization(self, new_value: str):
+        self.update('onnx_graph_optimization', new_value)
+
+    @property
+    def onnx_mem_arena(self) -> bool:
+        """
+        模型推理是否使用内存池
+        :return:
+        """
+        return self.get('onnx_mem_arena', True)
+
+    @onnx_mem_arena.setter
+    def onnx_mem_arena(self, new_value: bool):
+        self.update('onnx_mem_arena', new_value)
+
+    @property
+    def onnx_optimized_model_cache(self) -> bool:
+        """
+        是否保存图优化后的模型 下次启动直接加载
+        :return:
+        """
+        return self.get('onnx_optimized_model_cache', False)
+
+    @onnx_optimized_model_cache.setter
+    def onnx_optimized_model_cache(self, new_value: bool):
+        self.update('onnx_optimized_model_cache', new_value)
+
+    def get_onnx_session_config(self, threads: int) -> OnnxSessionConfig:
+        """
+        创建模型推理会话的配置
+        :param threads: 算子内并行的线程数 见 ocr_onnx_threads 和 yolo_onnx_threads
+        :return:
+        """
+        return OnnxSessionConfig(
+            intra_op_num_threads=threads,
+            execution_mode=self.onnx_execution_mode,
+            graph_optimization_level=self.onnx_graph_optimization,
+            enable_mem_arena=self.onnx_mem_arena,
+            # 只拼接路径 真正保存优化后的模型时才创建文件夹
+            optimized_model_dir=(os.path.join(os_utils.get_work_dir(), 'model', 'optimized')
+                                 if self.onnx_optimized_model_cache else None)
+        )
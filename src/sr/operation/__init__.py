@@ -11,6 +11,7 @@ from basic.log_utils import log
 from sr.config.game_config import GameConfig
 from sr.context.context import Context, ContextEventId
 from sr.image.sceenshot import fill_uid_black
+from sr.performance_recorder import trace_span
 from sr.screen_area import ScreenArea
 
 
@@ -150,6 +151,13 @@ class Operation:
         """
         循环执系列动作直到完成为止
         """
+        with trace_span('op:%s' % self.__class__.__name__):
+            return self._execute()
+
+    def _execute(self) -> OperationResult:
+        """
+        循环执系列动作直到完成为止 由 execute 记录耗时
+        """
         init_result: OperationOneRoundResult = self._init_before_execute()
         if init_result is not None:
             if init_result.is_success:
@@ -186,8 +194,8 @@ class Operation:
                     self.on_pause()
             except Exception as e:
                 round_result = self.round_retry('异常')
-                if self.last_screenshot is not None:
-                    file_name = self.save_screenshot()
+                file_name = self.save_screenshot()
+                if file_name is not None:
                     log.error('%s 执行出错 相关截图保存至 %s', self.display_name, file_name, exc_info=True)
                 else:
                     log.error('%s 执行出错', self.display_name, exc_info=True)
@@ -276,19 +284,93 @@ class Operation:
         包装一层截图 会在内存中保存上一张截图 方便出错时候保存
         :return:
         """
-        self.last_screenshot = self.ctx.controller.screenshot()
+        with trace_span('screenshot'):
+            self.last_screenshot = self.ctx.controller.screenshot()
         return self.last_screenshot
 
-    def save_screenshot(self) -> str:
+    def save_screenshot(self) -> Optional[str]:
         """
         保存上一次的截图 并对UID打码
-        :return: 文件路径
+        :return: 文件名 没有截图或者没有保存时返回空
         """
         if self.last_screenshot is None:
-            return ''
+            return None
         fill_uid_black(self.last_screenshot)
         return save_debug_image(self.last_screenshot, prefix=self.__class__.__name__)
 
+    def wait_until_screen_stable(self, rect: Optional[Rect] = None, max_wait: float = 2,
+                                 stable_seconds: float = 0.2, interval: float = 0.05,
+                                 diff_threshold: float = 1.5) -> bool:
+        """
+        等待画面稳定 用于代替界面切换时固定的等待时间
+        不断截取区域的灰度缩略图 一段时间内都没有变化时认为画面稳定了
+        :param rect: 判断的区域 默认分辨率下的游戏窗口里的坐标 为空时判断整个画面
+        :param max_wait: 最多等待的秒数
+        :param stable_seconds: 画面保持多久没有变化认为稳定
+        :param interval: 截图间隔
+        :param diff_threshold: 缩略图平均像素差超过这个值认为有变化
+        :return: 是否在最多等待的时间内稳定下来
+        """
+        with trace_span('wait_stable'):
+            end_time = time.time() + max_wait
+            last = cv2_utils.get_thumbnail(self.ctx.controller.screenshot(roi=rect))
+            stable_start_time = time.time()
+            while self.ctx.running == 1:
+                now = time.time()
+                if now - stable_start_time >= stable_seconds:
+                    return True
+                if now >= end_time:
+                    return False
+                time.sleep(min(interval, end_time - now))
+                current = cv2_utils.get_thumbnail(self.ctx.controller.screenshot(roi=rect))
+                if cv2_utils.get_mean_diff(last, current) > diff_threshold:
+                    stable_start_time = time.time()
+                last = current
+            return False
+
+    def wait_until_changed(self, rect: Optional[Rect] = None, max_wait: float = 2,
+                           interval: float = 0.05, diff_threshold: float = 1.5,
+                           base_screen: Optional[MatLike] = None) -> bool:
+        """
+        等待画面发生变化 例如点击按钮后等待界面开始切换
+        :param rect: 判断的区域 默认分辨率下的游戏窗口里的坐标 为空时判断整个画面
+        :param max_wait: 最多等待的秒数
+        :param interval: 截图间隔
+        :param diff_threshold: 缩略图平均像素差超过这个值认为有变化
+        :param base_screen: 对比的画面 需要是整个游戏画面 为空时使用第一次截图
+        :return: 是否在最多等待的时间内发生变化
+        """
+        with trace_span('wait_changed'):
+            end_time = time.time() + max_wait
+            if base_screen is not None:
+                base = cv2_utils.get_thumbnail(cv2_utils.crop_image_only(base_screen, rect))
+            else:
+                base = cv2_utils.get_thumbnail(self.ctx.controller.screenshot(roi=rect))
+            while self.ctx.running == 1:
+                current = cv2_utils.get_thumbnail(self.ctx.controller.screenshot(roi=rect))
+                if cv2_utils.get_mean_diff(base, current) > diff_threshold:
+                    return True
+                now = time.time()
+                if now >= end_time:
+                    return False
+                time.sleep(min(interval, end_time - now))
+            return False
+
+    def wait_until_changed_and_stable(self, max_wait: float, rect: Optional[Rect] = None) -> bool:
+        """
+        操作后的等待 画面相对本轮的截图发生变化 并且稳定下来后结束
+        一直没有变化时 等待的时间与原来固定的等待一样
+        :param max_wait: 最多等待的秒数
+        :param rect: 判断的区域 默认分辨率下的游戏窗口里的坐标 为空时判断整个画面
+        :return: 是否在最多等待的时间内稳定下来
+        """
+        if max_wait <= 0:
+            return False
+        end_time = time.time() + max_wait
+        if not self.wait_until_changed(rect=rect, max_wait=max_wait, base_screen=self.last_screenshot):
+            return False
+        return self.wait_until_screen_stable(rect=rect, max_wait=end_time - time.time())
+
     @property
     def display_name(self) -> str:
         """
@@ -322,70 +404,87 @@ class Operation:
             self.op_callback(result)
 
     def round_success(self, status: str = None, data: Any = None,
-                      wait: Optional[float] = None, wait_round_time: Optional[float] = None) -> OperationOneRoundResult:
+                      wait: Optional[float] = None, wait_round_time: Optional[float] = None,
+                      wait_stable: bool = False) -> OperationOneRoundResult:
         """
         单轮成功 - 即整个指令成功
         :param status: 附带状态
         :param data: 返回数据
         :param wait: 等待秒数
         :param wait_round_time: 等待当前轮的运行时间到达这个时间时再结束 有wait时不生效
+        :param wait_stable: 画面变化后稳定下来就提前结束等待 上面的等待时间作为最多等待的时间
         :return:
         """
-        self._after_round_wait(wait=wait, wait_round_time=wait_round_time)
+        self._after_round_wait(wait=wait, wait_round_time=wait_round_time, wait_stable=wait_stable)
         return OperationOneRoundResult(result=Operation.SUCCESS, status=status, data=data)
 
     def round_wait(self, status: str = None, data: Any = None,
-                   wait: Optional[float] = None, wait_round_time: Optional[float] = None) -> OperationOneRoundResult:
+                   wait: Optional[float] = None, wait_round_time: Optional[float] = None,
+                   wait_stable: bool = False) -> OperationOneRoundResult:
         """
         单轮成功 - 即整个指令成功
         :param status: 附带状态
         :param data: 返回数据
         :param wait: 等待秒数
         :param wait_round_time: 等待当前轮的运行时间到达这个时间时再结束 有wait时不生效
+        :param wait_stable: 画面变化后稳定下来就提前结束等待 上面的等待时间作为最多等待的时间
         :return:
         """
-        self._after_round_wait(wait=wait, wait_round_time=wait_round_time)
+        self._after_round_wait(wait=wait, wait_round_time=wait_round_time, wait_stable=wait_stable)
         return OperationOneRoundResult(result=Operation.WAIT, status=status, data=data)
 
     def round_retry(self, status: str = None, data: Any = None,
-                    wait: Optional[float] = None, wait_round_time: Optional[float] = None) -> OperationOneRoundResult:
+                    wait: Optional[float] = None, wait_round_time: Optional[float] = None,
+                    wait_stable: bool = False) -> OperationOneRoundResult:
         """
         单轮成功 - 即整个指令成功
         :param status: 附带状态
         :param data: 返回数据
         :param wait: 等待秒数
         :param wait_round_time: 等待当前轮的运行时间到达这个时间时再结束 有wait时不生效
+        :param wait_stable: 画面变化后稳定下来就提前结束等待 上面的等待时间作为最多等待的时间
         :return:
         """
-        self._after_round_wait(wait=wait, wait_round_time=wait_round_time)
+        self._after_round_wait(wait=wait, wait_round_time=wait_round_time, wait_stable=wait_stable)
         return OperationOneRoundResult(result=Operation.RETRY, status=status, data=data)
 
     def round_fail(self, status: str = None, data: Any = None,
-                   wait: Optional[float] = None, wait_round_time: Optional[float] = None) -> OperationOneRoundResult:
+                   wait: Optional[float] = None, wait_round_time: Optional[float] = None,
+                   wait_stable: bool = False) -> OperationOneRoundResult:
         """
         单轮成功 - 即整个指令成功
         :param status: 附带状态
         :param data: 返回数据
         :param wait: 等待秒数
         :param wait_round_time: 等待当前轮的运行时间到达这个时间时再结束 有wait时不生效
+        :param wait_stable: 画面变化后稳定下来就提前结束等待 上面的等待时间作为最多等待的时间
         :return:
         """
-        self._after_round_wait(wait=wait, wait_round_time=wait_round_time)
+        self._after_round_wait(wait=wait, wait_round_time=wait_round_time, wait_stable=wait_stable)
         return OperationOneRoundResult(result=Operation.FAIL, status=status, data=data)
 
-    def _after_round_wait(self, wait: Optional[float] = None, wait_round_time: Optional[float] = None):
+    def _after_round_wait(self, wait: Optional[float] = None, wait_round_time: Optional[float] = None,
+                          wait_stable: bool = False):
         """
         每轮指令后进行的等待
         :param wait: 等待秒数
         :param wait_round_time: 等待当前轮的运行时间到达这个时间时再结束 有wait时不生效
+        :param wait_stable: 画面变化后稳定下来就提前结束等待 上面的等待时间作为最多等待的时间
         :return:
         """
-        if wait is not None and wait > 0:
-            time.sleep(wait)
+        if wait_stable:
+            if wait is not None and wait > 0:
+                self.wait_until_changed_and_stable(wait)
+            elif wait_round_time is not None and wait_round_time > 0:
+                self.wait_until_changed_and_stable(wait_round_time - (time.time() - self.round_start_time))
+        elif wait is not None and wait > 0:
+            with trace_span('sleep'):
+                time.sleep(wait)
         elif wait_round_time is not None and wait_round_time > 0:
             to_wait = wait_round_time - (time.time() - self.round_start_time)
             if to_wait > 0:
-                time.sleep(to_wait)
+                with trace_span('sleep'):
+                    time.sleep(to_wait)
 
     @staticmethod
     def op_success(status: str = None, data: Any = None) -> OperationResult:
@@ -408,21 +507,26 @@ class Operation:
         return OperationResult(success=False, status=status, data=data)
 
     def round_by_op(self, op_result: OperationResult, retry_on_fail: bool = False,
-                    wait: Optional[float] = None, wait_round_time: Optional[float] = None) -> OperationOneRoundResult:
+                    wait: Optional[float] = None, wait_round_time: Optional[float] = None,
+                    wait_stable: bool = False) -> OperationOneRoundResult:
         """
         根据一个指令的结果获取当前轮的结果
         :param op_result: 指令结果
         :param retry_on_fail: 失败的时候是否重试
         :param wait: 等待时间
         :param wait_round_time: 等待当前轮的运行时间到达这个时间时再结束 有wait时不生效
+        :param wait_stable: 画面变化后稳定下来就提前结束等待 上面的等待时间作为最多等待的时间
         :return:
         """
         if op_result.success:
-            return self.round_success(status=op_result.status, data=op_result.data, wait=wait, wait_round_time=wait_round_time)
+            return self.round_success(status=op_result.status, data=op_result.data, wait=wait, wait_round_time=wait_round_time,
+                                      wait_stable=wait_stable)
         elif retry_on_fail:
-            return self.round_retry(status=op_result.status, data=op_result.data, wait=wait, wait_round_time=wait_round_time)
+            return self.round_retry(status=op_result.status, data=op_result.data, wait=wait, wait_round_time=wait_round_time,
+                                    wait_stable=wait_stable)
         else:
-            return self.round_fail(status=op_result.status, data=op_result.data, wait=wait, wait_round_time=wait_round_time)
+            return self.round_fail(status=op_result.status, data=op_result.data, wait=wait, wait_round_time=wait_round_time,
+                                   wait_stable=wait_stable)
 
     def round_fail_by_op(self, op_result: OperationResult) -> OperationOneRoundResult:
         return self.round_fail(status=op_result.status, data=op_result.data)
@@ -601,7 +705,8 @@ class StateOperationNode:
                  op: Optional[Operation] = None,
                  retry_on_op_fail: bool = False,
                  wait_after_op: Optional[float] = None,
-                 timeout_seconds: Optional[float] = None):
+                 timeout_seconds: Optional[float] = None,
+                 wait_stable: bool = False):
         """
         带状态指令的节点
         :param cn: 节点名称
@@ -610,6 +715,7 @@ class StateOperationNode:
         :param retry_on_op_fail: op指令失败时是否进入重试
         :param wait_after_op: op指令后的等待时间
         :param timeout_seconds: 该节点的超时秒数
+        :param wait_stable: 画面变化后稳定下来就提前结束 wait_after_op 作为最多等待的时间
         """
 
         self.cn: str = cn
@@ -630,6 +736,9 @@ class StateOperationNode:
         self.timeout_seconds: Optional[float] = timeout_seconds
         """该节点的超时秒数"""
 
+        self.wait_stable: bool = wait_stable
+        """画面稳定后提前结束等待"""
+
 
 class StateOperationEdge:
 
@@ -831,14 +940,20 @@ class StateOperation(Operation):
 
         if self._current_node.func is not None:
             current_op = self._current_node.func
-            current_round_result: OperationOneRoundResult = current_op()
+            with trace_span('node:%s' % self._current_node.cn):
+                current_round_result: OperationOneRoundResult = current_op()
             if self._current_node.wait_after_op is not None:
-                time.sleep(self._current_node.wait_after_op)
+                if self._current_node.wait_stable:
+                    self.wait_until_changed_and_stable(self._current_node.wait_after_op)
+                else:
+                    with trace_span('sleep'):
+                        time.sleep(self._current_node.wait_after_op)
         elif self._current_node.op is not None:
             op_result = self._current_node.op.execute()
             current_round_result = self.round_by_op(op_result,
                                                     retry_on_fail=self._current_node.retry_on_op_fail,
-                                                    wait=self._current_node.wait_after_op)
+                                                    wait=self._current_node.wait_after_op,
+                                                    wait_stable=self._current_node.wait_stable)
         else:
             return self.round_fail('节点处理函数和指令都没有设置')
 
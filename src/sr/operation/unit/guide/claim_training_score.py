@@ -43,7 +43,7 @@ class ClaimTrainingScore(Operation):
         else:
             self.ctx.controller.click(result.center)
             self.claim = True
-            return self.round_wait(wait=1)
+            return self.round_wait(wait=1, wait_stable=True)
 
     def _retry_fail_to_success(self, retry_status: str) -> Optional[str]:
         """
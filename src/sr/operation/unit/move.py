@@ -3,7 +3,7 @@ from typing import List, Optional, Tuple, Callable, ClassVar
 
 from cv2.typing import MatLike
 
-from basic import Point, cal_utils, debug_utils, Rect
+from basic import Point, cal_utils, Rect
 from basic.i18_utils import gt
 from basic.img import MatchResult
 from basic.log_utils import log
@@ -18,6 +18,7 @@ from sr.image.sceenshot.screen_state_enum import ScreenState
 from sr.operation import Operation, OperationOneRoundResult, OperationResult, StateOperation, StateOperationNode
 from sr.operation.unit.record_coordinate import RecordCoordinate
 from sr.operation.unit.world_patrol_battle import WorldPatrolEnterFight
+from sr.pos_tracker import PosTracker
 from sr.screen_area.screen_normal_world import ScreenNormalWorld
 
 
@@ -173,6 +174,7 @@ class MoveDirectly(Operation):
         self.no_battle: bool = no_battle  # 本次移动是否保证没有战斗
         self.technique_fight: bool = technique_fight  # 是否使用秘技进入战斗
         self.technique_only: bool = technique_only  # 是否只使用秘技进入战斗
+        self.tracker: PosTracker = PosTracker()  # 移动中追踪坐标 减少每次完整计算坐标的开销
 
     def handle_init(self) -> Optional[OperationOneRoundResult]:
         """
@@ -191,6 +193,7 @@ class MoveDirectly(Operation):
         if self.ctx.controller.is_moving:  # 连续移动的时候 使用开始点作为一个起始点
             self.pos.append(self.start_pos)
         self.stop_move_time = None
+        self.tracker.reset()
 
         return None
 
@@ -376,6 +379,7 @@ class MoveDirectly(Operation):
         mm_info = mini_map.analyse_mini_map(mm)
 
         if len(self.pos) == 0:  # 第一个可以直接使用开始点 不进行计算
+            self.tracker.update(self.start_pos, now_time, moving=self.ctx.controller.is_moving, angle=mm_info.angle)
             return self.start_pos, mm_info
 
         # 正确移动时 人物不应该偏离直线太远
@@ -387,20 +391,70 @@ class MoveDirectly(Operation):
                                max_line_distance=max_line_distance
                                )
 
-        next_pos = self.do_cal_pos(mm_info, lm_rect, verify)
+        next_pos = None
+        # 战斗、脱困后位置变化较大 不使用追踪
+        if not self.ctx.pos_first_cal_pos_after_fight and self.stuck_times == 0:
+            next_pos = self.track_pos(mm_info, now_time, verify)
+        if next_pos is None:
+            next_pos = self.do_cal_pos(mm_info, lm_rect, verify)
+
+        if next_pos is not None:
+            self.tracker.update(next_pos.center, now_time, scale=next_pos.template_scale,
+                                moving=self.ctx.controller.is_moving, angle=mm_info.angle)
 
         if next_pos is None:
             log.error('无法判断当前人物坐标')
             if self.ctx.one_dragon_config.is_debug and self.no_pos_times == 0:  # 只记录第一次识别坐标失败的
-                debug_utils.get_executor().submit(
-                    cal_pos.save_as_test_case,
-                    mm, self.region, verify
-                )
+                cal_pos.save_as_test_case(mm, self.region, verify)  # 在后台保存
         else:
             if self.ctx.record_coordinate and now_time - self.last_rec_time > 0.5:
                 RecordCoordinate.save(self.region, mm, next_pos)
         return next_pos.center if next_pos is not None else None, mm_info
 
+    def track_pos(self, mm_info: MiniMapInfo, now_time: float, verify: VerifyPosInfo) -> Optional[MatchResult]:
+        """
+        根据追踪器预测的坐标 只在附近使用单一缩放比例计算坐标
+        :param mm_info: 当前的小地图信息
+        :param now_time: 当前时间
+        :param verify: 用于验证坐标的信息
+        :return: 追踪失败时返回空 需要再进行完整的计算
+        """
+        if not self.tracker.tracking:
+            return None
+        moving = self.ctx.controller.is_moving
+        scale_list = cal_pos.get_mini_map_scale_list(moving, self.ctx.controller.get_move_time())
+        scale = self.tracker.choose_scale(scale_list)
+        if scale is None:
+            return None
+
+        lm_rect = self.tracker.get_search_rect(self.lm_info.gray.shape, mm_info.origin.shape[:2], now_time,
+                                               moving=moving, angle=mm_info.angle)
+        try:
+            next_pos = self.do_track_pos(mm_info, lm_rect, scale)
+        except Exception:
+            next_pos = None
+            log.error('追踪坐标失败', exc_info=True)
+
+        if (next_pos is None
+                or not self.tracker.is_valid_result(next_pos.center, now_time, moving=moving, angle=mm_info.angle)
+                or not cal_pos.is_valid_result(next_pos, verify)):
+            log.debug('追踪坐标失败 使用完整计算')
+            return None
+
+        log.debug('追踪坐标成功 %s', next_pos.center)
+        return next_pos
+
+    def do_track_pos(self, mm_info: MiniMapInfo, lm_rect: Rect, scale: float) -> Optional[MatchResult]:
+        """
+        真正的追踪坐标 只使用道路掩码匹配
+        :param mm_info: 当前的小地图信息
+        :param lm_rect: 预测坐标附近的大地图范围
+        :param scale: 使用的缩放比例
+        :return:
+        """
+        return cal_pos.cal_character_pos_by_road_mask(self.ctx.im, self.lm_info, mm_info,
+                                                      lm_rect=lm_rect, scale_list=[scale], pyramid=False)
+
     def do_cal_pos(self, mm_info: MiniMapInfo,
                    lm_rect: Rect, verify: VerifyPosInfo) -> Optional[MatchResult]:
         """
@@ -477,7 +531,9 @@ class MoveDirectly(Operation):
         self.stop_move_time = None
         self.ctx.update_pos_after_move(next_pos)
         if now_time - self.last_rec_time > self.rec_pos_interval:  # 隔一段时间才记录一个点
-            self.ctx.controller.move_towards(next_pos, self.target, mm_info.angle,
+            # 使用滤波后的坐标计算朝向 减少识别误差带来的来回转向
+            from_pos = self.tracker.pos if self.tracker.tracking else next_pos
+            self.ctx.controller.move_towards(from_pos, self.target, mm_info.angle,
                                              run=self.run_mode == game_config_const.RUN_MODE_BTN)
             # time.sleep(0.5)  # 如果使用小箭头计算方向 则需要等待人物转过来再进行下一轮
             self.pos.append(next_pos)
@@ -492,6 +548,7 @@ class MoveDirectly(Operation):
         :return:
         """
         self.ctx.controller.stop_moving_forward()
+        self.tracker.reset()
 
     def handle_resume(self) -> None:
         """
@@ -1,11 +1,25 @@
-import time
+import contextvars
+import functools
+import json
+import math
 import os
-import yaml
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Optional, List, Dict
+
 import psutil
+import yaml
 
 from basic import os_utils
 from basic.log_utils import log
 
+HISTOGRAM_MIN: float = 1e-5  # 直方图最小的耗时 10微秒
+HISTOGRAM_RATIO: float = 1.1  # 直方图相邻桶的比例 即百分位数的误差约10%
+HISTOGRAM_SIZE: int = 200  # 直方图桶的数量 可以覆盖到 10微秒 * 1.1^200 约 1900秒
+
 
 class PerformanceRecord:
 
@@ -15,6 +29,7 @@ class PerformanceRecord:
         self.total = 0
         self.max = 0
         self.min = 999
+        self.histogram: List[int] = [0] * (HISTOGRAM_SIZE + 1)  # 按对数分桶的耗时次数 用于计算百分位数
 
     def add(self, t):
         self.cnt += 1
@@ -23,20 +38,88 @@ class PerformanceRecord:
             self.max = t
         if t < self.min:
             self.min = t
+        self.histogram[get_histogram_idx(t)] += 1
 
     @property
     def avg(self):
         return self.total / self.cnt if self.cnt > 0 else 0
 
+    def percentile(self, p: float) -> float:
+        """
+        根据直方图估算百分位数
+        :param p: 百分位 0~100
+        :return: 耗时 不会超过实际的最大耗时
+        """
+        if self.cnt == 0:
+            return 0
+        target = self.cnt * p / 100.0
+        acc = 0
+        for idx, cnt in enumerate(self.histogram):
+            acc += cnt
+            if acc >= target and cnt > 0:
+                return min(HISTOGRAM_MIN * (HISTOGRAM_RATIO ** idx), self.max)
+        return self.max
+
+    @property
+    def p50(self) -> float:
+        return self.percentile(50)
+
+    @property
+    def p95(self) -> float:
+        return self.percentile(95)
+
+    @property
+    def p99(self) -> float:
+        return self.percentile(99)
+
     def __repr__(self):
-        return ('[%s] 次数: %d 平均耗时: %.6f 最高耗时: %.6f, 最低耗时: %.6f, 总耗时: %.6f' %
-                (self.id, self.cnt, self.avg, self.max, self.min, self.total))
+        return ('[%s] 次数: %d 平均耗时: %.6f P50: %.6f P95: %.6f P99: %.6f 最高耗时: %.6f, 最低耗时: %.6f, 总耗时: %.6f' %
+                (self.id, self.cnt, self.avg, self.p50, self.p95, self.p99, self.max, self.min, self.total))
+
+
+def get_histogram_idx(t: float) -> int:
+    """
+    耗时对应的直方图桶 桶的上界为 HISTOGRAM_MIN * HISTOGRAM_RATIO ^ idx
+    :param t: 耗时
+    :return:
+    """
+    if t <= HISTOGRAM_MIN:
+        return 0
+    idx = math.ceil(math.log(t / HISTOGRAM_MIN) / math.log(HISTOGRAM_RATIO))
+    return min(idx, HISTOGRAM_SIZE)
+
+
+class TraceSpan:
+
+    def __init__(self, span_id: int, name: str, parent: Optional['TraceSpan'], args: Optional[dict] = None):
+        """
+        一段耗时的记录 可以嵌套
+        """
+        self.span_id: int = span_id
+        self.name: str = name
+        self.parent_id: Optional[int] = None if parent is None else parent.span_id
+        self.args: Optional[dict] = args
+        thread = threading.current_thread()
+        self.thread_id: int = thread.ident
+        self.thread_name: str = thread.name
+        self.start: float = time.perf_counter()
+        self.end: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        return 0 if self.end is None else self.end - self.start
 
 
 class PerformanceRecorder:
 
     def __init__(self):
         self.record_map = {}
+        self._lock = threading.Lock()
+
+        self.tracing: bool = False  # 是否记录每一段耗时 用于导出火焰图
+        self.span_list: deque = deque(maxlen=200000)  # 已结束的耗时记录 超出时丢弃最早的
+        self._span_id: int = 0
+        self.trace_start_time: float = time.perf_counter()
 
     def record(self, id: str, t: float):
         """
@@ -45,16 +128,48 @@ class PerformanceRecorder:
         :param t:
         :return:
         """
-        if id not in self.record_map:
-            self.record_map[id] = PerformanceRecord(id)
+        with self._lock:
+            if id not in self.record_map:
+                self.record_map[id] = PerformanceRecord(id)
 
-        self.record_map[id].add(t)
+            self.record_map[id].add(t)
 
     def get_record(self, id: str):
         return self.record_map[id] if id in self.record_map else PerformanceRecord(id)
 
+    def start_tracing(self, max_span_cnt: int = 200000) -> None:
+        """
+        开始记录每一段耗时
+        :param max_span_cnt: 最多保留的记录数量
+        :return:
+        """
+        with self._lock:
+            self.span_list = deque(maxlen=max_span_cnt)
+            self.trace_start_time = time.perf_counter()
+            self.tracing = True
+
+    def stop_tracing(self) -> None:
+        self.tracing = False
+
+    def new_span(self, name: str, parent: Optional[TraceSpan], args: Optional[dict] = None) -> TraceSpan:
+        with self._lock:
+            self._span_id += 1
+            span_id = self._span_id
+        return TraceSpan(span_id, name, parent, args)
+
+    def finish_span(self, span: TraceSpan) -> None:
+        span.end = time.perf_counter()
+        self.record(span.name, span.duration)
+        if self.tracing:
+            self.span_list.append(span)
+
+    def get_span_list(self) -> List[TraceSpan]:
+        with self._lock:
+            return list(self.span_list)
+
 
 recorder = PerformanceRecorder()
+_current_span: contextvars.ContextVar[Optional[TraceSpan]] = contextvars.ContextVar('sr_od_trace_span', default=None)
 
 
 def get_recorder():
@@ -65,15 +180,50 @@ def add_record(id: str, t: float):
     recorder.record(id, t)
 
 
+@contextmanager
+def trace_span(name: str, **kwargs):
+    """
+    记录一段代码的耗时 嵌套使用时会记录父子关系
+    :param name: 名称 同时作为统计耗时的id
+    :param kwargs: 附加信息 会在导出时展示
+    :return:
+    """
+    span = recorder.new_span(name, _current_span.get(), kwargs if len(kwargs) > 0 else None)
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+        recorder.finish_span(span)
+
+
 def record_performance(func):
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        t1 = time.time()
-        result = func(*args, **kwargs)
-        add_record(func.__name__, time.time() - t1)
-        return result
+        with trace_span(func.__name__):
+            return func(*args, **kwargs)
     return wrapper
 
 
+def trace_submit(executor: Executor, fn, *args, **kwargs) -> Future:
+    """
+    提交到线程池执行 并保留当前的耗时记录 使得线程中的记录可以归属到当前记录下
+    :param executor: 线程池
+    :param fn: 执行的方法
+    :return:
+    """
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
+
+
+def start_tracing(max_span_cnt: int = 200000) -> None:
+    recorder.start_tracing(max_span_cnt)
+
+
+def stop_tracing() -> None:
+    recorder.stop_tracing()
+
+
 def get(id: str):
     return recorder.get_record(id)
 
@@ -99,6 +249,99 @@ def save_performance_record():
     data['memory_used'] = f"{memory_info.used / (1024.0 ** 3)} GB"
     for k, v in recorder.record_map.items():
         data['time_%s' % k] = v.avg
+        data['p50_%s' % k] = v.p50
+        data['p95_%s' % k] = v.p95
+        data['p99_%s' % k] = v.p99
 
     with open(path, 'w', encoding='utf-8') as file:
         yaml.dump(data, file)
+
+    if recorder.tracing:
+        log_dir = os_utils.get_path_under_work_dir('.log')
+        export_chrome_trace(os.path.join(log_dir, 'trace.json'))
+        export_speedscope(os.path.join(log_dir, 'trace.speedscope.json'))
+
+
+def export_chrome_trace(path: str) -> None:
+    """
+    导出成 Chrome trace 格式 可以在 chrome://tracing 或者 Perfetto 中查看
+    :param path: 文件路径
+    :return:
+    """
+    event_list = []
+    thread_name_map: Dict[int, str] = {}
+    for span in recorder.get_span_list():
+        thread_name_map[span.thread_id] = span.thread_name
+        event = {
+            'name': span.name,
+            'ph': 'X',
+            'ts': (span.start - recorder.trace_start_time) * 1e6,
+            'dur': span.duration * 1e6,
+            'pid': os.getpid(),
+            'tid': span.thread_id,
+            'args': {'id': span.span_id, 'parent': span.parent_id},
+        }
+        if span.args is not None:
+            event['args'].update(span.args)
+        event_list.append(event)
+
+    for thread_id, thread_name in thread_name_map.items():
+        event_list.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': thread_id,
+                           'args': {'name': thread_name}})
+
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'traceEvents': event_list, 'displayTimeUnit': 'ms'}, file, ensure_ascii=False, default=str)
+
+
+def export_speedscope(path: str) -> None:
+    """
+    导出成 speedscope 格式 每个线程一个时间线 可以在 https://www.speedscope.app 中查看
+    :param path: 文件路径
+    :return:
+    """
+    frame_idx_map: Dict[str, int] = {}
+    frame_list: List[dict] = []
+    thread_span_map: Dict[int, List[TraceSpan]] = {}
+    for span in recorder.get_span_list():
+        if span.name not in frame_idx_map:
+            frame_idx_map[span.name] = len(frame_list)
+            frame_list.append({'name': span.name})
+        thread_span_map.setdefault(span.thread_id, []).append(span)
+
+    profile_list = []
+    for thread_id, span_list in thread_span_map.items():
+        # 同一线程内的记录天然是嵌套的 按开始时间排序 同时开始的长的在外层
+        span_list.sort(key=lambda i: (i.start, -i.end))
+        event_list = []
+        stack: List[TraceSpan] = []
+        for span in span_list:
+            while len(stack) > 0 and stack[-1].end <= span.start:
+                closed = stack.pop()
+                event_list.append(_speedscope_event('C', frame_idx_map[closed.name], closed.end))
+            event_list.append(_speedscope_event('O', frame_idx_map[span.name], span.start))
+            stack.append(span)
+        while len(stack) > 0:
+            closed = stack.pop()
+            event_list.append(_speedscope_event('C', frame_idx_map[closed.name], closed.end))
+
+        profile_list.append({
+            'type': 'evented',
+            'name': '%s %d' % (span_list[0].thread_name, thread_id),
+            'unit': 'milliseconds',
+            'startValue': event_list[0]['at'],
+            'endValue': event_list[-1]['at'],
+            'events': event_list,
+        })
+
+    data = {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frame_list},
+        'profiles': profile_list,
+        'name': 'StarRailOneDragon',
+    }
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False)
+
+
+def _speedscope_event(event_type: str, frame_idx: int, t: float) -> dict:
+    return {'type': event_type, 'frame': frame_idx, 'at': (t - recorder.trace_start_time) * 1000}
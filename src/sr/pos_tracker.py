@@ -0,0 +1,164 @@
+import math
+from typing import Optional, List
+
+from basic import Point, Rect, cal_utils
+from sr.image.sceenshot import large_map
+
+
+class PosTracker:
+
+    def __init__(self,
+                 alpha: float = 0.85,
+                 beta: float = 0.3,
+                 search_radius: int = 12,
+                 max_innovation: float = 10):
+        """
+        移动过程中的人物坐标追踪 使用 alpha-beta 滤波估计位置和速度
+        每次先根据上一次的位置、速度和人物朝向预测当前坐标 只在预测点附近用单一缩放比例匹配
+        预测误差过大时 由调用方退回完整的坐标计算
+        :param alpha: 位置的修正系数
+        :param beta: 速度的修正系数
+        :param search_radius: 在预测点附近搜索的半径
+        :param max_innovation: 匹配结果与预测点的最大距离 超过时认为追踪失败
+        """
+        self.alpha: float = alpha
+        self.beta: float = beta
+        self.search_radius: int = search_radius
+        self.max_innovation: float = max_innovation
+
+        self.x: float = 0  # 滤波后的坐标
+        self.y: float = 0
+        self.vx: float = 0  # 估计的速度 每秒移动的像素
+        self.vy: float = 0
+        self.last_time: Optional[float] = None  # 上一次更新的时间 为空时代表未开始追踪
+        self.scale: Optional[float] = None  # 上一次匹配使用的缩放比例
+
+    @property
+    def tracking(self) -> bool:
+        """
+        是否正在追踪
+        :return:
+        """
+        return self.last_time is not None
+
+    @property
+    def pos(self) -> Optional[Point]:
+        """
+        滤波后的坐标
+        :return:
+        """
+        return Point(int(round(self.x)), int(round(self.y))) if self.tracking else None
+
+    def reset(self) -> None:
+        """
+        停止追踪 例如战斗、脱困后 位置会有较大的变化
+        :return:
+        """
+        self.vx = 0
+        self.vy = 0
+        self.last_time = None
+        self.scale = None
+
+    def predict(self, now_time: float, moving: bool = True, angle: Optional[float] = None) -> Optional[Point]:
+        """
+        预测当前的坐标
+        :param now_time: 当前时间
+        :param moving: 是否在移动 没有移动时 认为停留在原地
+        :param angle: 人物朝向 正右方为0 顺时针为正。传入时 按当前朝向修正速度的方向
+        :return: 预测的坐标 未开始追踪时返回空
+        """
+        if not self.tracking:
+            return None
+        vx, vy = self._predict_velocity(moving, angle)
+        dt = max(now_time - self.last_time, 0)
+        return Point(int(round(self.x + vx * dt)), int(round(self.y + vy * dt)))
+
+    def update(self, pos: Point, now_time: float, scale: Optional[float] = None,
+               moving: bool = True, angle: Optional[float] = None) -> float:
+        """
+        使用新识别到的坐标修正状态
+        :param pos: 识别到的坐标
+        :param now_time: 识别的时间
+        :param scale: 识别使用的缩放比例
+        :param moving: 是否在移动
+        :param angle: 人物朝向
+        :return: 识别坐标与预测坐标的距离 第一次更新或者距离过大时会重新开始追踪
+        """
+        predict_pos = self.predict(now_time, moving, angle)
+        innovation = 0 if predict_pos is None else cal_utils.distance_between(pos, predict_pos)
+        self.scale = scale
+
+        if predict_pos is None or innovation > self.max_innovation * 2:
+            self.x, self.y = pos.x, pos.y
+            self.vx, self.vy = 0, 0
+            self.last_time = now_time
+            return innovation
+
+        dt = now_time - self.last_time
+        vx, vy = self._predict_velocity(moving, angle)
+        dx = pos.x - predict_pos.x
+        dy = pos.y - predict_pos.y
+        self.x = predict_pos.x + self.alpha * dx
+        self.y = predict_pos.y + self.alpha * dy
+        if dt > 0:
+            self.vx = vx + self.beta * dx / dt
+            self.vy = vy + self.beta * dy / dt
+        self.last_time = now_time
+        return innovation
+
+    def get_search_rect(self, lm_shape, mm_shape, now_time: float,
+                        moving: bool = True, angle: Optional[float] = None) -> Optional[Rect]:
+        """
+        获取预测坐标附近的搜索范围
+        :param lm_shape: 大地图尺寸
+        :param mm_shape: 小地图尺寸
+        :param now_time: 当前时间
+        :param moving: 是否在移动
+        :param angle: 人物朝向
+        :return: 大地图上的搜索范围 未开始追踪时返回空
+        """
+        predict_pos = self.predict(now_time, moving, angle)
+        if predict_pos is None:
+            return None
+        return large_map.get_large_map_rect_by_pos(lm_shape, mm_shape,
+                                                   (predict_pos.x, predict_pos.y, self.search_radius))
+
+    def choose_scale(self, scale_list: List[float]) -> Optional[float]:
+        """
+        选择追踪时使用的单一缩放比例
+        :param scale_list: 当前移动状态下 可能的缩放比例
+        :return: 优先使用上一次的缩放比例 无法确定时返回空
+        """
+        if self.scale is not None and self.scale in scale_list:
+            return self.scale
+        elif len(scale_list) == 1:
+            return scale_list[0]
+        else:
+            return None
+
+    def is_valid_result(self, pos: Point, now_time: float, moving: bool = True, angle: Optional[float] = None) -> bool:
+        """
+        追踪得到的坐标 是否和预测坐标足够接近
+        :param pos: 追踪得到的坐标
+        :param now_time: 当前时间
+        :param moving: 是否在移动
+        :param angle: 人物朝向
+        :return:
+        """
+        predict_pos = self.predict(now_time, moving, angle)
+        return predict_pos is not None and cal_utils.distance_between(pos, predict_pos) <= self.max_innovation
+
+    def _predict_velocity(self, moving: bool, angle: Optional[float]):
+        """
+        预测使用的速度 有朝向时 保持速度大小 方向改为人物朝向
+        :param moving: 是否在移动
+        :param angle: 人物朝向
+        :return:
+        """
+        if not moving:
+            return 0, 0
+        if angle is None:
+            return self.vx, self.vy
+        speed = math.sqrt(self.vx ** 2 + self.vy ** 2)
+        radian = math.radians(angle)
+        return speed * math.cos(radian), speed * math.sin(radian)
@@ -63,6 +63,17 @@ class MoveDirectlyInSimUni(MoveDirectly):
         first_state = ScreenNormalWorld.CHARACTER_ICON.value.status if in_world else ScreenState.BATTLE.value
         return SimUniEnterFight(self.ctx, config=self.config, first_state=first_state)
 
+    def do_track_pos(self, mm_info: MiniMapInfo, lm_rect: Rect, scale: float) -> Optional[MatchResult]:
+        """
+        真正的追踪坐标 模拟宇宙中不能直接使用道路掩码匹配 使用灰度图
+        :param mm_info: 当前的小地图信息
+        :param lm_rect: 预测坐标附近的大地图范围
+        :param scale: 使用的缩放比例
+        :return:
+        """
+        return cal_pos.sim_uni_cal_pos_by_gray(self.ctx.im, self.lm_info, mm_info,
+                                               lm_rect=lm_rect, scale_list=[scale])
+
     def do_cal_pos(self, mm_info: MiniMapInfo,
                    lm_rect: Rect, verify: VerifyPosInfo) -> Optional[MatchResult]:
         """
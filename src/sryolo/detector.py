@@ -1,7 +1,9 @@
 import os
+import threading
 import time
 import urllib.request
 import zipfile
+from collections import deque
 from typing import Optional, List, Tuple
 
 import cv2
@@ -9,7 +11,10 @@ import numpy as np
 import onnxruntime as ort
 import pandas as pd
 from cv2.typing import MatLike
+
+from basic import onnx_utils
 from basic.log_utils import log
+from basic.onnx_utils import OnnxSessionConfig
 
 
 class DetectContext:
@@ -117,13 +122,215 @@ class DetectFrameResult:
         """识别的结果"""
 
 
+class DetectTrack:
+
+    def __init__(self, track_id: int, result: DetectObjectResult, frame_idx: int, detect_time: float):
+        """
+        跨帧关联起来的同一个目标
+        :param track_id: 追踪的编号
+        :param result: 第一次识别到的结果
+        :param frame_idx: 第一次识别到的帧序号
+        :param detect_time: 第一次识别到的时间
+        """
+        self.track_id: int = track_id
+        """追踪的编号"""
+
+        self.detect_class: DetectClass = result.detect_class
+        """检测到的类别"""
+
+        self.last_result: DetectObjectResult = result
+        """最后一次识别到的结果"""
+
+        self.frame_idx_list: deque = deque([frame_idx])
+        """识别到这个目标的帧序号"""
+
+        self.score_list: deque = deque([result.score])
+        """每次识别到的得分"""
+
+        self.last_detect_time: float = detect_time
+        """最后一次识别到的时间"""
+
+    def add(self, result: DetectObjectResult, frame_idx: int, detect_time: float) -> None:
+        self.last_result = result
+        self.frame_idx_list.append(frame_idx)
+        self.score_list.append(result.score)
+        self.last_detect_time = detect_time
+
+    def remove_before(self, frame_idx: int) -> None:
+        """
+        移除过期帧的记录
+        :param frame_idx: 保留的最早帧序号
+        :return:
+        """
+        while len(self.frame_idx_list) > 0 and self.frame_idx_list[0] < frame_idx:
+            self.frame_idx_list.popleft()
+            self.score_list.popleft()
+
+    def seen_cnt(self, start_frame_idx: int) -> int:
+        """
+        从某一帧开始 识别到这个目标的帧数
+        :param start_frame_idx: 开始的帧序号
+        :return:
+        """
+        return sum(1 for i in self.frame_idx_list if i >= start_frame_idx)
+
+    @property
+    def avg_score(self) -> float:
+        """
+        窗口内的平均得分
+        :return:
+        """
+        return sum(self.score_list) / len(self.score_list) if len(self.score_list) > 0 else 0
+
+
+class DetectTracker:
+
+    def __init__(self, keep_seconds: float = 2, max_frames: int = 30, iou_threshold: float = 0.3):
+        """
+        保留最近一段时间的识别结果 并把相邻帧的同类目标按IOU关联起来
+        用于判断目标是否在最近M帧中出现了至少N帧 减少单帧误识别或漏识别的影响
+        :param keep_seconds: 保留多长时间的识别结果
+        :param max_frames: 最多保留的帧数
+        :param iou_threshold: 关联时的IOU阈值
+        """
+        self.keep_seconds: float = keep_seconds
+        self.iou_threshold: float = iou_threshold
+
+        self.frame_list: deque = deque(maxlen=max_frames)
+        """保留的识别结果"""
+        self.frame_idx_list: deque = deque(maxlen=max_frames)
+        """保留的识别结果对应的帧序号"""
+        self.track_list: List[DetectTrack] = []
+        """窗口内出现过的目标"""
+
+        self._next_frame_idx: int = 0
+        self._next_track_id: int = 0
+        self._lock = threading.Lock()
+
+    def update(self, frame: DetectFrameResult) -> None:
+        """
+        加入新的一帧识别结果
+        :param frame: 识别结果
+        :return:
+        """
+        with self._lock:
+            frame_idx = self._next_frame_idx
+            self._next_frame_idx += 1
+            self.frame_list.append(frame)
+            self.frame_idx_list.append(frame_idx)
+
+            # 按时间移除过期的帧
+            while len(self.frame_list) > 1 and frame.detect_time - self.frame_list[0].detect_time > self.keep_seconds:
+                self.frame_list.popleft()
+                self.frame_idx_list.popleft()
+
+            start_frame_idx = self.frame_idx_list[0]
+            for track in self.track_list:
+                track.remove_before(start_frame_idx)
+            self.track_list = [i for i in self.track_list if len(i.frame_idx_list) > 0]
+
+            self._associate(frame, frame_idx)
+
+    def _associate(self, frame: DetectFrameResult, frame_idx: int) -> None:
+        """
+        把本帧的结果关联到已有的目标上 按IOU从大到小贪心匹配 匹配不上的作为新目标
+        :param frame: 识别结果
+        :param frame_idx: 帧序号
+        :return:
+        """
+        pair_list = []
+        for result_idx, result in enumerate(frame.results):
+            for track_idx, track in enumerate(self.track_list):
+                if track.detect_class.class_id != result.detect_class.class_id:
+                    continue
+                iou = get_result_iou(result, track.last_result)
+                if iou >= self.iou_threshold:
+                    pair_list.append((iou, result_idx, track_idx))
+        pair_list.sort(key=lambda x: x[0], reverse=True)
+
+        matched_result: set = set()
+        matched_track: set = set()
+        for _, result_idx, track_idx in pair_list:
+            if result_idx in matched_result or track_idx in matched_track:
+                continue
+            matched_result.add(result_idx)
+            matched_track.add(track_idx)
+            self.track_list[track_idx].add(frame.results[result_idx], frame_idx, frame.detect_time)
+
+        for result_idx, result in enumerate(frame.results):
+            if result_idx in matched_result:
+                continue
+            self.track_list.append(DetectTrack(self._next_track_id, result, frame_idx, frame.detect_time))
+            self._next_track_id += 1
+
+    def get_recent_frames(self, last_frames: int, now_time: Optional[float] = None,
+                          timeout_seconds: Optional[float] = None) -> List[DetectFrameResult]:
+        """
+        获取最近的几帧识别结果
+        :param last_frames: 最近多少帧
+        :param now_time: 当前时间 与 timeout_seconds 一起使用
+        :param timeout_seconds: 多少秒之前的结果被认为是无效的
+        :return: 按时间顺序
+        """
+        with self._lock:
+            frame_list = list(self.frame_list)[-last_frames:]
+        if now_time is not None and timeout_seconds is not None:
+            frame_list = [i for i in frame_list if i.detect_time + timeout_seconds >= now_time]
+        return frame_list
+
+    def count_frames_with_result(self, last_frames: int, now_time: Optional[float] = None,
+                                 timeout_seconds: Optional[float] = None) -> int:
+        """
+        最近几帧中 有识别结果的帧数
+        :param last_frames: 最近多少帧
+        :param now_time: 当前时间 与 timeout_seconds 一起使用
+        :param timeout_seconds: 多少秒之前的结果被认为是无效的
+        :return:
+        """
+        frame_list = self.get_recent_frames(last_frames, now_time, timeout_seconds)
+        return sum(1 for i in frame_list if len(i.results) > 0)
+
+    def is_seen(self, min_frames: int = 1, last_frames: int = 1, now_time: Optional[float] = None,
+                timeout_seconds: Optional[float] = None) -> bool:
+        """
+        最近M帧中 是否至少有N帧识别到了目标
+        :param min_frames: 至少多少帧 即N
+        :param last_frames: 最近多少帧 即M
+        :param now_time: 当前时间 与 timeout_seconds 一起使用
+        :param timeout_seconds: 多少秒之前的结果被认为是无效的
+        :return:
+        """
+        return self.count_frames_with_result(last_frames, now_time, timeout_seconds) >= min_frames
+
+    def get_stable_tracks(self, min_frames: int = 1, last_frames: int = 1) -> List[DetectTrack]:
+        """
+        最近M帧中 至少出现了N帧的目标
+        :param min_frames: 至少多少帧 即N
+        :param last_frames: 最近多少帧 即M
+        :return:
+        """
+        with self._lock:
+            if len(self.frame_idx_list) == 0:
+                return []
+            start_frame_idx = list(self.frame_idx_list)[-last_frames:][0]
+            return [i for i in self.track_list if i.seen_cnt(start_frame_idx) >= min_frames]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.frame_list.clear()
+            self.frame_idx_list.clear()
+            self.track_list.clear()
+
+
 class StarRailYOLO:
 
     def __init__(self,
                  model_name: str = 'yolov8n-1088-full-v1',
                  model_parent_dir_path: Optional[str] = None,
                  cuda: bool = False,
-                 keep_result_seconds: float = 2
+                 keep_result_seconds: float = 2,
+                 session_config: Optional[OnnxSessionConfig] = None,
+                 use_io_binding: bool = True
                  ):
         """
         崩铁用的YOLO模型 参考自 https://github.com/ibaiGorordo/ONNX-YOLOv8-Object-Detection
@@ -131,9 +338,24 @@ class StarRailYOLO:
         :param model_parent_dir_path: 放置所有模型的根目录
         :param cuda: 是否启用CUDA
         :param keep_result_seconds: 保留多长时间的识别结果
+        :param session_config: 推理会话的配置 为空时使用默认配置
+        :param use_io_binding: 是否使用IOBinding 复用输入输出的内存
         """
         self.session: Optional[ort.InferenceSession] = None
 
+        # 每帧复用的内存 锄大地移动时会持续识别 避免每帧重新分配
+        self.use_io_binding: bool = use_io_binding
+        self._input_buffer: Optional[np.ndarray] = None
+        """模型输入 NCHW float32 RGB通道"""
+        self._letterbox_buffer: Optional[np.ndarray] = None
+        """缩放并填充后的图片 HWC uint8 BGR通道"""
+        self._letterbox_size: Tuple[int, int] = (0, 0)
+        """上一帧缩放后的宽高 变化时需要重新填充空白部分"""
+        self._io_binding: Optional[ort.IOBinding] = None
+        self._output_buffers: Optional[List[np.ndarray]] = None
+        """IOBinding绑定的输出 模型输出大小不固定时为空 由onnxruntime分配"""
+        self._buffer_lock = threading.Lock()
+
         # 从模型中读取到的输入输出信息
         self.input_names: List[str] = []
         self.onnx_input_width: int = 0
@@ -148,39 +370,27 @@ class StarRailYOLO:
         # 检测并下载模型
         model_dir_path = get_model_dir_path(model_parent_dir_path, model_name)
         # 加载模型
-        self.load_model(model_dir_path, cuda)
+        self.load_model(model_dir_path, cuda, session_config)
         self.load_detect_classes(model_dir_path)
 
         self.keep_result_seconds: float = keep_result_seconds
         """保留识别结果的秒数"""
-        self.detect_result_history: List[DetectFrameResult] = []
-        """历史识别结果"""
+        self.tracker: DetectTracker = DetectTracker(keep_seconds=keep_result_seconds)
+        """历史识别结果 以及跨帧关联的目标"""
         self.last_detect_result: DetectFrameResult = None
         """最后一次识别结果"""
 
-    def load_model(self, model_dir_path: str, cuda: bool) -> None:
+    def load_model(self, model_dir_path: str, cuda: bool,
+                   session_config: Optional[OnnxSessionConfig] = None) -> None:
         """
         加载模型
         :param model_dir_path: 存放模型的子目录
         :param cuda: 是否启用CUDA
+        :param session_config: 推理会话的配置 为空时使用默认配置
         :return:
         """
-        availables = ort.get_available_providers()
-        providers = ['CUDAExecutionProvider' if cuda else 'CPUExecutionProvider']
-        if cuda and 'CUDAExecutionProvider' not in availables:
-            log.error('机器未支持CUDA 使用CPU')
-            providers = ['CPUExecutionProvider']
-
-        sess_options = ort.SessionOptions()
-        sess_options.execution_mode = ort.ExecutionMode.ORT_PARALLEL  # 模型分支不多 算子间并行作用不大
-
         onnx_path = os.path.join(model_dir_path, 'model.onnx')
-        log.info('加载模型 %s', onnx_path)
-        self.session = ort.InferenceSession(
-            onnx_path,
-            providers=providers,
-            # sess_options=sess_options
-        )
+        self.session = onnx_utils.get_session(onnx_path, cuda=cuda, config=session_config)
         self.get_input_details()
         self.get_output_details()
 
@@ -224,14 +434,15 @@ class StarRailYOLO:
         context.labels = labels
         context.cates = cates
 
-        input_tensor = self.prepare_input(context)
-        t2 = time.time()
+        with self._buffer_lock:  # 输入输出的内存是复用的
+            input_tensor = self.prepare_input(context)
+            t2 = time.time()
 
-        outputs = self.inference(input_tensor)
-        t3 = time.time()
+            outputs = self.inference(input_tensor)
+            t3 = time.time()
 
-        results = self.process_output(outputs, context)
-        t4 = time.time()
+            results = self.process_output(outputs, context)
+            t4 = time.time()
 
         log.debug(f'识别完毕 得到结果 {len(results)}个。预处理耗时 {t2 - t1:.3f}s, 推理耗时 {t3 - t2:.3f}s, 后处理耗时 {t4 - t3:.3f}s')
 
@@ -242,11 +453,11 @@ class StarRailYOLO:
         """
         对检测图片进行处理 处理结果再用于输入模型
         参考 https://github.com/orgs/ultralytics/discussions/6994?sort=new#discussioncomment-8382661
+        缩放结果直接写入预先分配的内存 归一化时同时完成 BGR->RGB 和 HWC->CHW 每帧不再分配新的数组
         :param context: 上下文
-        :return: 输入模型的图片 RGB通道
+        :return: 输入模型的图片 RGB通道 是复用的内存 下一帧会被覆盖
         """
         image = context.img
-        rgb_img = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
 
         # 将图像缩放到模型的输入尺寸中较短的一边
         min_scale = min(self.onnx_input_height / context.img_height, self.onnx_input_width / context.img_width)
@@ -254,22 +465,30 @@ class StarRailYOLO:
         # 未进行padding之前的尺寸
         context.scale_height = int(round(context.img_height * min_scale))
         context.scale_width = int(round(context.img_width * min_scale))
+        scale_height, scale_width = context.scale_height, context.scale_width
+
+        if self._input_buffer is None:
+            self._input_buffer = np.empty((1, 3, self.onnx_input_height, self.onnx_input_width), dtype=np.float32)
+            self._letterbox_buffer = np.empty((self.onnx_input_height, self.onnx_input_width, 3), dtype=np.uint8)
+            self._letterbox_size = (0, 0)
+
+        if self._letterbox_size != (scale_width, scale_height):  # 填充的部分只在缩放大小变化时处理
+            self._input_buffer.fill(np.float32(114 / 255.0))
+            self._letterbox_size = (scale_width, scale_height)
 
         # 缩放到目标尺寸
-        if self.onnx_input_height != context.img_height or self.onnx_input_width != context.img_width:  # 需要缩放
-            input_img = np.full(shape=(self.onnx_input_height, self.onnx_input_width, 3),
-                                fill_value=114, dtype=np.uint8)
-            scale_img = cv2.resize(rgb_img, (context.scale_width, context.scale_height), interpolation=cv2.INTER_LINEAR)
-            input_img[0:context.scale_height, 0:context.scale_width, :] = scale_img
+        if scale_height != context.img_height or scale_width != context.img_width:  # 需要缩放
+            scale_img = self._letterbox_buffer[:scale_height, :scale_width]
+            cv2.resize(image, (scale_width, scale_height), dst=scale_img, interpolation=cv2.INTER_LINEAR)
         else:
-            input_img = rgb_img
+            scale_img = image
 
-        # 缩放后最后的处理
-        input_img = input_img / 255.0
-        input_img = input_img.transpose(2, 0, 1)
-        input_tensor = input_img[np.newaxis, :, :, :].astype(np.float32)
+        # 缩放后最后的处理 与 img / 255.0 再转 float32 的结果一致
+        for channel in range(3):
+            np.divide(scale_img[:, :, 2 - channel], 255.0,
+                      out=self._input_buffer[0, channel, :scale_height, :scale_width], casting='unsafe')
 
-        return input_tensor
+        return self._input_buffer
 
     def inference(self, input_tensor: np.ndarray):
         """
@@ -277,9 +496,36 @@ class StarRailYOLO:
         :param input_tensor: 输入模型的图片 RGB通道
         :return: onnx模型推理得到的结果
         """
+        if self.use_io_binding and input_tensor is self._input_buffer:
+            return self.inference_with_io_binding()
         outputs = self.session.run(self.output_names, {self.input_names[0]: input_tensor})
         return outputs
 
+    def inference_with_io_binding(self) -> List[np.ndarray]:
+        """
+        使用IOBinding推理 输入和输出都绑定到复用的内存上
+        :return: onnx模型推理得到的结果 输出大小固定时是复用的内存 下一帧会被覆盖
+        """
+        if self._io_binding is None:
+            self._io_binding = self.session.io_binding()
+            self._io_binding.bind_cpu_input(self.input_names[0], self._input_buffer)
+
+            output_shape_list = [i.shape for i in self.session.get_outputs()]
+            if all(isinstance(d, int) for shape in output_shape_list for d in shape):
+                self._output_buffers = [np.empty(shape, dtype=np.float32) for shape in output_shape_list]
+                for name, buffer in zip(self.output_names, self._output_buffers):
+                    self._io_binding.bind_output(name, 'cpu', 0, np.float32, list(buffer.shape), buffer.ctypes.data)
+            else:
+                self._output_buffers = None
+                for name in self.output_names:
+                    self._io_binding.bind_output(name, 'cpu')
+
+        self.session.run_with_iobinding(self._io_binding)
+
+        if self._output_buffers is not None:
+            return self._output_buffers
+        return self._io_binding.copy_outputs_to_cpu()
+
     def process_output(self, output, context: DetectContext) -> List[DetectObjectResult]:
         """
         :param output: 推理结果
@@ -361,9 +607,15 @@ class StarRailYOLO:
                 detect_time=context.detect_time
             )
         self.last_detect_result = new_frame
-        self.detect_result_history.append(new_frame)
-        self.detect_result_history = [i for i in self.detect_result_history
-                                      if context.detect_time - i.detect_time > self.keep_result_seconds]
+        self.tracker.update(new_frame)
+
+    @property
+    def detect_result_history(self) -> List[DetectFrameResult]:
+        """
+        保留时间内的历史识别结果
+        :return:
+        """
+        return self.tracker.get_recent_frames(len(self.tracker.frame_list))
 
 
 _GH_PROXY_URL = 'https://mirror.ghproxy.com'
@@ -518,6 +770,19 @@ def compute_iou(box, boxes):
     return iou
 
 
+def get_result_iou(r1: DetectObjectResult, r2: DetectObjectResult) -> float:
+    """
+    两个识别结果的IOU
+    :param r1: 识别结果1
+    :param r2: 识别结果2
+    :return:
+    """
+    intersection_area = (max(0, min(r1.x2, r2.x2) - max(r1.x1, r2.x1))
+                         * max(0, min(r1.y2, r2.y2) - max(r1.y1, r2.y1)))
+    union_area = (r1.x2 - r1.x1) * (r1.y2 - r1.y1) + (r2.x2 - r2.x1) * (r2.y2 - r2.y1) - intersection_area
+    return intersection_area / union_area if union_area > 0 else 0
+
+
 def xywh2xyxy(x):
     # Convert bounding box (x, y, w, h) to bounding box (x1, y1, x2, y2)
     y = np.copy(x)
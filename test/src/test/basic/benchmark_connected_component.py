@@ -0,0 +1,96 @@
+import os
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from basic import os_utils
+from basic.img import cv2_utils
+from basic.log_utils import log
+
+
+def connection_erase_by_loop(mask, threshold: int = 50, erase_white: bool = True, connectivity: int = 8):
+    """
+    原来逐个连通块比较整张图的实现 用于对比
+    """
+    to_check_connection = mask if erase_white else cv2.bitwise_not(mask)
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(to_check_connection, connectivity=connectivity)
+    result = mask.copy()
+    for label in range(1, num_labels):
+        if stats[label, cv2.CC_STAT_AREA] < threshold:
+            result[labels == label] = 0 if erase_white else 255
+    return result
+
+
+def large_component_by_loop(mask, min_area: int, connectivity: int = 4):
+    """
+    原来逐个连通块比较整张图的实现 用于对比
+    """
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=connectivity)
+    result = np.zeros(mask.shape[:2], dtype=np.uint8)
+    for label in range(1, num_labels):
+        if stats[label, cv2.CC_STAT_AREA] >= min_area:
+            result[labels == label] = 255
+    return result
+
+
+class BenchmarkConnectedComponent(unittest.TestCase):
+
+    def setUp(self):
+        # 大地图的道路掩码 和 加了噪点的掩码
+        self.mask_list = []
+        map_dir = os_utils.get_path_under_work_dir('images', 'map')
+        for planet in sorted(os.listdir(map_dir))[:2]:
+            planet_dir = os.path.join(map_dir, planet)
+            for region in sorted(os.listdir(planet_dir))[:3]:
+                origin = cv2_utils.read_image(os.path.join(planet_dir, region, 'origin.png'))
+                if origin is None:
+                    continue
+                self.mask_list.append(cv2_utils.color_in_range(origin, [45, 45, 45], [65, 65, 65]))
+
+        rng = np.random.default_rng(0)
+        for _ in range(3):
+            noise = (rng.random((600, 800)) > 0.7).astype(np.uint8) * 255
+            self.mask_list.append(noise)
+
+    def test_benchmark(self):
+        for erase_white in [True, False]:
+            loop_time, vec_time = 0, 0
+            for mask in self.mask_list:
+                t1 = time.time()
+                loop_result = connection_erase_by_loop(mask, erase_white=erase_white)
+                t2 = time.time()
+                vec_result = cv2_utils.connection_erase(mask, erase_white=erase_white)
+                t3 = time.time()
+                loop_time += t2 - t1
+                vec_time += t3 - t2
+                self.assertTrue(np.array_equal(loop_result, vec_result))
+            log.info('connection_erase erase_white=%s 逐个 %.4fs 向量化 %.4fs', erase_white, loop_time, vec_time)
+
+        loop_time, vec_time = 0, 0
+        for mask in self.mask_list:
+            t1 = time.time()
+            loop_result = large_component_by_loop(mask, 501)
+            t2 = time.time()
+            vec_result = cv2_utils.get_connected_component_mask(mask, connectivity=4, min_area=501)
+            t3 = time.time()
+            loop_time += t2 - t1
+            vec_time += t3 - t2
+            self.assertTrue(np.array_equal(loop_result, vec_result))
+        log.info('保留大连通块 逐个 %.4fs 向量化 %.4fs', loop_time, vec_time)
+
+    def test_bounding_box(self):
+        mask = np.zeros((100, 100), dtype=np.uint8)
+        mask[10:20, 10:60] = 255  # 宽50 高10
+        mask[40:80, 40:45] = 255  # 宽5 高40
+        mask[90:92, 90:92] = 255  # 面积4
+
+        result = cv2_utils.get_connected_component_mask(mask, min_width=20)
+        self.assertEqual(500, np.count_nonzero(result))
+
+        result = cv2_utils.get_connected_component_mask(mask, min_height=20, max_height=50)
+        self.assertEqual(200, np.count_nonzero(result))
+
+        result = cv2_utils.get_connected_component_mask(mask, max_area=10)
+        self.assertEqual(4, np.count_nonzero(result))
@@ -0,0 +1,82 @@
+import os
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from basic import os_utils
+from basic.img import cv2_utils, MatchResult, MatchResultList
+from basic.log_utils import log
+from sr.image.image_holder import ImageHolder
+
+
+def get_match_result_list_by_loop(result: np.ndarray, threshold: float, tw: int, th: int,
+                                  only_best: bool = True, ignore_inf: bool = False) -> MatchResultList:
+    """
+    原来 match_template 中逐个像素合并的实现 用于对比
+    """
+    match_result_list = MatchResultList(only_best=only_best)
+    filtered_locations = np.where(np.logical_and(
+        result >= threshold,
+        np.isfinite(result) if ignore_inf else np.ones_like(result))
+    )
+
+    for pt in zip(*filtered_locations[::-1]):
+        confidence = result[pt[1], pt[0]]
+        match_result_list.append(MatchResult(confidence, pt[0], pt[1], tw, th))
+
+    return match_result_list
+
+
+class BenchmarkMatchTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.ih = ImageHolder()
+        # 测试目录下的游戏截图
+        self.screen_list = []
+        test_dir = os_utils.get_path_under_work_dir('test', 'src', 'test', 'sr')
+        for sub_dir in [('sim_uni', 'op', 'sim_uni_choose_bless'),
+                        ('sim_uni', 'op', 'sim_uni_event'),
+                        ('image', 'screenshot', 'test_screen_state')]:
+            dir_path = os.path.join(test_dir, *sub_dir)
+            for file_name in sorted(os.listdir(dir_path)):
+                if file_name.endswith('.png'):
+                    self.screen_list.append(cv2_utils.read_image(os.path.join(dir_path, file_name)))
+
+    def test_benchmark(self):
+        """
+        对比从匹配结果矩阵中 逐个像素合并和向量化提取的耗时 阈值较低时候选像素很多
+        :return:
+        """
+        case_list = [
+            ('ui_alert', None, [0.7, 0.3]),
+            ('store_money', 'sim_uni', [0.65, 0.4]),
+        ]
+        for template_id, sub_dir, threshold_list in case_list:
+            template = self.ih.get_template(template_id, sub_dir)
+            th, tw = template.origin.shape[:2]
+            result_list = [cv2.matchTemplate(screen, template.origin, cv2.TM_CCOEFF_NORMED, mask=template.mask)
+                           for screen in self.screen_list]
+            for threshold in threshold_list:
+                for only_best in [True, False]:
+                    loop_time, vec_time = 0, 0
+                    for result in result_list:
+                        t1 = time.time()
+                        loop_mrl = get_match_result_list_by_loop(result, threshold, tw, th, only_best=only_best)
+                        t2 = time.time()
+                        vec_mrl = cv2_utils.get_match_result_list(result, threshold, tw, th, only_best=only_best)
+                        t3 = time.time()
+                        loop_time += t2 - t1
+                        vec_time += t3 - t2
+
+                        self.assertEqual(len(loop_mrl) == 0, len(vec_mrl) == 0)
+                        if only_best:
+                            self.assertEqual(str(loop_mrl), str(vec_mrl))
+                        elif len(loop_mrl) > 0:
+                            # 逐个合并时 合并后的置信度不会更新到 max 这里比较结果中真正的最大值
+                            loop_max = max(i.confidence for i in loop_mrl)
+                            self.assertAlmostEqual(loop_max, vec_mrl.max.confidence, places=5)
+
+                    log.info('%s 阈值 %.2f only_best %s 逐个合并 %.4fs 向量化 %.4fs',
+                             template_id, threshold, only_best, loop_time, vec_time)
@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from basic.cache_utils import LruCache, get_nbytes, OBJECT_ITEM_BYTES
+
+
+class TestLruCache(unittest.TestCase):
+
+    def test_max_bytes(self):
+        cache = LruCache(max_bytes=300, size_func=lambda v: v)
+        cache.put('a', 100)
+        cache.put('b', 100)
+        cache.put('c', 100)
+        self.assertEqual(300, cache.total_bytes)
+
+        cache.get('a')  # 使用后 a 变成最近使用
+        cache.put('d', 100)
+        # 淘汰的是最久未使用的 b
+        self.assertEqual(['c', 'a', 'd'], list(cache._data.keys()))
+        self.assertEqual(300, cache.total_bytes)
+        self.assertEqual(1, cache.evict_cnt)
+
+        # 替换同一个key时 重新计算大小
+        cache.put('a', 50)
+        self.assertEqual(250, cache.total_bytes)
+
+        # 刚放入的值超过上限时 淘汰其它的 但保留它自己
+        cache.put('e', 1000)
+        self.assertEqual(['e'], list(cache._data.keys()))
+        self.assertEqual(1000, cache.total_bytes)
+
+    def test_eviction_order(self):
+        cache = LruCache(max_bytes=300, size_func=lambda v: v)
+        for key in ['a', 'b', 'c']:
+            cache.put(key, 100)
+        cache.get('b')
+        cache.get('a')
+        cache.set_max_bytes(100)  # 调小上限时立刻淘汰
+        self.assertEqual(['a'], list(cache._data.keys()))
+        cache.set_max_bytes(None)
+        cache.put('b', 1000)
+        self.assertEqual(1100, cache.total_bytes)
+
+    def test_max_cnt(self):
+        cache = LruCache(max_cnt=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
+    def test_pin(self):
+        cache = LruCache(max_bytes=200, size_func=lambda v: v)
+        cache.put('a', 100)
+        cache.put('b', 100)
+        cache.pin({'a'})
+        cache.put('c', 100)
+        # 固定的 a 是最久未使用的 也不会被淘汰
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual({'a'}, cache.pinned)
+
+        cache.put('d', 100)
+        self.assertEqual(['a', 'd'], list(cache._data.keys()))
+        # 固定的都超过上限时 也不淘汰
+        cache.pin({'a', 'd'})
+        cache.put('e', 100)
+        self.assertEqual(['a', 'd', 'e'], list(cache._data.keys()))
+        # 替换固定的key后 超过上限的部分马上被淘汰
+        cache.pin(set())
+        self.assertEqual(['d', 'e'], list(cache._data.keys()))
+
+    def test_ttl(self):
+        cache = LruCache(ttl=0.1)
+        cache.put('a', 1)
+        self.assertEqual(1, cache.get('a'))
+        time.sleep(0.2)
+        self.assertEqual(-1, cache.get('a', -1))
+        self.assertNotIn('a', cache)
+        self.assertEqual(1, cache.expire_cnt)
+        self.assertEqual(1, cache.hit_cnt)
+        self.assertEqual(1, cache.miss_cnt)
+        self.assertEqual(0.5, cache.hit_rate)
+
+    def test_pop_and_clear(self):
+        cache = LruCache(size_func=lambda v: v)
+        cache.put('a', 100)
+        cache.put('b', 100)
+        self.assertEqual(100, cache.pop('a'))
+        self.assertIsNone(cache.pop('a'))
+        self.assertEqual(100, cache.total_bytes)
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.total_bytes)
+
+
+class Holder:
+
+    def __init__(self, arr: np.ndarray):
+        self.arr = arr
+        self.name = 'holder'
+
+
+class TestGetNbytes(unittest.TestCase):
+
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path, ignore_errors=True)
+
+    def test_get_nbytes(self):
+        arr = np.zeros((10, 10), dtype=np.uint8)
+        self.assertEqual(0, get_nbytes(None))
+        self.assertEqual(100, get_nbytes(arr))
+        self.assertEqual(3 * OBJECT_ITEM_BYTES, get_nbytes(np.empty(3, dtype=object)))
+        self.assertEqual(2 * OBJECT_ITEM_BYTES, get_nbytes([1, 2]))
+        self.assertEqual(200, get_nbytes({'a': arr, 'b': arr}))
+        self.assertEqual(100, get_nbytes(Holder(arr)))
+
+    def test_mapped(self):
+        file_path = os.path.join(self.dir_path, 'a.npy')
+        np.save(file_path, np.zeros((100, 100), dtype=np.uint8))
+        arr = np.load(file_path, mmap_mode='r')
+        # 映射到文件的数组 以及它的切片和视图 都不计入占用
+        self.assertEqual(0, get_nbytes(arr))
+        self.assertEqual(0, get_nbytes(arr[10:20]))
+        self.assertEqual(0, get_nbytes(np.asarray(arr)))
+        self.assertEqual(0, get_nbytes(Holder(arr)))
+        # 复制出来的数组在内存中
+        self.assertEqual(10000, get_nbytes(np.array(arr)))
+        del arr
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import shutil
+import threading
+import time
+import unittest
+
+from basic import config, os_utils
+from basic.config import ConfigHolder
+
+
+class TestConfigHolder(unittest.TestCase):
+
+    def setUp(self):
+        self.sub_dir = ['test_config_holder']
+        self.dir_path = os_utils.get_path_under_work_dir('config', *self.sub_dir)
+        config.set_save_delay(0.2)
+
+    def tearDown(self):
+        config.set_save_delay(1)
+        shutil.rmtree(self.dir_path, ignore_errors=True)
+
+    def new_holder(self) -> ConfigHolder:
+        return ConfigHolder('test', sample=False, sub_dir=self.sub_dir)
+
+    def test_delay_save(self):
+        holder = self.new_holder()
+        for i in range(100):
+            holder.update('key', i)
+        # 延迟时间内不会写文件
+        self.assertFalse(os.path.exists(holder.config_file_path))
+
+        time.sleep(0.5)
+        self.assertEqual(99, self.new_holder().get('key'))
+        # 通过临时文件替换写入 不会留下临时文件
+        self.assertEqual(['test.yml'], os.listdir(self.dir_path))
+
+    def test_batch(self):
+        holder = self.new_holder()
+        with holder.batch():
+            holder.update('a', 1)
+            with holder.batch():
+                holder.update('b', 2)
+            self.assertFalse(config._writer.is_pending(holder))
+        self.assertTrue(config._writer.is_pending(holder))
+
+        config.flush_all()
+        self.assertFalse(config._writer.is_pending(holder))
+        another = self.new_holder()
+        self.assertEqual(1, another.get('a'))
+        self.assertEqual(2, another.get('b'))
+
+    def test_delete(self):
+        holder = self.new_holder()
+        holder.update('key', 1)
+        holder.delete()
+        time.sleep(0.5)
+        # 删除后不会再写入等待中的保存
+        self.assertFalse(os.path.exists(holder.config_file_path))
+
+    def slow_write(self, holder: ConfigHolder, started: threading.Event, finished: list) -> None:
+        """
+        让后台写入变慢 方便在写入途中调用
+        """
+        write_file = holder.write_file
+
+        def _slow_write(data=None):
+            started.set()
+            time.sleep(0.3)
+            write_file(data)
+            finished.append(True)
+
+        holder.write_file = _slow_write
+
+    def test_flush_wait_writing(self):
+        config.set_save_delay(0.05)
+        holder = self.new_holder()
+        started = threading.Event()
+        finished = []
+        self.slow_write(holder, started, finished)
+
+        holder.update('key', 1)
+        self.assertTrue(started.wait(1))
+        # 后台已经开始写入 返回时要写完
+        config.flush_all()
+        self.assertEqual([True], finished)
+        self.assertEqual(1, self.new_holder().get('key'))
+
+    def test_refresh_during_writing(self):
+        config.set_save_delay(0.05)
+        holder = self.new_holder()
+        started = threading.Event()
+        finished = []
+        self.slow_write(holder, started, finished)
+
+        holder.update('key', 1)
+        self.assertTrue(started.wait(1))
+        # 重新读取前等待写入完成 不会读到旧的文件
+        holder.refresh()
+        self.assertEqual(1, holder.get('key'))
+
+        holder.delete()
+        self.assertFalse(os.path.exists(holder.config_file_path))
+
+    def test_modify_nested_during_writing(self):
+        config.set_save_delay(0.05)
+        holder = self.new_holder()
+        started = threading.Event()
+        finished = []
+        self.slow_write(holder, started, finished)
+
+        holder.update('record', {'a': [1]})
+        self.assertTrue(started.wait(1))
+        # 后台写入途中 像运行记录一样直接修改嵌套的字典和列表
+        record = holder.get('record')
+        for i in range(10000):
+            record[str(i)] = [i]
+            record['a'].append(i)
+        config.flush_all()
+        # 写入的是保存时的内容
+        self.assertEqual({'a': [1]}, self.new_holder().get('record'))
+
+        holder.save()
+        config.flush_all()
+        self.assertEqual(record, self.new_holder().get('record'))
+
+
+if __name__ == '__main__':
+    unittest.main()
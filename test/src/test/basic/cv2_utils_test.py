@@ -1,8 +1,11 @@
+import glob
+import os
+
 import cv2
 import numpy as np
 
 import basic.cal_utils
-from basic import Rect
+from basic import Rect, os_utils
 from basic.img import cv2_utils
 from basic.img.os import get_debug_image
 from sr.const.character_const import CHARACTER_LIST
@@ -82,5 +85,45 @@ def _test_feature_match_for_one():
             cv2_utils.show_image(screen, r, wait=0)
 
 
+def test_feature_match_for_group():
+    """
+    一组模板一起匹配 结果与逐个模板匹配一致
+    """
+    ih = ImageHolder()
+    template_id_list = []
+    for prefix in ['mm_tp', 'mm_sp', 'mm_boss', 'mm_sub']:
+        for i in range(1, 100):
+            template_id = '%s_%02d' % (prefix, i)
+            if ih.get_template(template_id) is None:
+                break
+            template_id_list.append(template_id)
+    assert len(template_id_list) > 0
+    group = ih.get_feature_template_group(template_id_list)
+
+    # 模拟宇宙路线中保存的小地图
+    map_dir = os_utils.get_path_under_work_dir('config', 'sim_uni', 'map')
+    mm_path_list = sorted(glob.glob(os.path.join(map_dir, '*', '*', 'mm.png')))
+    assert len(mm_path_list) > 0
+    for mm_path in mm_path_list[:30]:
+        source = cv2_utils.read_image(mm_path)
+        radius = source.shape[0] // 2
+        source_mask = np.zeros(source.shape[:2], dtype=np.uint8)
+        cv2.circle(source_mask, (radius, radius), radius - 5, 255, -1)
+        source_kps, source_desc = cv2_utils.feature_detect_and_compute(source, mask=source_mask)
+        if len(source_kps) < 2:
+            continue
+
+        group_result = cv2_utils.feature_match_for_group(source_kps, source_desc, group, source_mask=source_mask)
+        for template_id in template_id_list:
+            t = ih.get_template(template_id)
+            expected = cv2_utils.feature_match(source_kps, source_desc, t.kps, t.desc, source_mask=source_mask)
+            actual = group_result[template_id]
+            assert expected[1:] == actual[1:], '%s %s' % (mm_path, template_id)
+            if expected[0] is None:
+                assert actual[0] is None
+            else:
+                assert [(m.queryIdx, m.trainIdx) for m in expected[0]] == [(m.queryIdx, m.trainIdx) for m in actual[0]]
+
+
 if __name__ == '__main__':
     _test_feature_match_for_one()
\ No newline at end of file
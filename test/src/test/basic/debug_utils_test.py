@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from basic import debug_utils
+from basic.debug_utils import DebugImageWriter
+from basic.img import os as img_os
+
+
+class TestDebugImageWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        self.image = np.random.randint(0, 256, (100, 100, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path, ignore_errors=True)
+
+    def test_save(self):
+        writer = DebugImageWriter(rotate_dir_list=[self.dir_path])
+        png_path = writer.save_image(os.path.join(self.dir_path, 'a'), self.image)
+        npy_path = writer.save_image(os.path.join(self.dir_path, 'b'), self.image,
+                                     image_format=DebugImageWriter.FORMAT_NPY)
+        writer.save_text(os.path.join(self.dir_path, 'c.yml'), 'test')
+        self.image[:] = 0  # 提交后修改原图不影响保存结果
+        writer.flush()
+
+        self.assertFalse(np.array_equal(self.image, cv2.imread(png_path)))
+        self.assertTrue(np.array_equal(cv2.imread(png_path), np.load(npy_path)))
+        with open(os.path.join(self.dir_path, 'c.yml'), 'r', encoding='utf-8') as file:
+            self.assertEqual('test', file.read())
+
+    def test_rate_limit(self):
+        writer = DebugImageWriter(max_per_minute=3, rotate_dir_list=[self.dir_path])
+        result = [writer.save_image(os.path.join(self.dir_path, str(i)), self.image, key='test') for i in range(5)]
+        writer.flush()
+        self.assertEqual(3, len([i for i in result if i is not None]))
+        self.assertEqual(2, writer.dropped_cnt)
+        # 不同的调用位置分开计算
+        self.assertIsNotNone(writer.save_image(os.path.join(self.dir_path, 'other'), self.image, key='other'))
+
+    def test_rotate(self):
+        writer = DebugImageWriter(image_format=DebugImageWriter.FORMAT_NPY, max_total_mb=1,
+                                  rotate_dir_list=[self.dir_path])
+        for i in range(40):  # 每个文件约30KB
+            os.makedirs(os.path.join(self.dir_path, str(i)))
+            writer.save_image(os.path.join(self.dir_path, str(i), 'img'), self.image)
+            writer.flush()
+            time.sleep(0.01)
+
+        total = 0
+        for root, dirs, files in os.walk(self.dir_path):
+            for file in files:
+                total += os.path.getsize(os.path.join(root, file))
+        self.assertLessEqual(total, 1024 * 1024)
+        # 删除的是最旧的文件和空文件夹
+        self.assertFalse(os.path.exists(os.path.join(self.dir_path, '0')))
+        self.assertTrue(os.path.exists(os.path.join(self.dir_path, '39', 'img.npy')))
+
+    def test_save_debug_image(self):
+        writer = DebugImageWriter(max_per_minute=2, rotate_dir_list=[self.dir_path])
+        old_writer = debug_utils._debug_image_writer
+        debug_utils._debug_image_writer = writer
+
+        try:
+            # 同一毫秒内保存多张 文件名也不重复
+            file_list = [img_os.save_debug_image(self.image, prefix=prefix) for prefix in ['a', 'a', 'b']]
+            self.assertNotIn(None, file_list)
+            self.assertEqual(len(file_list), len(set(file_list)))
+            # 被限制时返回空 不会返回一个不存在的文件
+            self.assertIsNone(img_os.save_debug_image(self.image, prefix='a'))
+            file_list.append(img_os.save_debug_image(self.image, prefix='b'))
+            self.assertIsNotNone(file_list[-1])
+            with self.assertRaises(ValueError):
+                img_os.save_debug_image(self.image)
+            writer.flush()
+            for file_name in file_list:
+                path = img_os.get_debug_image_path(file_name)
+                self.assertTrue(os.path.exists(path))
+                os.remove(path)
+        finally:
+            debug_utils._debug_image_writer = old_writer
+
+    def test_same_path_queued(self):
+        writer = DebugImageWriter(rotate_dir_list=[self.dir_path])
+        event = threading.Event()
+        write = writer._write
+
+        def slow_write(file_path, content):
+            event.wait()
+            write(file_path, content)
+
+        writer._write = slow_write
+        path = os.path.join(self.dir_path, 'a')
+        first = writer.save_image(path, self.image)
+        self.assertIsNotNone(first)
+        # 同一路径还在等待保存时 不再提交 避免覆盖
+        self.assertIsNone(writer.save_image(path, np.zeros_like(self.image)))
+        self.assertEqual(1, writer.dropped_cnt)
+        event.set()
+        writer.flush()
+        self.assertTrue(np.array_equal(self.image, cv2.imread(first)))
+        # 保存完之后可以再次提交
+        self.assertIsNotNone(writer.save_image(path, self.image))
+        writer.flush()
+
+
+if __name__ == '__main__':
+    unittest.main()
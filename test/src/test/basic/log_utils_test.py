@@ -0,0 +1,83 @@
+import logging
+import queue
+import unittest
+
+from basic import log_utils
+from basic.log_utils import DropOldestQueueHandler, ModuleLevelFilter
+
+
+class TestLogUtils(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = queue.Queue(maxsize=3)
+        self.handler = DropOldestQueueHandler(self.queue)
+        self.logger = logging.getLogger('test_log_utils')
+        self.logger.handlers.clear()
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.handlers.clear()
+
+    def get_message_list(self):
+        message_list = []
+        while not self.queue.empty():
+            message_list.append(self.queue.get_nowait().getMessage())
+        return message_list
+
+    def test_drop_oldest(self):
+        for i in range(5):
+            self.logger.info('%d', i)
+        # 队列满时丢弃最旧的
+        self.assertEqual(['2', '3', '4'], self.get_message_list())
+        self.assertEqual(2, self.handler.dropped_cnt)
+
+    def test_format(self):
+        arr = [1, 2]
+        self.logger.info('%s %d', arr, 1)
+        arr.append(3)  # 可变的参数在入队时已经格式化
+        try:
+            raise ValueError('test')
+        except ValueError:
+            self.logger.error('error', exc_info=True)
+
+        record = self.queue.get_nowait()
+        self.assertIsNone(record.args)
+        self.assertEqual('[1, 2] 1', record.getMessage())
+        record = self.queue.get_nowait()
+        self.assertIsNone(record.exc_info)
+        self.assertIn('ValueError: test', record.exc_text)
+
+    def test_module_level(self):
+        module_filter = ModuleLevelFilter()
+        self.handler.addFilter(module_filter)
+        module_filter.module_level['log_utils_test'] = logging.WARNING
+        self.logger.info('info')
+        self.logger.warning('warning')
+        self.assertEqual(['warning'], self.get_message_list())
+
+        module_filter.module_level.pop('log_utils_test')
+        self.logger.info('info')
+        self.assertEqual(['info'], self.get_message_list())
+
+    def test_reset_module_level(self):
+        default_level = log_utils.log.level
+        try:
+            log_utils.reset_module_level({'cal_pos': 'debug', 'context': 'WARNING', 'wrong': 'NOT_A_LEVEL'})
+            # 错误的等级名称被忽略
+            self.assertEqual({'cal_pos': logging.DEBUG, 'context': logging.WARNING},
+                             log_utils._module_filter.module_level)
+            self.assertEqual(logging.DEBUG, log_utils.log.level)
+
+            # 不在配置中的模块恢复默认
+            log_utils.reset_module_level({'context': 'WARNING'})
+            self.assertEqual({'context': logging.WARNING}, log_utils._module_filter.module_level)
+            self.assertEqual(min(default_level, logging.WARNING), log_utils.log.level)
+        finally:
+            log_utils.reset_module_level({})
+        self.assertEqual(default_level, log_utils.log.level)
+
+
+if __name__ == '__main__':
+    unittest.main()
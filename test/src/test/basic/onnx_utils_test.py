@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import onnxruntime as ort
+
+from basic import onnx_utils, os_utils
+from basic.onnx_utils import OnnxSessionConfig
+
+
+class TestOnnxUtils(unittest.TestCase):
+
+    def setUp(self):
+        self.model_path = os.path.join(os_utils.get_path_under_work_dir('model', 'onnx_ocr'), 'cls.onnx')
+        if not os.path.exists(self.model_path):
+            self.skipTest('未下载OCR模型')
+        onnx_utils.clear_sessions()
+
+    def tearDown(self):
+        onnx_utils.clear_sessions()
+
+    def test_get_session(self):
+        config = OnnxSessionConfig(intra_op_num_threads=1)
+        session = onnx_utils.get_session(self.model_path, config=config)
+        # 相同配置共用一个会话
+        self.assertIs(session, onnx_utils.get_session(self.model_path, config=OnnxSessionConfig(intra_op_num_threads=1)))
+        # 不同配置创建新的会话
+        self.assertIsNot(session, onnx_utils.get_session(self.model_path, config=OnnxSessionConfig(intra_op_num_threads=2)))
+
+        options = session.get_session_options()
+        self.assertEqual(1, options.intra_op_num_threads)
+        self.assertEqual(ort.ExecutionMode.ORT_SEQUENTIAL, options.execution_mode)
+        self.assertEqual(ort.GraphOptimizationLevel.ORT_ENABLE_ALL, options.graph_optimization_level)
+
+    def test_default_thread_num(self):
+        # 没有指定线程数时 小模型只用1个线程 大模型平分CPU核数的一半
+        light_session = onnx_utils.get_session(self.model_path, light=True)
+        session = onnx_utils.get_session(self.model_path)
+        self.assertIsNot(light_session, session)
+        self.assertEqual(1, light_session.get_session_options().intra_op_num_threads)
+        self.assertEqual(onnx_utils.get_default_thread_num(), session.get_session_options().intra_op_num_threads)
+
+        # 指定了线程数时 小模型也按配置
+        config = OnnxSessionConfig(intra_op_num_threads=2)
+        light_session = onnx_utils.get_session(self.model_path, config=config, light=True)
+        self.assertEqual(2, light_session.get_session_options().intra_op_num_threads)
+
+    def test_optimized_model_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # 保存优化后的模型时才创建文件夹
+            temp_dir = os.path.join(temp_dir, 'optimized')
+            config = OnnxSessionConfig(intra_op_num_threads=1, optimized_model_dir=temp_dir)
+            self.assertFalse(os.path.exists(temp_dir))
+            session = onnx_utils.create_session(self.model_path, config=config)
+            optimized_path = onnx_utils.get_optimized_model_path(self.model_path, config, ['CPUExecutionProvider'])
+            self.assertTrue(os.path.exists(optimized_path))
+
+            # 第二次加载优化后的模型 结果与原模型一致
+            cached_session = onnx_utils.create_session(self.model_path, config=config)
+            self.assertEqual(ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+                             cached_session.get_session_options().graph_optimization_level)
+
+            input_name = session.get_inputs()[0].name
+            x = np.random.rand(1, 3, 48, 192).astype(np.float32)
+            expected = session.run(None, {input_name: x})[0]
+            actual = cached_session.run(None, {input_name: x})[0]
+            self.assertTrue(np.allclose(expected, actual, atol=1e-5))
+            del session, cached_session
+
+
+if __name__ == '__main__':
+    unittest.main()
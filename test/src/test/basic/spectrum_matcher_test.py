@@ -0,0 +1,81 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from basic.img.spectrum_matcher import SpectrumMatcher
+
+
+class TestSpectrumMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def random_image(self, height: int, width: int, channels: int) -> np.ndarray:
+        """
+        随机图片 先模糊一下 让相邻像素有关联 更接近真实的小地图
+        """
+        shape = (height, width) if channels == 1 else (height, width, channels)
+        image = self.rng.integers(0, 256, shape, dtype=np.uint8)
+        return cv2.GaussianBlur(image, (5, 5), 0)
+
+    def circle_mask(self, height: int, width: int) -> np.ndarray:
+        mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.circle(mask, (width // 2, height // 2), min(height, width) // 2, 255, -1)
+        return mask
+
+    def assert_same_as_cv2(self, source: np.ndarray, template: np.ndarray, mask: np.ndarray, use_mask: bool):
+        matcher = SpectrumMatcher(source, template.shape[:2])
+        result = matcher.match(template, mask if use_mask else np.full(template.shape[:2], 255, dtype=np.uint8))
+        if use_mask:
+            # cv2 的多通道模板要求掩码通道数一致
+            cv_mask = mask if template.ndim == 2 else cv2.merge([mask] * template.shape[2])
+            expected = cv2.matchTemplate(source, template, cv2.TM_CCOEFF_NORMED, mask=cv_mask)
+        else:
+            expected = cv2.matchTemplate(source, template, cv2.TM_CCOEFF_NORMED)
+
+        self.assertEqual(expected.shape, result.shape)
+        self.assertTrue(np.all(np.isfinite(result)))
+        self.assertLess(float(np.max(np.abs(result - expected))), 1e-4)
+        self.assertEqual(np.unravel_index(np.argmax(expected), expected.shape),
+                         np.unravel_index(np.argmax(result), result.shape))
+
+    def test_match(self):
+        for channels in [1, 3]:
+            for source_size in [(120, 150), (257, 301)]:
+                source = self.random_image(source_size[0], source_size[1], channels)
+                # 从原图中截取模板 再按多个比例缩放 与 cal_pos 的多尺度匹配一致
+                template_base = source[30:80, 40:90]
+                for scale in [0.8, 1, 1.25]:
+                    template = cv2.resize(template_base, None, fx=scale, fy=scale)
+                    mask = self.circle_mask(template.shape[0], template.shape[1])
+                    for use_mask in [True, False]:
+                        with self.subTest(channels=channels, source_size=source_size, scale=scale, use_mask=use_mask):
+                            self.assert_same_as_cv2(source, template, mask, use_mask)
+
+    def test_same_template_shape(self):
+        # 同样大小的不同模板复用原图的频谱
+        source = self.random_image(150, 150, 3)
+        matcher = SpectrumMatcher(source, (40, 40))
+        mask = self.circle_mask(40, 40)
+        cv_mask = cv2.merge([mask] * 3)
+        for y, x in [(10, 20), (60, 90), (100, 5)]:
+            template = source[y:y + 40, x:x + 40]
+            result = matcher.match(template, mask)
+            expected = cv2.matchTemplate(source, template, cv2.TM_CCOEFF_NORMED, mask=cv_mask)
+            self.assertLess(float(np.max(np.abs(result - expected))), 1e-4)
+            self.assertEqual((y, x), np.unravel_index(np.argmax(result), result.shape))
+
+    def test_invalid(self):
+        source = self.random_image(30, 30, 1)
+        matcher = SpectrumMatcher(source, (40, 20))  # 模板比原图大
+        self.assertFalse(matcher.valid)
+        self.assertIsNone(matcher.match(np.zeros((40, 20), dtype=np.uint8), np.ones((40, 20), dtype=np.uint8)))
+
+        matcher = SpectrumMatcher(source, (10, 10))
+        self.assertTrue(matcher.valid)
+        self.assertIsNone(matcher.match(source[:10, :10], np.zeros((10, 10), dtype=np.uint8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,6 @@
+import random
+from typing import List, Optional
+
 from basic import str_utils
 
 
@@ -5,5 +8,80 @@ def _test_find_by_lcs():
     print(str_utils.find_by_lcs('Artisanship Commission', 'Artisanship Commi55Ion', 0.7))
 
 
+def lcs_length_by_dp(str1: str, str2: str) -> int:
+    """
+    动态规划求最长公共子序列长度 用于校验位运算的结果
+    """
+    dp = [[0] * (len(str2) + 1) for _ in range(len(str1) + 1)]
+    for i in range(1, len(str1) + 1):
+        for j in range(1, len(str2) + 1):
+            if str1[i - 1] == str2[j - 1]:
+                dp[i][j] = dp[i - 1][j - 1] + 1
+            else:
+                dp[i][j] = max(dp[i - 1][j], dp[i][j - 1])
+    return dp[len(str1)][len(str2)]
+
+
+def find_best_match_by_dp(word: str, target_word_list: List[str],
+                          lcs_percent_threshold: Optional[float] = None) -> Optional[int]:
+    """
+    逐个目标词计算LCS 用于校验使用字符索引的结果
+    """
+    target_idx: Optional[int] = None
+    target_lcs_percent: Optional[float] = None
+    for idx, target_word in enumerate(target_word_list):
+        lcs = lcs_length_by_dp(word, target_word)
+        if lcs == 0:
+            continue
+        lcs_percent = lcs * 1.0 / len(target_word)
+        if lcs_percent_threshold is not None and lcs_percent < lcs_percent_threshold:
+            continue
+        if target_idx is None or lcs_percent > target_lcs_percent:
+            target_idx = idx
+            target_lcs_percent = lcs_percent
+    return target_idx
+
+
+def random_word(rng: random.Random, alphabet: str, max_len: int) -> str:
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, max_len)))
+
+
+def test_longest_common_subsequence_length():
+    assert str_utils.longest_common_subsequence_length('', 'abc') == 0
+    assert str_utils.longest_common_subsequence_length('abcbdab', 'bdcaba') == 4
+    assert str_utils.longest_common_subsequence_length('模拟宇宙', '模拟宇宙积分') == 4
+
+
+def test_longest_common_subsequence_length_random():
+    rng = random.Random(0)
+    # 小字母表制造大量重复字符 长度超过64时也要正确
+    for alphabet, max_len, cnt in [('ab', 10, 8000), ('abcd', 30, 5000), ('模拟宇宙积分存护', 20, 5000), ('abcdefgh', 100, 2000)]:
+        for _ in range(cnt):
+            str1 = random_word(rng, alphabet, max_len)
+            str2 = random_word(rng, alphabet, max_len)
+            assert str_utils.longest_common_subsequence_length(str1, str2) == lcs_length_by_dp(str1, str2), (str1, str2)
+
+
+def test_find_best_match_by_lcs():
+    target_list = ['命途回响', '存护', '巡猎', '存护回响']
+    assert str_utils.find_best_match_by_lcs('存护', target_list) == 1
+    assert str_utils.find_best_match_by_lcs('存护回', target_list) == 1  # 按目标词的长度计算比例
+    assert str_utils.find_best_match_by_lcs('丰饶', target_list) is None
+    assert str_utils.find_best_match_by_lcs('回响', target_list, lcs_percent_threshold=0.6) is None
+
+
+def test_find_best_match_by_lcs_random():
+    rng = random.Random(0)
+    alphabet = '模拟宇宙积分存护巡猎回响命途'
+    for _ in range(2000):
+        target_list = [random_word(rng, alphabet, 8) for _ in range(rng.randint(0, 20))]
+        word = random_word(rng, alphabet, 10)
+        for threshold in [None, 0.5, 0.8]:
+            assert (str_utils.find_best_match_by_lcs(word, target_list, lcs_percent_threshold=threshold)
+                    == find_best_match_by_dp(word, target_list, lcs_percent_threshold=threshold)), (word, target_list)
+
+
 if __name__ == '__main__':
-    _test_find_by_lcs()
\ No newline at end of file
+    _test_find_by_lcs()
+    test_longest_common_subsequence_length()
+    test_find_best_match_by_lcs()
@@ -0,0 +1,25 @@
+import test
+from basic.img import cv2_utils
+from sr.app.sim_uni import sim_uni_route_holder
+from sr.sim_uni.sim_uni_const import SimUniLevelTypeEnum
+
+
+class TestSimUniRouteHolder(test.SrTestBase):
+
+    def __init__(self, *args, **kwargs):
+        test.SrTestBase.__init__(self, *args, **kwargs)
+
+    def test_get_candidate_list(self):
+        level_type = SimUniLevelTypeEnum.COMBAT.value
+        holder = sim_uni_route_holder.SimUniRouteHolder()
+        route_list = holder.get_route_list(level_type)
+        route_index = holder.get_route_index(level_type)
+
+        for route in route_list:
+            template = cv2_utils.crop_image_only(route.mm, sim_uni_route_holder.ROUTE_MM_TEMPLATE_RECT)
+            candidate_list = route_index.get_candidate_list(template)
+            self.assertEqual(sim_uni_route_holder.ROUTE_INDEX_TOP_K, len(candidate_list))
+            self.assertIn(route, candidate_list)
+
+            target_route, _ = sim_uni_route_holder.match_best_route_in_list(0, candidate_list, template)
+            self.assertEqual(route.uid, target_route.uid)
@@ -0,0 +1,64 @@
+import time
+
+from basic import cal_utils
+from basic.log_utils import log
+from sr import cal_pos
+from sr.context.context import get_context
+from sr.image.sceenshot import mini_map
+from test.sr.cal_pos.cal_pos_test_case import read_test_cases, TestCase
+from test.sr.cal_pos.test_cal_pos.test_cal_pos import TestCalPos
+
+
+class BenchmarkCalPos(TestCalPos):
+
+    def __init__(self, *args, **kwargs):
+        TestCalPos.__init__(self, *args, **kwargs)
+
+    def test_benchmark_full_map(self):
+        """
+        不圈定大地图区域 对比全图搜索时 直接匹配和图像金字塔匹配的耗时
+        :return:
+        """
+        self.cases = read_test_cases(self.cases_path)
+
+        method_list = [
+            ('road_mask', cal_pos.cal_character_pos_by_road_mask),
+            ('gray', cal_pos.cal_character_pos_by_gray),
+            ('original', cal_pos.cal_character_pos_by_original),
+        ]
+        for method_name, method in method_list:
+            direct_time, direct_success = self.run_full_map_cases(method, pyramid=False)
+            pyramid_time, pyramid_success = self.run_full_map_cases(method, pyramid=True)
+            log.info('%s 直接匹配 耗时 %.4f 成功 %d | 图像金字塔 耗时 %.4f 成功 %d | 样例 %d',
+                     method_name, direct_time, direct_success, pyramid_time, pyramid_success, len(self.cases))
+            self.assertGreaterEqual(pyramid_success, direct_success)
+
+    def run_full_map_cases(self, method, pyramid: bool):
+        """
+        对所有样例进行全图搜索
+        :param method: 计算坐标的方法
+        :param pyramid: 是否使用图像金字塔
+        :return: 总耗时 和 成功的样例数
+        """
+        ctx = get_context()
+        ctx.init_image_matcher()
+
+        total_time: float = 0
+        success_cnt: int = 0
+        for case in self.cases:
+            case: TestCase
+            mm = self.get_test_image_new(case.image_name)
+            lm_info = ctx.ih.get_large_map(case.region)
+            if lm_info.origin is None:  # 部分区域没有原图 只能使用道路掩码匹配
+                continue
+            mm_info = mini_map.analyse_mini_map(mm)
+            scale_list = cal_pos.get_mini_map_scale_list(case.running, case.real_move_time)
+
+            t1 = time.time()
+            pos = method(ctx.im, lm_info, mm_info, lm_rect=None, scale_list=scale_list, pyramid=pyramid)
+            total_time += time.time() - t1
+
+            if pos is not None and cal_utils.distance_between(pos.center, case.pos) < 5:
+                success_cnt += 1
+
+        return total_time, success_cnt
@@ -0,0 +1,148 @@
+import difflib
+import random
+import unittest
+from typing import Optional, List
+
+from basic import str_utils
+from basic.i18_utils import gt
+from sr.const import map_const
+from sr.const.map_const import Planet, Region, TransportPoint, PLANET_LIST, PLANET_2_REGION, REGION_2_SP
+
+
+def get_planet_by_cn_by_scan(cn: str) -> Optional[Planet]:
+    for i in PLANET_LIST:
+        if i.cn == cn:
+            return i
+    return None
+
+
+def get_region_by_cn_by_scan(cn: str, planet: Planet, floor: Optional[int] = 0) -> Optional[Region]:
+    for i in PLANET_2_REGION[planet.np_id]:
+        if i.cn != cn:
+            continue
+        if floor is not None and i.floor != floor:
+            continue
+        return i
+    return None
+
+
+def get_sub_region_by_cn_by_scan(cn: str, region: Region, floor: int = 0) -> Optional[Region]:
+    for regions in PLANET_2_REGION.values():
+        for r in regions:
+            if r.parent is not None and r.parent == region and r.cn == cn and r.floor == floor:
+                return r
+    return None
+
+
+def get_region_by_prl_id_by_scan(prl_id: str) -> Optional[Region]:
+    for region_list in PLANET_2_REGION.values():
+        for region in region_list:
+            if region.prl_id == prl_id:
+                return region
+    return None
+
+
+def get_sp_by_cn_by_scan(planet_cn: str, region_cn: str, floor: int, tp_cn: str) -> Optional[TransportPoint]:
+    p = get_planet_by_cn_by_scan(planet_cn)
+    r = get_region_by_cn_by_scan(region_cn, p, floor)
+    for i in REGION_2_SP.get(r.pr_id):
+        if i.cn == tp_cn:
+            return i
+    return None
+
+
+def best_match_planet_by_name_by_scan(ocr_word: str) -> Optional[Planet]:
+    idx = str_utils.find_best_match_by_lcs(ocr_word, target_word_list=[gt(p.cn, 'ocr') for p in PLANET_LIST])
+    return None if idx is None else PLANET_LIST[idx]
+
+
+def best_match_region_by_name_by_scan(ocr_word: Optional[str], planet: Optional[Planet] = None) -> Optional[Region]:
+    if ocr_word is None or len(ocr_word) == 0:
+        return None
+    region_list: List[Region] = []
+    for np_id, planet_region_list in PLANET_2_REGION.items():
+        if planet is not None and planet.np_id != np_id:
+            continue
+        region_list.extend(planet_region_list)
+    match = difflib.get_close_matches(ocr_word, [gt(r.cn, 'ocr') for r in region_list], n=1)
+    if len(match) == 0:
+        return None
+    for region in region_list:
+        if gt(region.cn, 'ocr') == match[0]:
+            return region
+    return None
+
+
+def get_noisy_word_list(word: str, rng: random.Random) -> List[str]:
+    """
+    模拟OCR的识别错误 少字、多字、错字
+    """
+    result = [word, word[1:], word[:-1], word + '一']
+    if len(word) > 1:
+        idx = rng.randrange(len(word))
+        result.append(word[:idx] + word[idx + 1:])
+        result.append(word[:idx] + '口' + word[idx + 1:])
+    return [i for i in result if len(i) > 0]
+
+
+class TestMapConst(unittest.TestCase):
+    """
+    索引查找的结果 需要与原来遍历查找的一致 重复的键返回列表中的第一个
+    """
+
+    def all_regions(self) -> List[Region]:
+        return [r for region_list in PLANET_2_REGION.values() for r in region_list]
+
+    def test_planet(self):
+        for planet in PLANET_LIST:
+            self.assertIs(get_planet_by_cn_by_scan(planet.cn), map_const.get_planet_by_cn(planet.cn))
+        self.assertIsNone(map_const.get_planet_by_cn('不存在'))
+
+    def test_region(self):
+        for region in self.all_regions():
+            for floor in [None, -1, 0, 1, 2, 3, region.floor]:
+                self.assertIs(get_region_by_cn_by_scan(region.cn, region.planet, floor),
+                              map_const.get_region_by_cn(region.cn, region.planet, floor))
+            self.assertIs(get_region_by_prl_id_by_scan(region.prl_id), map_const.get_region_by_prl_id(region.prl_id))
+            self.assertEqual([r for r in PLANET_2_REGION[region.planet.np_id] if r.cn == region.cn],
+                             map_const.get_all_floor_regions(region))
+        self.assertIsNone(map_const.get_region_by_cn('不存在', map_const.P01))
+        self.assertIsNone(map_const.get_region_by_prl_id('不存在'))
+
+    def test_sub_region(self):
+        sub_region_list = [r for r in self.all_regions() if r.parent is not None]
+        self.assertTrue(len(sub_region_list) > 0)
+        for sub_region in sub_region_list:
+            for parent in [sub_region.parent] + map_const.get_all_floor_regions(sub_region.parent):
+                for floor in [-1, 0, 1, 2, 3]:
+                    self.assertIs(get_sub_region_by_cn_by_scan(sub_region.cn, parent, floor),
+                                  map_const.get_sub_region_by_cn(sub_region.cn, parent, floor))
+
+    def test_transport_point(self):
+        for sp_list in REGION_2_SP.values():
+            for sp in sp_list:
+                region = sp.region
+                self.assertIs(get_sp_by_cn_by_scan(region.planet.cn, region.cn, region.floor, sp.cn),
+                              map_const.get_sp_by_cn(region.planet.cn, region.cn, region.floor, sp.cn))
+        # 重复出现的传送点
+        self.assertIs(map_const.P03_R04_SP10, map_const.get_sp_by_cn(map_const.P03.cn, map_const.P03_R04.cn,
+                                                                     map_const.P03_R04.floor,
+                                                                     map_const.P03_R04_SP10.cn))
+
+    def test_best_match(self):
+        rng = random.Random(0)
+        for planet in PLANET_LIST:
+            for word in get_noisy_word_list(gt(planet.cn, 'ocr'), rng):
+                self.assertIs(best_match_planet_by_name_by_scan(word), map_const.best_match_planet_by_name(word))
+
+        for region in self.all_regions():
+            for word in get_noisy_word_list(gt(region.cn, 'ocr'), rng):
+                for planet in [None, region.planet]:
+                    self.assertIs(best_match_region_by_name_by_scan(word, planet),
+                                  map_const.best_match_region_by_name(word, planet), word)
+        self.assertIsNone(map_const.best_match_region_by_name(''))
+        self.assertIsNone(map_const.best_match_region_by_name(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
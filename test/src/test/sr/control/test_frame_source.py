@@ -0,0 +1,38 @@
+import cv2
+import numpy as np
+
+import test
+from basic import Rect
+from sr.control.frame_source import MemoryFrameSource, get_grab_rect
+
+
+class TestFrameSource(test.SrTestBase):
+
+    def __init__(self, *args, **kwargs):
+        test.SrTestBase.__init__(self, *args, **kwargs)
+
+    def test_capture(self):
+        screen = np.random.randint(0, 256, (1200, 2000, 3), dtype=np.uint8)
+        source = MemoryFrameSource(screen)
+
+        img = source.capture(40, 60, 1920, 1080)
+        self.assertTrue(np.array_equal(screen[60:1140, 40:1960], img))
+        # 返回的是新的图片 修改后不影响下一次截图
+        img[:] = 0
+        self.assertTrue(np.array_equal(screen[60:1140, 40:1960], source.capture(40, 60, 1920, 1080)))
+        self.assertGreater(source.last_capture_seconds, 0)
+
+    def test_capture_scale(self):
+        screen = np.random.randint(0, 256, (1440, 2560, 3), dtype=np.uint8)
+        source = MemoryFrameSource(screen)
+
+        # 缩放的结果与截图后整张缩放一致
+        img = source.capture(0, 0, 2560, 1440)
+        self.assertTrue(np.array_equal(cv2.resize(screen, (1920, 1080)), img))
+
+        roi = Rect(480, 270, 960, 540)
+        self.assertEqual((640, 360, 640, 360), get_grab_rect(0, 0, 2560, 1440, roi))
+        roi_img = source.capture(0, 0, 2560, 1440, roi=roi)
+        self.assertEqual((270, 480, 3), roi_img.shape)
+        diff = np.abs(roi_img.astype(np.int16) - img[270:540, 480:960].astype(np.int16))
+        self.assertLess(np.mean(diff[2:-2, 2:-2]), 1)  # 边缘以外的插值结果一致
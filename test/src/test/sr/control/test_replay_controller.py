@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+import test
+from basic import Point, os_utils, debug_utils
+from sr.control.record_controller import RecordController
+from sr.control.replay_controller import ReplayController
+
+
+class TestReplayController(test.SrTestBase):
+
+    def __init__(self, *args, **kwargs):
+        test.SrTestBase.__init__(self, *args, **kwargs)
+
+    def test_record_and_replay(self):
+        # 使用测试截图作为游戏画面 录制后再回放
+        screen_dir = os_utils.get_path_under_work_dir('test', 'src', 'test', 'sr', 'image', 'screenshot', 'test_screen_state')
+        source = ReplayController(None, screen_dir)
+        frame_cnt = len(source.frame_list)
+        self.assertGreater(frame_cnt, 0)
+
+        with tempfile.TemporaryDirectory() as record_dir:
+            recorder = RecordController(source, record_dir)
+            for i in range(frame_cnt):
+                recorder.screenshot()
+                recorder.click(Point(i, i))
+            recorder.start_moving_forward()
+            self.assertTrue(recorder.is_moving)
+            recorder.stop_moving_forward()
+            debug_utils.get_executor().submit(lambda: None).result()  # 等待图片保存完
+
+            self.assertEqual(frame_cnt, len([i for i in os.listdir(record_dir) if i.endswith('.png')]))
+
+            finished = []
+            replay = ReplayController(None, record_dir, on_finished=lambda: finished.append(True))
+            self.assertEqual(frame_cnt, len(replay.frame_list))
+            for i in range(frame_cnt):
+                self.assertIsNotNone(replay.screenshot())
+                replay.click(Point(i, i))
+            self.assertEqual(0, len(finished))
+            self.assertIsNotNone(replay.screenshot())  # 回放结束后返回最后一帧
+            self.assertEqual(1, len(finished))
+
+            self.assertEqual(frame_cnt, len(replay.action_list))
+            self.assertEqual([frame_cnt - 1, frame_cnt - 1], replay.action_list[-1]['args']['pos'])
+            self.assertEqual(frame_cnt, len(replay.get_round_time_list()))
+
+    def test_import_without_display(self):
+        # pyautogui 无法导入时 模拟没有图形界面的环境 也能加载运行上下文用于离线回放
+        code = ('import sys\n'
+                'sys.modules["pyautogui"] = None\n'
+                'from sr.context.context import get_context\n'
+                'from sr.control.replay_controller import ReplayController\n'
+                'ctx = get_context()\n'
+                'ctx.controller = ReplayController(None, sys.argv[1])\n'
+                'assert ctx.init_controller()\n')
+        screen_dir = os_utils.get_path_under_work_dir('test', 'src', 'test', 'sr', 'image', 'screenshot', 'test_screen_state')
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os_utils.get_path_under_work_dir('src')
+        result = subprocess.run([sys.executable, '-c', code, screen_dir], env=env, capture_output=True, text=True)
+        self.assertEqual(0, result.returncode, result.stderr)
@@ -118,7 +118,7 @@ def _test_get_enemy_road_mask():
 def _test_cut_mini_map():
     screen = get_debug_image('_1705934808671')
     mm = mini_map.cut_mini_map(screen)
-    save_debug_image(mm)
+    save_debug_image(mm, prefix='mm')
     # dir = get_debug_image_dir()
     # for x in os.listdir(dir):
     #     if not x.endswith('.png'):
@@ -54,6 +54,21 @@ class TestOperation(test.SrTestBase):
                                                         battle_fail=True)
         self.assertEqual(ScreenState.TP_BATTLE_SUCCESS.value, state)
 
+    def test_get_sim_uni_screen_state(self):
+        ctx = get_context()
+        ctx.init_ocr_matcher()
+        ctx.init_image_matcher()
+
+        screen = self.get_test_image_new('sim_uni_reward.png')
+        state = screen_state.get_sim_uni_screen_state(screen, ctx.im, ctx.ocr,
+                                                      in_world=True, battle_fail=True, reward=True,
+                                                      fast_recover=True, express_supply=True)
+        self.assertEqual(ScreenState.SIM_REWARD.value, state)
+
+        state = screen_state.get_sim_uni_screen_state(screen, ctx.im, ctx.ocr,
+                                                      in_world=True, empty_to_close=True, reward=True)
+        self.assertEqual(ScreenState.EMPTY_TO_CLOSE.value, state)
+
     def test_get_ui_title(self):
         ctx = get_context()
         ctx.init_ocr_matcher()
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from basic.img import cv2_utils
+from sr.const import map_const
+from sr.image import get_large_map_dir_path, large_map_bundle
+from sr.image.image_holder import read_large_map
+
+
+class TestLargeMapBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.region = map_const.P01_R02
+        self.dir_path = tempfile.mkdtemp()
+        # 只复制原始文件 在临时文件夹中编译 不影响 images/map 下已有的 bundle
+        source_dir_path = get_large_map_dir_path(self.region)
+        for file_name in large_map_bundle.SOURCE_FILE_LIST:
+            file_path = os.path.join(source_dir_path, file_name)
+            if os.path.exists(file_path):
+                shutil.copy2(file_path, self.dir_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path, ignore_errors=True)
+
+    def test_round_trip(self):
+        self.assertTrue(large_map_bundle.is_bundle_outdated(self.dir_path))
+        self.assertIsNone(large_map_bundle.load_large_map_bundle(self.region, self.dir_path))
+
+        self.assertTrue(large_map_bundle.build_large_map_bundle(self.dir_path))
+        self.assertFalse(large_map_bundle.is_bundle_outdated(self.dir_path))
+
+        bundle = large_map_bundle.load_large_map_bundle(self.region, self.dir_path)
+        png = read_large_map(self.region, self.dir_path)
+        self.assertEqual(self.region, bundle.region)
+        for attr in ['raw', 'origin', 'gray', 'mask', 'desc']:
+            expected = getattr(png, attr)
+            actual = getattr(bundle, attr)
+            if expected is None:
+                self.assertIsNone(actual, attr)
+            else:
+                self.assertTrue(np.array_equal(expected, actual), attr)
+        self.assertIsInstance(bundle.mask, np.memmap)
+
+        self.assertEqual(len(png.kps), len(bundle.kps))
+        self.assertTrue(np.array_equal(cv2_utils.feature_keypoints_to_np(png.kps),
+                                       cv2_utils.feature_keypoints_to_np(bundle.kps)))
+
+        self.assertTrue(np.array_equal(cv2_utils.get_pyramid_image(png.origin), bundle.origin_pyramid))
+        self.assertTrue(np.array_equal(cv2_utils.get_pyramid_image(png.mask), bundle.mask_pyramid))
+        # 保存的金字塔尺寸符合时直接使用
+        self.assertIs(bundle.origin_pyramid,
+                      cv2_utils.get_pyramid_image(bundle.origin, pyramid_image=bundle.origin_pyramid))
+
+    def test_outdated(self):
+        self.assertTrue(large_map_bundle.build_large_map_bundle(self.dir_path))
+        self.assertFalse(large_map_bundle.is_bundle_outdated(self.dir_path))
+
+        # 原始文件比 bundle 新时 bundle 失效 回退到读取图片
+        bundle_dir_path = large_map_bundle.get_bundle_dir_path(self.dir_path)
+        mask_path = os.path.join(bundle_dir_path, 'mask.npy')
+        old_time = os.path.getmtime(os.path.join(self.dir_path, 'origin.png')) - 10
+        os.utime(mask_path, (old_time, old_time))
+        self.assertTrue(large_map_bundle.is_bundle_outdated(self.dir_path))
+        self.assertIsNone(large_map_bundle.load_large_map_bundle(self.region, self.dir_path))
+
+        # 重新编译后恢复可用
+        self.assertTrue(large_map_bundle.build_large_map_bundle(self.dir_path))
+        self.assertFalse(large_map_bundle.is_bundle_outdated(self.dir_path))
+
+        # 掩码最后保存 缺失时视为没编译完
+        os.remove(mask_path)
+        self.assertTrue(large_map_bundle.is_bundle_outdated(self.dir_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+
+import test
+from sr.image.onnx_ocr_matcher import OnnxOcrMatcher
+
+
+class CountOcrModel:
+
+    def __init__(self):
+        """
+        记录识别次数的模型 用于验证缓存
+        """
+        self.cnt: int = 0
+
+    def ocr(self, image, det: bool = True, cls: bool = False):
+        self.cnt += 1
+        if det:
+            return [[[[[0, 0], [10, 0], [10, 10], [0, 10]], ('文本', 0.9)]]]
+        else:
+            image_list = image if isinstance(image, list) else [image]
+            return [[('文本%d' % int(np.mean(i)), 0.9) for i in image_list]]
+
+
+class TestOnnxOcrMatcher(test.SrTestBase):
+
+    def __init__(self, *args, **kwargs):
+        test.SrTestBase.__init__(self, *args, **kwargs)
+
+    def test_cache(self):
+        matcher = OnnxOcrMatcher()
+        model = CountOcrModel()
+        matcher._model = model
+
+        image = np.full((30, 100, 3), 100, dtype=np.uint8)
+        for _ in range(10):
+            self.assertEqual('文本100', matcher.run_ocr_single_line(image))
+        self.assertEqual(1, model.cnt)
+        self.assertEqual(9, matcher.cache.hit_cnt)
+
+        # 轻微噪点不影响
+        noise = image.copy()
+        noise[0, 0, 0] = 101
+        matcher.run_ocr_single_line(noise)
+        self.assertEqual(1, model.cnt)
+
+        # 画面变化后重新识别
+        changed = np.full((30, 100, 3), 200, dtype=np.uint8)
+        self.assertEqual('文本200', matcher.run_ocr_single_line(changed))
+        self.assertEqual(2, model.cnt)
+
+        # 返回的是副本 修改不影响缓存
+        result_map = matcher.run_ocr(image)
+        result_map['文本'].max.x += 100
+        result_map = matcher.run_ocr(image)
+        self.assertEqual(0, result_map['文本'].max.x)
+        self.assertEqual(3, model.cnt)
+
+    def test_batch(self):
+        matcher = OnnxOcrMatcher()
+        model = CountOcrModel()
+        matcher._model = model
+
+        image_list = [np.full((30, 100, 3), i * 50, dtype=np.uint8) for i in range(5)]
+        self.assertEqual('文本100', matcher.run_ocr_single_line(image_list[2]))
+        self.assertEqual(['文本%d' % (i * 50) for i in range(5)], matcher.run_ocr_single_line_batch(image_list))
+        self.assertEqual(2, model.cnt)  # 命中缓存的不再识别 其余合并成一次
+
+        self.assertEqual(['文本%d' % (i * 50) for i in range(5)], matcher.run_ocr_single_line_batch(image_list))
+        self.assertEqual(2, model.cnt)
+
+    def test_cache_ttl(self):
+        matcher = OnnxOcrMatcher(cache_ttl=0.05)
+        model = CountOcrModel()
+        matcher._model = model
+
+        image = np.full((30, 100, 3), 100, dtype=np.uint8)
+        matcher.run_ocr_single_line(image)
+        time.sleep(0.1)
+        matcher.run_ocr_single_line(image)
+        self.assertEqual(2, model.cnt)
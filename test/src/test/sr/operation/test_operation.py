@@ -1,5 +1,11 @@
+import time
+
+import numpy as np
+
 import test
+from basic import Rect
 from sr.context.context import Context, get_context
+from sr.control import GameController
 from sr.operation import Operation, OperationOneRoundResult, OperationResult, StateOperation, StateOperationNode, \
     StateOperationEdge
 
@@ -98,3 +104,59 @@ class TestStateOperation(test.SrTestBase):
         op_result = self.op.execute()
         self.assertTrue(op_result.success)
         self.assertEqual('9', op_result.status)
+
+
+class AnimationController(GameController):
+
+    def __init__(self, animation_seconds: float):
+        """
+        前一段时间画面不断变化 之后保持不变
+        :param animation_seconds: 画面变化的时间
+        """
+        super().__init__(None)
+        self.start_time: float = time.time()
+        self.animation_seconds: float = animation_seconds
+
+    def screenshot(self, roi: Rect = None):
+        screen = np.zeros((1080, 1920, 3), dtype=np.uint8)
+        t = time.time() - self.start_time
+        if t < self.animation_seconds:
+            x = int(t * 1920 / self.animation_seconds)
+            screen[:, :x] = 255
+        else:
+            screen[:] = 255
+        return screen if roi is None else screen[roi.y1:roi.y2, roi.x1:roi.x2]
+
+
+class TestWaitScreen(test.SrTestBase):
+
+    def __init__(self, *args, **kwargs):
+        test.SrTestBase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.ctx = get_context()
+        self.ctx.running = 1
+        self.old_controller = self.ctx.controller
+
+    def tearDown(self):
+        self.ctx.controller = self.old_controller
+        self.ctx.running = 0
+
+    def test_wait_until_screen_stable(self):
+        self.ctx.controller = AnimationController(0.3)
+        op = SimpleOperation(self.ctx, None)
+        start_time = time.time()
+        self.assertTrue(op.wait_until_screen_stable(max_wait=2))
+        # 动画结束后很快返回 不需要等到最多等待的时间
+        self.assertGreater(time.time() - start_time, 0.3)
+        self.assertLess(time.time() - start_time, 1)
+
+    def test_wait_until_changed(self):
+        self.ctx.controller = AnimationController(0)
+        op = SimpleOperation(self.ctx, None)
+        start_time = time.time()
+        self.assertFalse(op.wait_until_changed(rect=Rect(0, 0, 100, 100), max_wait=0.3))
+        self.assertGreater(time.time() - start_time, 0.3)
+
+        # 与操作前的截图对比
+        self.assertTrue(op.wait_until_changed(max_wait=0.3, base_screen=np.zeros((1080, 1920, 3), dtype=np.uint8)))
@@ -1,5 +1,8 @@
+import gc
+import threading
+
 import test
-from sr.event_bus import EventBus
+from sr.event_bus import EventBus, EventOption, EventPriority
 
 
 class TestEventBus(test.SrTestBase):
@@ -30,6 +33,123 @@ class TestEventBus(test.SrTestBase):
 
         bus.listen('test', obj1.add)
         bus.dispatch_event('test', 1)
+        self.assertTrue(bus.wait(1))
 
         self.assertEqual(1, len(obj1))
         self.assertEqual(1, obj1.pop())
+
+    def test_priority(self):
+        bus = EventBus()
+        bus.set_event_option('high', EventOption(priority=EventPriority.HIGH))
+        result = []
+        blocked = threading.Event()
+        bus.listen('block', lambda _: blocked.wait(1))
+        bus.listen('normal', result.append)
+        bus.listen('high', result.append)
+
+        bus.dispatch_event('block')  # 等待处理时 后面的事件在排队
+        bus.dispatch_event('normal', 1)
+        bus.dispatch_event('high', 2)
+        blocked.set()
+        self.assertTrue(bus.wait(1))
+        # 高优先级的先处理
+        self.assertEqual([2, 1], result)
+
+    def test_coalesce(self):
+        bus = EventBus()
+        bus.set_event_option('status', EventOption(coalesce=True))
+        bus.set_event_option('bounded', EventOption(max_pending=2))
+        result = []
+        blocked = threading.Event()
+        bus.listen('block', lambda _: blocked.wait(1))
+        bus.listen('status', result.append)
+        bus.listen('bounded', result.append)
+
+        bus.dispatch_event('block')
+        for i in range(100):
+            bus.dispatch_event('status', i)
+        for i in range(5):
+            bus.dispatch_event('bounded', 100 + i)
+        blocked.set()
+        self.assertTrue(bus.wait(1))
+        # 合并时只处理最新的 有数量限制时丢弃最旧的
+        self.assertEqual([99, 103, 104], result)
+        self.assertEqual(99 + 3, bus.dropped_cnt)
+
+    def test_weak_listener(self):
+        bus = EventBus()
+
+        class View:
+
+            def __init__(self):
+                self.result = []
+
+            def on_event(self, event_obj):
+                self.result.append(event_obj)
+
+        view = View()
+        bus.listen('test', view.on_event)
+        bus.dispatch_event('test', 1)
+        self.assertTrue(bus.wait(1))
+        self.assertEqual([1], view.result)
+
+        # 没有解除监听 对象也能被回收
+        del view
+        gc.collect()
+        self.assertEqual(0, len(bus.callbacks['test']))
+        self.assertEqual(0, len(bus._owner_subscriptions))
+
+        def on_event(event_obj):
+            pass
+
+        # 普通函数和 lambda 保留强引用
+        bus.listen('test', on_event)
+        bus.listen('test', lambda _: None)
+        gc.collect()
+        self.assertEqual(2, len(bus.callbacks['test']))
+
+    def test_unlisten_all_many_owners(self):
+        bus = EventBus()
+        obj_list = [set() for _ in range(1000)]
+        for obj in obj_list:
+            for i in range(20):
+                bus.listen('test_%d' % i, obj.add)
+
+        # 只解除对象自己的监听 其它对象的不受影响
+        for obj in obj_list[:500]:
+            bus.unlisten_all(obj)
+        for i in range(20):
+            self.assertEqual(500, len(bus.callbacks['test_%d' % i]))
+        self.assertEqual(500, len(bus._owner_subscriptions))
+
+        bus.dispatch_event('test_0', 1)
+        self.assertTrue(bus.wait(10))
+        self.assertEqual(0, sum(len(obj) for obj in obj_list[:500]))
+        self.assertEqual(500, sum(len(obj) for obj in obj_list[500:]))
+
+        for obj in obj_list[500:]:
+            bus.unlisten_all(obj)
+        for i in range(20):
+            self.assertEqual(0, len(bus.callbacks['test_%d' % i]))
+        self.assertEqual(0, len(bus._owner_subscriptions))
+
+    def test_dispatch_many(self):
+        bus = EventBus()
+        bus.set_event_option('status', EventOption(coalesce=True))
+        status_list = []
+        bus.listen('status', status_list.append)
+        normal_list = []
+        bus.listen('normal', normal_list.append)
+
+        for i in range(100000):
+            bus.dispatch_event('status', i)
+            if i % 100 == 0:
+                bus.dispatch_event('normal', i)
+        self.assertTrue(bus.wait(30))
+
+        # 合并的事件按顺序处理 最新的状态一定会被处理 被合并掉的数量与处理的数量加起来等于下发的数量
+        self.assertEqual(status_list, sorted(set(status_list)))
+        self.assertEqual(99999, status_list[-1])
+        self.assertEqual(100000, len(status_list) + bus.dropped_cnt)
+        # 没有合并的事件全部按顺序处理
+        self.assertEqual(list(range(0, 100000, 100)), normal_list)
@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import test
+from sr import performance_recorder
+from sr.performance_recorder import PerformanceRecord, trace_span, trace_submit
+
+
+class TestPerformanceRecorder(test.SrTestBase):
+
+    def __init__(self, *args, **kwargs):
+        test.SrTestBase.__init__(self, *args, **kwargs)
+
+    def test_percentile(self):
+        record = PerformanceRecord('test')
+        for i in range(1, 101):
+            record.add(i / 1000.0)
+
+        # 分桶误差不超过10%
+        self.assertAlmostEqual(0.05, record.p50, delta=0.005)
+        self.assertAlmostEqual(0.095, record.p95, delta=0.01)
+        self.assertAlmostEqual(0.099, record.p99, delta=0.01)
+        self.assertLessEqual(record.percentile(100), record.max)
+
+    def test_trace_span(self):
+        performance_recorder.start_tracing()
+
+        def child():
+            with trace_span('child'):
+                time.sleep(0.01)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            with trace_span('parent', idx=1) as parent:
+                child()
+                trace_submit(executor, child).result()
+
+        performance_recorder.stop_tracing()
+
+        span_list = [i for i in performance_recorder.get_recorder().get_span_list() if i.name == 'child']
+        self.assertEqual(2, len(span_list))
+        for span in span_list:  # 线程池中的记录也能找到父记录
+            self.assertEqual(parent.span_id, span.parent_id)
+        self.assertNotEqual(span_list[0].thread_id, span_list[1].thread_id)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            chrome_path = os.path.join(temp_dir, 'trace.json')
+            performance_recorder.export_chrome_trace(chrome_path)
+            with open(chrome_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            self.assertEqual(3, len([i for i in data['traceEvents'] if i['ph'] == 'X']))
+
+            speedscope_path = os.path.join(temp_dir, 'trace.speedscope.json')
+            performance_recorder.export_speedscope(speedscope_path)
+            with open(speedscope_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            self.assertEqual(2, len(data['profiles']))
+            for profile in data['profiles']:  # 每个打开都有对应的关闭
+                open_cnt = len([i for i in profile['events'] if i['type'] == 'O'])
+                close_cnt = len([i for i in profile['events'] if i['type'] == 'C'])
+                self.assertEqual(open_cnt, close_cnt)
@@ -0,0 +1,49 @@
+import test
+from basic import Point
+from sr.pos_tracker import PosTracker
+
+
+class TestPosTracker(test.SrTestBase):
+
+    def __init__(self, *args, **kwargs):
+        test.SrTestBase.__init__(self, *args, **kwargs)
+
+    def test_predict(self):
+        tracker = PosTracker()
+        self.assertIsNone(tracker.predict(0))
+
+        # 向正右方匀速移动 每秒30 每0.3秒识别一次
+        for i in range(20):
+            tracker.update(Point(100 + 9 * i, 100), i * 0.3, angle=0)
+
+        predict_pos = tracker.predict(6, angle=0)
+        self.assertLessEqual(abs(predict_pos.x - 280), 3)
+        self.assertLessEqual(abs(predict_pos.y - 100), 3)
+
+        # 转向正下方后 速度方向跟随朝向
+        predict_pos = tracker.predict(6, angle=90)
+        self.assertLessEqual(abs(predict_pos.x - 271), 3)
+        self.assertLessEqual(abs(predict_pos.y - 109), 3)
+
+        # 停止移动时 停留在原地
+        predict_pos = tracker.predict(6, moving=False)
+        self.assertEqual(tracker.pos.x, predict_pos.x)
+        self.assertEqual(tracker.pos.y, predict_pos.y)
+
+    def test_update_with_large_innovation(self):
+        tracker = PosTracker()
+        tracker.update(Point(100, 100), 0)
+        tracker.update(Point(300, 300), 1)  # 距离过大 重新开始追踪
+
+        self.assertEqual(300, tracker.pos.x)
+        self.assertEqual(300, tracker.pos.y)
+        self.assertFalse(tracker.is_valid_result(Point(100, 100), 1))
+        self.assertTrue(tracker.is_valid_result(Point(305, 300), 1))
+
+    def test_choose_scale(self):
+        tracker = PosTracker()
+        self.assertIsNone(tracker.choose_scale([1.25, 1.2]))
+        self.assertEqual(1.25, tracker.choose_scale([1.25]))
+
+        tracker.update(Point(100, 100), 0, scale=1.2)
+        self.assertEqual(1.2, tracker.choose_scale([1.25, 1.2]))
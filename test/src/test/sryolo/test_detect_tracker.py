@@ -0,0 +1,54 @@
+import test
+from sryolo.detector import DetectTracker, DetectFrameResult, DetectObjectResult, DetectClass
+
+LOCKED = DetectClass(0, '被锁定', '界面提示被锁定')
+ATTACK = DetectClass(1, '可攻击', '界面提示可攻击')
+
+
+def new_frame(detect_time: float, *results: DetectObjectResult) -> DetectFrameResult:
+    return DetectFrameResult(raw_image=None, results=list(results), detect_time=detect_time)
+
+
+class TestDetectTracker(test.SrTestBase):
+
+    def __init__(self, *args, **kwargs):
+        test.SrTestBase.__init__(self, *args, **kwargs)
+
+    def test_expire(self):
+        tracker = DetectTracker(keep_seconds=2)
+        for i in range(100):
+            tracker.update(new_frame(i * 0.1))
+        # 只保留最近2秒的结果
+        self.assertEqual(21, len(tracker.frame_list))
+        self.assertAlmostEqual(7.9, tracker.frame_list[0].detect_time)
+
+    def test_is_seen(self):
+        tracker = DetectTracker()
+        tracker.update(new_frame(0, DetectObjectResult([100, 100, 150, 150], 0.9, LOCKED)))
+        tracker.update(new_frame(0.1))
+        tracker.update(new_frame(0.2, DetectObjectResult([104, 102, 154, 152], 0.8, LOCKED)))
+        tracker.update(new_frame(0.3))
+
+        self.assertFalse(tracker.is_seen(min_frames=1, last_frames=1))
+        self.assertTrue(tracker.is_seen(min_frames=1, last_frames=2))
+        self.assertTrue(tracker.is_seen(min_frames=2, last_frames=4))
+        self.assertFalse(tracker.is_seen(min_frames=3, last_frames=4))
+        # 超时的结果不算
+        self.assertFalse(tracker.is_seen(min_frames=1, last_frames=2, now_time=1, timeout_seconds=0.5))
+
+    def test_associate(self):
+        tracker = DetectTracker()
+        tracker.update(new_frame(0,
+                                 DetectObjectResult([100, 100, 150, 150], 0.9, LOCKED),
+                                 DetectObjectResult([500, 100, 550, 150], 0.9, LOCKED)))
+        tracker.update(new_frame(0.1,
+                                 DetectObjectResult([102, 101, 152, 151], 0.7, LOCKED),
+                                 DetectObjectResult([101, 101, 151, 151], 0.9, ATTACK)))
+
+        # 同类别且位置相近的关联为同一个目标 不同类别的不关联
+        self.assertEqual(3, len(tracker.track_list))
+        stable_list = tracker.get_stable_tracks(min_frames=2, last_frames=2)
+        self.assertEqual(1, len(stable_list))
+        self.assertEqual(LOCKED.class_id, stable_list[0].detect_class.class_id)
+        self.assertAlmostEqual(0.8, stable_list[0].avg_score)
+        self.assertEqual(102, stable_list[0].last_result.x1)
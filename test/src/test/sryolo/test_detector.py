@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+
+import test
+from sryolo.detector import StarRailYOLO, DetectContext
+
+
+def prepare_input_reference(yolo: StarRailYOLO, image: np.ndarray) -> np.ndarray:
+    """
+    复用内存之前的预处理 每帧都分配新的数组
+    """
+    rgb_img = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    height, width = image.shape[:2]
+    min_scale = min(yolo.onnx_input_height / height, yolo.onnx_input_width / width)
+    scale_height = int(round(height * min_scale))
+    scale_width = int(round(width * min_scale))
+    if yolo.onnx_input_height != height or yolo.onnx_input_width != width:
+        input_img = np.full(shape=(yolo.onnx_input_height, yolo.onnx_input_width, 3), fill_value=114, dtype=np.uint8)
+        input_img[0:scale_height, 0:scale_width, :] = cv2.resize(rgb_img, (scale_width, scale_height),
+                                                                 interpolation=cv2.INTER_LINEAR)
+    else:
+        input_img = rgb_img
+    input_img = input_img / 255.0
+    input_img = input_img.transpose(2, 0, 1)
+    return input_img[np.newaxis, :, :, :].astype(np.float32)
+
+
+class TestStarRailYOLO(test.SrTestBase):
+
+    def __init__(self, *args, **kwargs):
+        test.SrTestBase.__init__(self, *args, **kwargs)
+
+    def new_yolo(self, use_io_binding: bool = True) -> StarRailYOLO:
+        # 固定输入输出大小的小模型 输入 1x3x32x64 输出 sigmoid 和每个通道的均值
+        return StarRailYOLO(model_name='test_model', model_parent_dir_path=self.sub_package_path,
+                            use_io_binding=use_io_binding)
+
+    def test_prepare_input(self):
+        yolo = self.new_yolo()
+        rng = np.random.default_rng(0)
+        # 缩放后的大小在变大变小之间切换 包括不需要缩放的
+        for height, width in [(1080, 1920), (64, 128), (32, 64), (100, 100), (1080, 1920), (50, 200), (32, 64)]:
+            image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+            context = DetectContext(image)
+            input_tensor = yolo.prepare_input(context)
+
+            self.assertIs(yolo._input_buffer, input_tensor)  # 复用同一块内存
+            self.assertTrue(np.array_equal(prepare_input_reference(yolo, image), input_tensor))
+            # 上一帧的内容不会残留在填充的部分
+            padding = np.float32(114 / 255.0)
+            self.assertTrue(np.all(input_tensor[0, :, context.scale_height:, :] == padding))
+            self.assertTrue(np.all(input_tensor[0, :, :, context.scale_width:] == padding))
+
+    def test_inference_with_io_binding(self):
+        yolo = self.new_yolo()
+        rng = np.random.default_rng(0)
+        for height, width in [(1080, 1920), (32, 64), (100, 100)]:
+            image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+            input_tensor = yolo.prepare_input(DetectContext(image))
+            expected = yolo.session.run(yolo.output_names, {yolo.input_names[0]: input_tensor.copy()})
+
+            outputs = yolo.inference(input_tensor)
+            # 输出大小固定 使用预先分配的内存
+            self.assertIsNotNone(yolo._output_buffers)
+            self.assertEqual(len(expected), len(outputs))
+            for buffer, output, expected_output in zip(yolo._output_buffers, outputs, expected):
+                self.assertIs(buffer, output)
+                self.assertTrue(np.allclose(expected_output, output))
+
+    def test_inference_without_io_binding(self):
+        yolo = self.new_yolo(use_io_binding=False)
+        image = np.random.default_rng(0).integers(0, 256, (1080, 1920, 3), dtype=np.uint8)
+        input_tensor = yolo.prepare_input(DetectContext(image))
+        outputs = yolo.inference(input_tensor)
+        self.assertIsNone(yolo._io_binding)
+        self.assertTrue(np.allclose(1 / (1 + np.exp(-input_tensor)), outputs[0]))